@@ -207,10 +207,20 @@ REST_FRAMEWORK = {
     ),
     'DEFAULT_FILTER_BACKENDS': (
         'rest_framework.filters.DjangoFilterBackend',
-    )
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        'studentgrading.utils.hyperlinks.IdsJSONRenderer',
+    ),
 }
 
 # django-guardian Configuration
 # ------------------------------------------------------------------------------
 ANONYMOUS_USER_ID = -1
 GUARDIAN_MONKEY_PATCH = False
+
+# Batch API Configuration
+# ------------------------------------------------------------------------------
+# max requests in one POST to /api/batch/
+BATCH_MAX_REQUESTS = 20
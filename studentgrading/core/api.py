@@ -40,6 +40,7 @@ course_router.register(r'groups',
                        parents_query_lookups=['course'])
 
 group_router = router.register(r'groups', core_viewsets.GroupViewSet)
+router.register(r'group_requests', core_viewsets.GroupRequestViewSet)
 
 router.register(r'assignments', core_viewsets.AssignmentViewSet)
 
@@ -51,6 +52,7 @@ urlpatterns = [
 
 myself_urlpatterns = [
     url(r'^myself/$', core_viewsets.Myself.as_view(), name='myself'),
+    url(r'^batch/$', core_viewsets.Batch.as_view(), name='batch'),
 ]
 myself_urlpatterns = format_suffix_patterns(myself_urlpatterns)
 
@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+"""
+Fast path of read serializers for hot list endpoints.
+
+A `FastPath` is compiled once per read serializer class and field selection by
+walking its fields, like `prefetch.PrefetchPlan`.  Lists are then pulled with
+`values()`, so no model instance is built, and each row is turned into a dict
+by getters bound once per request: plain columns are copied, hyperlinks are
+filled into URL templates and `many=True` relations are read with one more
+query per field.
+
+Masking is planned too: the fields shown at each four-level permission level
+are known from `masked_fields` of the serializer, so a row only needs its
+level, found among permissions loaded for the whole page at once.
+
+Serializers reading anything else, e.g. a `SerializerMethodField`, a method
+or a custom `to_representation`, have no fast path and are left to DRF.
+"""
+from collections import OrderedDict
+
+from rest_framework import serializers
+from rest_framework.relations import ManyRelatedField
+
+from ..utils import hyperlinks
+from .models import has_four_level_perm
+from .prefetch import get_model_field
+from .serializers import (
+    ChildHyperlinkedIdentityField, ChildHyperlinkedRelatedField,
+    ExpandableFieldsMixin, MaskedFieldsMixin, get_permission_cache,
+)
+
+# classes whose `to_representation` the fast path does the same as
+FAST_PATH_REPRESENTATIONS = (
+    ExpandableFieldsMixin, MaskedFieldsMixin,
+    serializers.Serializer, serializers.BaseSerializer, serializers.Field,
+)
+
+# fields representing values of their columns as they are
+PLAIN_FIELDS = (serializers.IntegerField, serializers.CharField, serializers.BooleanField)
+
+VALUE = 'value'
+LINK = 'link'
+IDENTITY = 'identity'
+NESTED = 'nested'
+MANY = 'many'
+
+
+class RowObject(object):
+    """
+    Stand-in of the instance of a row, for permission checks
+    """
+    __slots__ = ('_meta', 'pk')
+
+    def __init__(self, model, pk):
+        self._meta = model._meta
+        self.pk = pk
+
+
+def get_value_getter(column, convert):
+    if convert is None:
+        return lambda row: row[column]
+    return lambda row: None if row[column] is None else convert(row[column])
+
+
+def get_link_getter(column, template, kwarg_name):
+    def get_link(row):
+        value = row[column]
+        return None if value is None else template.format(**{kwarg_name: value})
+    return get_link
+
+
+def get_identity_getter(template, kwarg_columns):
+    kwarg_columns = list(kwarg_columns.items())
+    return lambda row: template.format(**dict(
+        (kwarg_name, row[column]) for kwarg_name, column in kwarg_columns
+    ))
+
+
+def get_nested_getter(pk_column, getters):
+    return lambda row: None if row[pk_column] is None else OrderedDict(
+        [(name, getter(row)) for name, getter in getters]
+    )
+
+
+def get_many_getter(pk_column, related, template, kwarg_name):
+    if template is None:
+        return lambda row: list(related.get(row[pk_column], ()))
+    return lambda row: [template.format(**{kwarg_name: value})
+                        for value in related.get(row[pk_column], ())]
+
+
+class FastPath(object):
+    """
+    Columns read and fields shown by a read serializer, see `get_fast_path`
+    """
+
+    def __init__(self, model, prefix=''):
+        self.model = model
+        self.prefix = prefix
+        self.pk_column = prefix + model._meta.pk.name
+        self.columns = [self.pk_column]
+        self.fields = []
+        self.masked_fields = ()
+
+    def add_column(self, name):
+        column = self.prefix + name
+        if column not in self.columns:
+            self.columns.append(column)
+        return column
+
+    def add_serializer(self, serializer):
+        """
+        Add fields of `serializer`
+
+        :return: whether the fast path shows them the same as `serializer`
+        """
+        definers = set(klass for klass in type(serializer).__mro__
+                       if 'to_representation' in vars(klass))
+        if not definers.issubset(FAST_PATH_REPRESENTATIONS):
+            return False
+        self.masked_fields = getattr(serializer, 'masked_fields', ())
+        return all(self.add_field(name, field)
+                   for name, field in serializer.fields.items() if not field.write_only)
+
+    def add_field(self, name, field):
+        """
+        Add a field of the serializer
+
+        :return: whether the fast path shows it the same as `field`
+        """
+        if isinstance(field, serializers.HyperlinkedIdentityField):
+            if isinstance(field, ChildHyperlinkedIdentityField):
+                parent_column = self.add_column(field.get_parent_field_name())
+                kwarg_columns = {
+                    field.get_parent_query_lookup(): parent_column,
+                    'pk': self.pk_column,
+                }
+            elif field.lookup_field == 'pk':
+                kwarg_columns = {field.lookup_url_kwarg: self.pk_column}
+            else:
+                return False
+            self.fields.append((name, IDENTITY, (field.view_name, kwarg_columns)))
+            return True
+
+        if isinstance(field, serializers.SerializerMethodField) or len(field.source_attrs) != 1:
+            return False
+        source = field.source_attrs[0]
+        model_field = get_model_field(self.model, source)
+        if model_field is None:
+            return False
+
+        if isinstance(field, ManyRelatedField):
+            child = field.child_relation
+            if (self.prefix or not model_field.is_relation or
+                    not isinstance(child, hyperlinks.HyperlinkedRelatedField) or
+                    isinstance(child, ChildHyperlinkedRelatedField) or child.lookup_field != 'pk'):
+                return False
+            self.fields.append((name, MANY, (source, child.view_name, child.lookup_url_kwarg)))
+            return True
+
+        if model_field.is_relation:
+            if not (model_field.concrete and (model_field.many_to_one or model_field.one_to_one)):
+                return False
+            if isinstance(field, serializers.BaseSerializer):
+                nested = FastPath(model_field.related_model, self.prefix + source + '__')
+                if (not nested.add_serializer(field) or nested.masked_fields or
+                        any(kind == MANY for _, kind, _ in nested.fields)):
+                    return False
+                self.columns.extend(column for column in nested.columns
+                                    if column not in self.columns)
+                self.fields.append((name, NESTED, (nested, )))
+                return True
+            if (not isinstance(field, hyperlinks.HyperlinkedRelatedField) or
+                    isinstance(field, ChildHyperlinkedRelatedField) or field.lookup_field != 'pk'):
+                return False
+            self.fields.append((name, LINK, (self.add_column(source), field.view_name,
+                                             field.lookup_url_kwarg)))
+            return True
+
+        if isinstance(field, serializers.BaseSerializer):
+            return False
+        convert = None if type(field) in PLAIN_FIELDS else field.to_representation
+        self.fields.append((name, VALUE, (self.add_column(source), convert)))
+        return True
+
+    def get_rows(self, queryset):
+        """
+        Return `queryset` of rows read by this fast path
+        """
+        return queryset.prefetch_related(None).values(*self.columns)
+
+    def get_related(self, pks, batch_size=300):
+        """
+        Return pks related by each `many=True` field to the rows of `pks`
+
+        :param batch_size: max pks per query, keeps SQLite under its variable limit
+        :return: dict of dicts of lists, by field name and row pk
+        """
+        related = {}
+        for name, kind, args in self.fields:
+            if kind != MANY:
+                continue
+            source = args[0]
+            related[name] = values = {}
+            for start in range(0, len(pks), batch_size):
+                rows = self.model.objects.filter(
+                    pk__in=pks[start:start + batch_size],
+                ).values_list('pk', source)
+                for pk, value in rows:
+                    if value is not None:
+                        values.setdefault(pk, []).append(value)
+        return related
+
+    def bind(self, request, related=None):
+        """
+        Return getters of the fields shown at each permission level
+
+        :param related: result of `get_related`
+        :return: list of lists of (name, function of a row) pairs, one list per level
+            from the highest one, see `serializers.MaskedFieldsMixin`
+        """
+        ids_repr = hyperlinks.is_ids_repr(request)
+        base_url = hyperlinks.get_base_url(request)
+
+        getters = []
+        for name, kind, args in self.fields:
+            if kind == VALUE:
+                getter = get_value_getter(*args)
+            elif kind == LINK:
+                column, view_name, kwarg_name = args
+                if ids_repr:
+                    getter = get_value_getter(column, None)
+                else:
+                    template = hyperlinks.get_url_template(view_name, (kwarg_name, ), base_url)
+                    getter = get_link_getter(column, template, kwarg_name)
+            elif kind == IDENTITY:
+                if ids_repr:
+                    continue
+                view_name, kwarg_columns = args
+                template = hyperlinks.get_url_template(view_name, tuple(sorted(kwarg_columns)),
+                                                       base_url)
+                getter = get_identity_getter(template, kwarg_columns)
+            elif kind == NESTED:
+                nested = args[0]
+                getter = get_nested_getter(nested.pk_column, nested.bind(request)[0])
+            else:
+                source, view_name, kwarg_name = args
+                template = None if ids_repr else hyperlinks.get_url_template(
+                    view_name, (kwarg_name, ), base_url)
+                getter = get_many_getter(self.pk_column, related[name], template, kwarg_name)
+            getters.append((name, getter))
+
+        levels = []
+        masked = set()
+        for perm, names in self.masked_fields:
+            levels.append([(name, getter) for name, getter in getters if name not in masked])
+            masked.update(names)
+        levels.append([(name, getter) for name, getter in getters if name not in masked])
+        return levels
+
+    def get_level(self, permission_cache, pk):
+        obj = RowObject(self.model, pk)
+        for level, (perm, names) in enumerate(self.masked_fields):
+            if has_four_level_perm(perm, permission_cache, obj):
+                return level
+        return len(self.masked_fields)
+
+    def represent(self, rows, request):
+        """
+        Return the representation of `rows` from `get_rows`, the same as the serializer's
+        """
+        rows = list(rows)
+        pks = [row[self.pk_column] for row in rows]
+        levels = self.bind(request, self.get_related(pks))
+        if len(levels) == 1:
+            getters = levels[0]
+            return [OrderedDict([(name, getter(row)) for name, getter in getters])
+                    for row in rows]
+
+        permission_cache = get_permission_cache(request)
+        permission_cache.prefetch_pks(self.model, pks)
+        data = []
+        for row in rows:
+            getters = levels[self.get_level(permission_cache, row[self.pk_column])]
+            data.append(OrderedDict([(name, getter(row)) for name, getter in getters]))
+        return data
+
+
+_fast_paths = {}
+
+
+def get_fast_path(serializer_class, **kwargs):
+    """
+    Return the `FastPath` of a read serializer class, compiled on first use,
+    or `None` if it has none
+
+    :param kwargs: arguments of the serializer choosing its fields, i.e. `fields`
+        and `exclude` of `SparseFieldsetMixin`
+    """
+    key = (serializer_class, ) + tuple(
+        (name, tuple(sorted(value))) for name, value in sorted(kwargs.items()) if value is not None
+    )
+    if key not in _fast_paths:
+        serializer = serializer_class(**kwargs)
+        fast_path = FastPath(serializer.Meta.model)
+        _fast_paths[key] = fast_path if fast_path.add_serializer(serializer) else None
+    return _fast_paths[key]
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from studentgrading.core.fastpath import get_fast_path
+from studentgrading.core.models import Class, Student
+from studentgrading.core.prefetch import prefetch_for_serializer
+from studentgrading.core.serializers import ReadStudentSerializer
+
+User = get_user_model()
+
+# prefix of usernames and student IDs of the students created
+BENCHMARK_PREFIX = '9090'
+
+
+def best_time(func, repeat):
+    times = []
+    for i in range(repeat):
+        start = time.time()
+        func()
+        times.append(time.time() - start)
+    return min(times)
+
+
+class Command(BaseCommand):
+    help = ('Time listing students by the read serializer against its fast path. '
+            'Students are created for the run and rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000,
+                            help='Number of students to list.')
+        parser.add_argument('--repeat', type=int, default=3,
+                            help='Number of runs, the best one is reported.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.create_students(options['rows'])
+            self.benchmark(options['repeat'])
+            transaction.set_rollback(True)
+
+    def create_students(self, rows):
+        s_class = Class.objects.create(class_id=BENCHMARK_PREFIX)
+        usernames = ['{0}{1:07d}'.format(BENCHMARK_PREFIX, i) for i in range(rows)]
+        User.objects.bulk_create([User(username=username) for username in usernames])
+        Student.objects.bulk_create([
+            Student(user=user, name=user.username, sex='M', s_id=user.username, s_class=s_class)
+            for user in User.objects.filter(username__in=usernames).iterator()
+        ])
+
+    def benchmark(self, repeat):
+        user = User.objects.create_superuser(username=BENCHMARK_PREFIX, password=BENCHMARK_PREFIX)
+        factory = APIRequestFactory()
+        http_request = factory.get('/api/students/', HTTP_HOST='localhost')
+        force_authenticate(http_request, user=user)
+        request = Request(http_request)
+
+        queryset = Student.objects.filter(s_id__startswith=BENCHMARK_PREFIX).order_by('pk')
+        fast_path = get_fast_path(ReadStudentSerializer)
+
+        def serialize():
+            return ReadStudentSerializer(
+                prefetch_for_serializer(queryset, ReadStudentSerializer),
+                many=True, context={'request': request},
+            ).data
+
+        def represent():
+            return fast_path.represent(fast_path.get_rows(queryset), request)
+
+        serializer_time = best_time(serialize, repeat)
+        fast_path_time = best_time(represent, repeat)
+        self.stdout.write('Serializer: {0:.3f}s'.format(serializer_time))
+        self.stdout.write('Fast path:  {0:.3f}s'.format(fast_path_time))
+        self.stdout.write('Speedup:    {0:.1f}x'.format(serializer_time / fast_path_time))
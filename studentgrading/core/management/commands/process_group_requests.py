@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+import time
+
+from django.core.management.base import BaseCommand
+
+from studentgrading.core.models import process_group_requests
+
+
+class Command(BaseCommand):
+    help = 'Create groups of queued group requests in arrival order. Run one worker only.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', default=False,
+                            help='Keep polling for new requests.')
+        parser.add_argument('--interval', type=float, default=1,
+                            help='Seconds to wait when no request is pending.')
+        parser.add_argument('--limit', type=int, default=None,
+                            help='Max number of requests to process in one batch.')
+
+    def handle(self, *args, **options):
+        while True:
+            count = process_group_requests(options['limit'])
+            if count:
+                self.stdout.write('Processed {0} group requests.'.format(count))
+            if not options['loop']:
+                break
+            if not count:
+                time.sleep(options['interval'])
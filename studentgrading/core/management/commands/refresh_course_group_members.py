@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+from django.core.management.base import BaseCommand
+
+from studentgrading.core.models import Course, refresh_course_group_members
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the group members table of all courses from groups and memberships'
+
+    def handle(self, *args, **options):
+        course_pks = list(Course.objects.values_list('pk', flat=True))
+        # stay under the variable limit of SQLite
+        for start in range(0, len(course_pks), 300):
+            refresh_course_group_members(*course_pks[start:start + 300])
+        self.stdout.write('Refreshed group members of {0} courses.'.format(len(course_pks)))
@@ -1,20 +1,30 @@
 # -*- coding: utf-8 -*-
 import datetime
-from decimal import Decimal
+from decimal import Decimal, InvalidOperation
 
-from django.db import models
+from django.db import models, transaction, connection, IntegrityError
 from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
-from django.db.models import Q
+from django.db.models import Q, F, Case, When, Value, Sum, Count
 from django.dispatch import receiver
 from django.db.models.signals import post_save, post_delete
 from django.forms.models import model_to_dict
+from django.contrib.auth.models import Permission
+from django.contrib.contenttypes.models import ContentType
 
+from guardian.models import UserObjectPermission, GroupObjectPermission
 from guardian.shortcuts import assign_perm, remove_perm
 
 from ..utils.import_data import get_student_dataset, handle_uploaded_file, delete_uploaded_file
+from ..utils.ical import build_events
+from ..utils.grouping import get_group_count, chunk, deal, snake, get_group_label, is_group_label
+from ..utils.grading import (
+    build_matrix, weighted_totals, to_grade_decimals, matrix_to_list, curve, describe,
+    summarize, split_by_ids, mean_drift,
+)
 from ..users.models import User
 
 
@@ -73,6 +83,67 @@ class ModelDiffMixin(object):
         self.__initial = self._dict
 
 
+def bulk_update_values(queryset, field_name, values, output_field,
+                       extra=None, batch_size=300):
+    """
+    Set a different value of `field_name` on many rows with batched UPDATEs.
+
+    Each batch is a single `UPDATE ... SET field = CASE pk WHEN ... END`.
+    Signals are not sent.
+    :param queryset: queryset of the rows to update
+    :param field_name: name of the field to set
+    :param values: dict mapping pk to new value
+    :param output_field: model field instance describing the values
+    :param extra: dict of other fields set to the same value on every row
+    :param batch_size: max rows per UPDATE, keeps SQLite under its variable limit
+    :return: count of rows updated
+    """
+    items = list(values.items())
+    count = 0
+    for start in range(0, len(items), batch_size):
+        batch = items[start:start + batch_size]
+        whens = [When(pk=pk, then=Value(value)) for pk, value in batch]
+        update_kwargs = dict(extra or {})
+        update_kwargs[field_name] = Case(*whens, output_field=output_field)
+        count += queryset.filter(pk__in=[pk for pk, value in batch]).update(**update_kwargs)
+    return count
+
+
+def get_grade_average(total, count):
+    """
+    Return the average of `count` grades summing to `total`, rounded to two decimal places
+
+    Return `None` if `count` is zero.
+    """
+    if not count:
+        return None
+    return (Decimal(total) / count).quantize(Decimal('0.01'))
+
+
+def bulk_assign_perms(assignments, batch_size=300):
+    """
+    Assign object permissions with batched INSERTs
+
+    Unlike `assign_perm`, existing permissions are not checked, so only use it on
+    newly created objects.
+    :param assignments: iterable of (perm string, user pk, obj), perm string being
+        like `'core.view_group'`
+    """
+    permissions = {}
+    rows = []
+    for perm, user_pk, obj in assignments:
+        if perm not in permissions:
+            app_label, codename = perm.split('.', 1)
+            permissions[perm] = Permission.objects.get(
+                content_type__app_label=app_label, codename=codename)
+        permission = permissions[perm]
+        rows.append(UserObjectPermission(
+            permission=permission, content_type_id=permission.content_type_id,
+            object_pk=str(obj.pk), user_id=user_pk,
+        ))
+    UserObjectPermission.objects.bulk_create(rows, batch_size=batch_size)
+
+
 def split_four_level_perm_string(perm):
     """
     Split a four-level permission string into level string and base string.
@@ -162,7 +233,7 @@ def has_four_level_perm(perm, user, obj, exact=False):
     By default, if providing permission is lower-level than existing, return `True`.
     If `exact` is set to `True`, only return `True` on exact matching.
     :param perm: permission string
-    :param user: instance of User
+    :param user: instance of User, or an `ObjectPermissionCache` of it
     :param obj: target model instance
     :param exact: exact matching or not
     """
@@ -193,6 +264,95 @@ def has_four_level_perm(perm, user, obj, exact=False):
         raise ValueError('Invalid level name.')
 
 
+class ObjectPermissionCache(object):
+    """
+    Object permissions of a user, loaded in bulk
+
+    `prefetch` loads the permissions on many objects with a user and a group
+    permission query per model, which `has_perm` then checks without queries.
+    Permissions on other objects are checked by `User.has_perm`.
+    Pass it as the `user` of `has_four_level_perm`.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self._codenames = {}
+
+    @staticmethod
+    def get_key(obj):
+        return obj._meta.concrete_model, str(obj.pk)
+
+    def prefetch(self, objects, batch_size=300):
+        """
+        Load permissions on `objects` not loaded yet
+
+        :param batch_size: max pks per query, keeps SQLite under its variable limit
+        """
+        if not self.user.is_active or self.user.is_superuser:
+            return
+
+        pks_by_model = {}
+        for obj in objects:
+            model, pk = self.get_key(obj)
+            pks_by_model.setdefault(model, []).append(pk)
+        for model, pks in pks_by_model.items():
+            self.prefetch_pks(model, pks, batch_size)
+
+    def prefetch_pks(self, model, pks, batch_size=300):
+        """
+        Load permissions on objects of `model` with `pks` not loaded yet, see `prefetch`
+        """
+        if not self.user.is_active or self.user.is_superuser:
+            return
+
+        model = model._meta.concrete_model
+        codenames = dict(
+            (pk, set()) for pk in set(str(pk) for pk in pks) if (model, pk) not in self._codenames
+        )
+        if not codenames:
+            return
+        content_type = ContentType.objects.get_for_model(model)
+        pks = sorted(codenames)
+        for start in range(0, len(pks), batch_size):
+            batch = pks[start:start + batch_size]
+            for queryset in (UserObjectPermission.objects.filter(user=self.user),
+                             GroupObjectPermission.objects.filter(group__user=self.user)):
+                rows = queryset.filter(
+                    content_type=content_type, object_pk__in=batch,
+                ).values_list('object_pk', 'permission__codename')
+                for object_pk, codename in rows:
+                    codenames[object_pk].add(codename)
+        for pk, names in codenames.items():
+            self._codenames[(model, pk)] = names
+
+    def has_perm(self, perm, obj):
+        if not self.user.is_active:
+            return False
+        if self.user.is_superuser:
+            return True
+        codenames = self._codenames.get(self.get_key(obj))
+        if codenames is None:
+            return self.user.has_perm(perm, obj)
+        return perm.split('.', 1)[-1] in codenames
+
+    def can_view(self, obj):
+        """
+        Return whether any four-level view permission on `obj` is granted by object
+        permissions, the rule of `viewsets.FourLevelObjectPermissionsFilter`
+        """
+        if not self.user.is_active:
+            return False
+        if self.user.is_superuser:
+            return True
+        key = self.get_key(obj)
+        if key not in self._codenames:
+            self.prefetch_pks(key[0], [key[1]])
+        view_perm = 'view_{0}'.format(key[0]._meta.model_name)
+        return any(codename in self._codenames[key] for codename in (
+            view_perm, view_perm + '_base', view_perm + '_normal', view_perm + '_advanced',
+        ))
+
+
 # ------------------------------------------------------------------------------
 # Model Classes
 # ------------------------------------------------------------------------------
@@ -305,7 +465,48 @@ class CourseQuerySet(models.QuerySet):
 
 
 class CourseManager(models.Manager):
-    pass
+    def get_cohort_analytics(self, title):
+        """
+        Compare all offerings of a course title
+
+        Grades of all offerings are fetched with one query, group sizes with another.
+        `drift` of an offering is the change of its mean grade from the previous offering.
+        :param title: course title
+        :return: dict of `title`, pooled `grades` distribution and `offerings` in
+            chronological order, each with its `grades` distribution, `drift` and
+            `group_sizes` summary
+        """
+        offerings = sorted(
+            self.filter(title=title).values('id', 'year', 'semester'),
+            key=lambda row: Course.get_semester_order(row['year'], row['semester']),
+        )
+        offering_pks = [row['id'] for row in offerings]
+
+        grade_rows = list(Takes.objects.filter(
+            course__title=title, grade__isnull=False,
+        ).values_list('course_id', 'grade'))
+        size_rows = list(Group.objects.filter(course__title=title).order_by().annotate(
+            size=Count('group_memberships'),
+        ).values_list('course_id', 'size'))
+
+        grades = [float(row[1]) for row in grade_rows]
+        offering_grades = split_by_ids(offering_pks, [row[0] for row in grade_rows], grades)
+        # leaders are not in memberships
+        offering_sizes = split_by_ids(offering_pks, [row[0] for row in size_rows],
+                                      [row[1] + 1 for row in size_rows])
+
+        distributions = [describe(values) for values in offering_grades]
+        drifts = mean_drift([distribution['mean'] for distribution in distributions])
+        return {
+            'title': title,
+            'grades': describe(grades),
+            'offerings': [
+                dict(course=row['id'], year=row['year'], semester=row['semester'],
+                     grades=distribution, drift=drift, group_sizes=summarize(sizes))
+                for row, distribution, drift, sizes in zip(
+                    offerings, distributions, drifts, offering_sizes)
+            ],
+        }
 
 
 class Course(models.Model):
@@ -332,6 +533,10 @@ class Course(models.Model):
         validators=[MinValueValidator(0)],
         default=5,
     )
+    signup_rush = models.BooleanField(
+        default=False,
+        help_text='Queue group creation requests of students, see `GroupRequest`.',
+    )
 
     objects = CourseManager.from_queryset(CourseQuerySet)()
 
@@ -352,6 +557,13 @@ class Course(models.Model):
             title=self.title, year=self.year, semester=self.semester,
         )
 
+    @classmethod
+    def get_semester_order(cls, year, semester):
+        """
+        Return a key sorting (year, semester) pairs chronologically
+        """
+        return year, [choice[0] for choice in cls.SEMESTER_CHOICES].index(semester)
+
     def validate_group_size(self):
         if self.min_group_size > self.max_group_size:
             raise ValidationError({
@@ -375,7 +587,25 @@ class Course(models.Model):
 
     def get_next_group_number(self):
         """Return the next available group number"""
-        return min(set(self.NUMBERS_LIST) - set(self.get_used_group_numbers()))
+        return self.get_free_group_numbers()[0]
+
+    def get_free_group_numbers(self, count=1, exclude=()):
+        """
+        Return the first `count` unused group numbers, in order
+
+        Numbers run A..Z, AA..AZ, BA.. and so on without limit, filling gaps
+        left by deleted groups first.
+        :param exclude: numbers to treat as used
+        """
+        used = set(self.get_used_group_numbers())
+        used.update(exclude)
+        numbers, index = [], 0
+        while len(numbers) < count:
+            number = get_group_label(index, self.NUMBERS_LIST)
+            if number not in used:
+                numbers.append(number)
+            index += 1
+        return numbers
 
     def get_all_students(self):
         return self.student_set.all()
@@ -388,8 +618,135 @@ class Course(models.Model):
 
     def add_group(self, members=(), *args, **kwargs):
         group = self.groups.create(*args, **kwargs)
-        for member in members:
-            GroupMembership.objects.create(group=group, student=member)
+        self.add_group_members(group, members)
+        return group
+
+    def add_group_members(self, group, members):
+        """
+        Add members to a group of this course with one INSERT
+
+        Raise ValidationError if a member does not take the course or is in a group.
+        :param members: Student instances or pks
+        """
+        member_pks = [getattr(member, 'pk', member) for member in members]
+        if not member_pks:
+            return
+        self.validate_group_students(member_pks, 'members')
+        with transaction.atomic():
+            GroupMembership.objects.bulk_create([
+                GroupMembership(group=group, student_id=pk) for pk in member_pks
+            ])
+            CourseGroupMember.objects.bulk_create([
+                CourseGroupMember(course=self, student_id=pk, group=group,
+                                  role=CourseGroupMember.ROLE_MEMBER)
+                for pk in member_pks
+            ])
+            # what `group_membership_update_summary` and `..._bump_versions` do
+            CourseSummary.add(self.pk, member_count=len(member_pks))
+            bump_resource_versions(get_course_resource_key(self.pk, 'analytics'),
+                                   get_course_resource_key(self.pk, 'groups'))
+
+    def add_groups(self, groups):
+        """
+        Create many groups at once
+
+        Raise ValidationError if a student does not take the course, is in a group,
+        or appears twice.
+        :param groups: iterable of dicts of `leader` and optional `members` and `name`,
+            students given as instances or pks
+        :return: list of new groups, in the given order
+        """
+        specs = []
+        for group in groups:
+            specs.append((
+                getattr(group['leader'], 'pk', group['leader']),
+                [getattr(member, 'pk', member) for member in group.get('members', ())],
+                group.get('name', ''),
+            ))
+        self.validate_group_students(
+            [spec[0] for spec in specs] + [pk for spec in specs for pk in spec[1]], 'groups')
+        return self.bulk_create_groups(specs)
+
+    def validate_group_students(self, student_pks, field):
+        """
+        Check students may join groups of this course with two set queries,
+        or raise ValidationError under `field`
+        """
+        if len(set(student_pks)) != len(student_pks):
+            raise ValidationError({field: 'A student appears more than once.'})
+        taking = set(self.takes.filter(
+            student_id__in=student_pks).values_list('student_id', flat=True))
+        not_taking = sorted(set(student_pks) - taking)
+        if not_taking:
+            raise ValidationError({
+                field: 'Students {0} do not take the course.'.format(not_taking)
+            })
+        grouped = sorted(self.group_members.filter(
+            student_id__in=student_pks).values_list('student_id', flat=True))
+        if grouped:
+            raise ValidationError({
+                field: 'Students {0} are already in a group.'.format(grouped)
+            })
+
+    def bulk_create_groups(self, specs):
+        """
+        Insert groups, their memberships and permissions with batched INSERTs
+
+        Students are not validated, see `validate_group_students`.
+        Raise ValidationError if another request took one of the numbers meanwhile.
+        :param specs: list of (leader pk, member pks, name)
+        :return: list of new groups, in the given order
+        """
+        if not specs:
+            return []
+        numbers = self.get_free_group_numbers(len(specs))
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    Group.objects.bulk_create([
+                        Group(course=self, number=number, leader_id=leader_pk, name=name)
+                        for number, (leader_pk, member_pks, name) in zip(numbers, specs)
+                    ])
+            except IntegrityError:
+                if not self.groups.filter(number__in=numbers).exists():
+                    raise
+                raise ValidationError({'number': 'Group numbers were taken meanwhile, try again.'})
+            groups = dict((group.number, group) for group in self.groups.filter(
+                number__in=numbers).select_related('leader'))
+            memberships = [
+                GroupMembership(group=groups[number], student_id=pk)
+                for number, (leader_pk, member_pks, name) in zip(numbers, specs)
+                for pk in member_pks
+            ]
+            GroupMembership.objects.bulk_create(memberships)
+            CourseGroupMember.objects.bulk_create([
+                CourseGroupMember(course=self, student_id=group.leader_id, group=group,
+                                  role=CourseGroupMember.ROLE_LEADER)
+                for group in groups.values()
+            ] + [
+                CourseGroupMember(course=self, student_id=membership.student_id,
+                                  group=membership.group, role=CourseGroupMember.ROLE_MEMBER)
+                for membership in memberships
+            ])
+
+            # what `group_assign_perms` does for each group, at once
+            stu_user_pks = list(self.students.values_list('user_id', flat=True))
+            inst_user_pks = list(self.instructors.values_list('user_id', flat=True))
+            assignments = []
+            for group in groups.values():
+                assignments.extend(('core.view_group', user_pk, group) for user_pk in stu_user_pks)
+                for user_pk in inst_user_pks:
+                    assignments.extend([('core.view_group', user_pk, group),
+                                        ('core.change_group_advanced', user_pk, group),
+                                        ('core.delete_group', user_pk, group)])
+                assignments.append(('core.change_group_advanced', group.leader.user_id, group))
+            bulk_assign_perms(assignments)
+
+            CourseSummary.add(self.pk, group_count=len(groups), member_count=len(memberships))
+            bump_resource_versions(get_course_resource_key(self.pk, 'analytics'),
+                                   get_course_resource_key(self.pk, 'groups'))
+
+        return [groups[number] for number in numbers]
 
     def add_assignment(self, *args, **kwargs):
         self.assignments.create(*args, **kwargs)
@@ -401,11 +758,236 @@ class Course(models.Model):
             return None
 
     def get_students_not_in_any_group(self):
-        q_stu_takes = Q(takes__course=self)
-        q_stu_in_group = Q(leader_of__course=self) | Q(member_of__course=self)
-        return Student.objects.filter(
-            ~(q_stu_takes & q_stu_in_group) & q_stu_takes
+        return Student.objects.ungrouped_in(self)
+
+    def form_groups(self, balance=None):
+        """
+        Put all students not in any group into new groups
+
+        Groups are as few as possible within `min_group_size` and `max_group_size`, and
+        differ in size by at most one.  The first student of each group leads it.
+        Raise ValidationError if students cannot fit in the bounds, or if another request
+        took one of the numbers meanwhile.
+        :param balance: `None` to keep students of neighbouring IDs together, `'class'`
+            to spread each class over the groups, or `'grade'` to mix high and low grades
+        :return: list of new groups
+        """
+        rows = list(self.takes.exclude(
+            student_id__in=self.group_members.values('student_id'),
+        ).values_list('student_id', 'student__s_id', 'student__s_class_id', 'grade'))
+
+        try:
+            group_count = get_group_count(len(rows), self.min_group_size, self.max_group_size)
+        except ValueError as e:
+            raise ValidationError({'students': str(e)})
+        if not group_count:
+            return []
+
+        if balance == 'class':
+            rows.sort(key=lambda row: (row[2], row[1]))
+            partition = deal(rows, group_count)
+        elif balance == 'grade':
+            # best grades first, students without a grade last
+            rows.sort(key=lambda row: (row[3] is None, -(row[3] or 0), row[1]))
+            partition = snake(rows, group_count)
+        else:
+            rows.sort(key=lambda row: row[1])
+            partition = chunk(rows, group_count)
+
+        return self.bulk_create_groups([
+            (group_rows[0][0], [row[0] for row in group_rows[1:]], '')
+            for group_rows in partition
+        ])
+
+    def set_assignment_scores(self, assignment, scores):
+        """
+        Enter scores of `assignment` for many students at once
+
+        Existing scores are overwritten.
+        Raise ValidationError if a score is invalid or a student does not take the course.
+        :param assignment: Assignment instance of this course
+        :param scores: dict mapping student pk to score
+        :return: count of scores entered
+        """
+        if assignment.course_id != self.pk:
+            raise ValidationError({'assignment': 'Assignment does not belong to the course.'})
+
+        score_field = AssignmentScore._meta.get_field('score')
+        cleaned = {}
+        for student_pk, score in scores.items():
+            try:
+                cleaned[int(student_pk)] = score_field.clean(score, None)
+            except (TypeError, ValueError, InvalidOperation, ValidationError):
+                raise ValidationError({
+                    'scores': 'Invalid score {0} for student {1}.'.format(score, student_pk)
+                })
+
+        takes_pks = dict(self.takes.filter(student__in=list(cleaned.keys()))
+                                   .values_list('student_id', 'pk'))
+        not_taking = set(cleaned.keys()) - set(takes_pks.keys())
+        if not_taking:
+            raise ValidationError({
+                'scores': 'Students {0} do not take the course.'.format(sorted(not_taking))
+            })
+
+        scores_by_takes = {takes_pks[student_pk]: score for student_pk, score in cleaned.items()}
+        existing = dict(assignment.scores.filter(takes__in=list(scores_by_takes.keys()))
+                                         .values_list('takes_id', 'pk'))
+
+        bulk_update_values(
+            AssignmentScore.objects.all(), 'score',
+            {existing[takes_pk]: score
+             for takes_pk, score in scores_by_takes.items() if takes_pk in existing},
+            score_field,
+            extra={'modified_dtm': timezone.now()},
         )
+        AssignmentScore.objects.bulk_create([
+            AssignmentScore(takes_id=takes_pk, assignment=assignment, score=score)
+            for takes_pk, score in scores_by_takes.items() if takes_pk not in existing
+        ])
+        bump_resource_versions(get_course_resource_key(self.pk, 'gradebook'))
+        return len(scores_by_takes)
+
+    def get_score_matrix(self):
+        """
+        Return the assignment scores of the course as a dense matrix
+
+        Rows are takes and columns are assignments, both ordered by pk.
+        Missing scores are NaN.
+        :return: tuple of (takes pks, assignment pks, grade ratios, score matrix)
+        """
+        takes_pks = list(self.takes.order_by('pk').values_list('pk', flat=True))
+        assignments = list(self.assignments.order_by('pk').values_list('pk', 'grade_ratio'))
+        assignment_pks = [pk for pk, ratio in assignments]
+        ratios = [ratio for pk, ratio in assignments]
+        cells = AssignmentScore.objects.filter(
+            assignment__course=self,
+        ).values_list('takes_id', 'assignment_id', 'score')
+        return takes_pks, assignment_pks, ratios, build_matrix(takes_pks, assignment_pks, cells)
+
+    def get_calendar_events(self):
+        """
+        Return iCalendar events of assignments of this course, one per deadline
+
+        See `utils.ical.build_events`.
+        """
+        return build_events(
+            dict(uid='assignment-{0}@studentgrading'.format(pk),
+                 stamp=assigned_dtm,
+                 start=deadline_dtm,
+                 summary='{course}: {title}'.format(course=self.title, title=title),
+                 description=description)
+            for pk, title, description, deadline_dtm, assigned_dtm in self.assignments.filter(
+                deadline_dtm__isnull=False,
+            ).order_by('deadline_dtm', 'pk').values_list(
+                'pk', 'title', 'description', 'deadline_dtm', 'assigned_dtm',
+            )
+        )
+
+    def get_gradebook(self, since=None):
+        """
+        Return assignment scores of the course in a columnar layout
+
+        `scores` is a row-major matrix with one row per student and one column
+        per assignment, `None` where there is no score.
+        If `since` is given, only students and assignments having scores modified
+        after it are included, and cells not modified are `None`.  Deletions are
+        not listed, so if a score, takes or assignment was deleted after `since`
+        the whole gradebook is returned instead, with `full` set.
+        :param since: datetime or `None`
+        :return: dict of `students`, `assignments`, `scores` and `full`
+        """
+        if since is not None:
+            removals_key = get_course_resource_key(self.pk, 'gradebook_removals')
+            removed_dtm = get_resource_versions(removals_key)[removals_key][1]
+            if removed_dtm is not None and removed_dtm >= since:
+                since = None
+
+        if since is None:
+            assignment_pks = list(self.assignments.order_by('pk').values_list('pk', flat=True))
+            rows = list(self.takes.values_list(
+                'student_id', 'assignment_scores__assignment_id', 'assignment_scores__score',
+            ))
+            student_pks = sorted(set(row[0] for row in rows))
+        else:
+            rows = list(AssignmentScore.objects.filter(
+                assignment__course=self, modified_dtm__gt=since,
+            ).values_list('takes__student_id', 'assignment_id', 'score'))
+            student_pks = sorted(set(row[0] for row in rows))
+            assignment_pks = sorted(set(row[1] for row in rows))
+
+        cells = [row for row in rows if row[1] is not None]
+        return {
+            'students': student_pks,
+            'assignments': assignment_pks,
+            'scores': matrix_to_list(build_matrix(student_pks, assignment_pks, cells)),
+            'full': since is None,
+        }
+
+    def recompute_grades(self):
+        """
+        Recompute the grade of every takes from its assignment scores
+
+        Grade is the sum of scores weighted by assignment `grade_ratio`.
+        Takes without any score keep their grade, e.g. one entered by hand.
+        :return: count of takes updated
+        """
+        takes_pks, assignment_pks, ratios, matrix = self.get_score_matrix()
+        grades = to_grade_decimals(weighted_totals(matrix, ratios))
+        count = bulk_update_values(
+            self.takes.all(), 'grade',
+            dict((pk, grade) for pk, grade in zip(takes_pks, grades) if grade is not None),
+            Takes._meta.get_field('grade'),
+        )
+        refresh_course_summaries(self.pk)
+        self.bump_grade_versions()
+        return count
+
+    def bump_grade_versions(self):
+        """
+        Bump versions of resources showing grades of this course
+
+        These are transcripts of all students taking this course, the course analytics
+        and takes of the course.
+        Call it after changing grades without saving takes one by one.
+        """
+        bump_resource_versions(get_course_resource_key(self.pk, 'analytics'),
+                               get_course_resource_key(self.pk, 'takes'), *[
+            get_student_resource_key(student_pk, 'transcript')
+            for student_pk in self.takes.values_list('student_id', flat=True)
+        ])
+
+    def curve_grades(self, method, commit=False, **params):
+        """
+        Curve grades of all students taking this course
+
+        Takes without a grade are left untouched.
+        :param method: one of `utils.grading.CURVE_METHODS`
+        :param commit: save curved grades if True, otherwise only preview them
+        :param params: parameters of the curve method, see `utils.grading.curve`
+        :return: dict of `before` and `after` distributions and `count` of takes updated
+        """
+        rows = list(self.takes.filter(grade__isnull=False).values_list('pk', 'grade'))
+        takes_pks = [row[0] for row in rows]
+        grades = [float(row[1]) for row in rows]
+        try:
+            curved = to_grade_decimals(curve(grades, method, **params))
+        except ValueError as e:
+            raise ValidationError({'method': str(e)})
+
+        count = 0
+        if commit:
+            count = bulk_update_values(
+                self.takes.all(), 'grade', dict(zip(takes_pks, curved)),
+                Takes._meta.get_field('grade'),
+            )
+            refresh_course_summaries(self.pk)
+            self.bump_grade_versions()
+        return {
+            'before': describe(grades),
+            'after': describe([float(grade) for grade in curved]),
+            'count': count,
+        }
 
     def is_given_by(self, instructor):
         return self.instructors.filter(pk=instructor.pk).exists()
@@ -414,8 +996,7 @@ class Course(models.Model):
         return self.students.filter(pk=student.pk).exists()
 
     def has_group_including(self, student):
-        query = Q(leader=student) | Q(members=student)
-        return self.groups.filter(query).exists()
+        return self.group_members.filter(student=student).exists()
 
     # Object permission related methods
     # -------------------------------------------------------------------------
@@ -493,6 +1074,25 @@ def course_assign_perms(sender, **kwargs):
             course.assign_base_perms_for_instructor(instructor.user)
 
 
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def course_bump_versions(sender, **kwargs):
+    course, created = kwargs['instance'], kwargs.get('created', True)
+    bump_resource_versions(get_course_resource_key(course.pk, 'course'))
+    if not created:
+        # title, year and semester are shown in transcripts and analytics
+        course.bump_grade_versions()
+        # title is shown in calendars
+        bump_resource_versions(get_course_resource_key(course.pk, 'calendar'))
+
+
+@receiver(post_save, sender=Course)
+def course_create_summary(sender, **kwargs):
+    course, created = kwargs['instance'], kwargs['created']
+    if created:
+        CourseSummary.objects.create(course=course)
+
+
 @receiver(post_delete, sender=Course)
 def course_remove_perms(sender, **kwargs):
     course = kwargs['instance']
@@ -514,19 +1114,32 @@ class StudentQuerySet(models.QuerySet):
         return self.filter(query)
 
     def in_any_group_of(self, course):
-        query = Q(leader_of__course=course) | Q(member_of__course=course)
-        return self.filter(query)
+        return self.filter(pk__in=CourseGroupMember.objects.filter(
+            course=course).values('student_id'))
 
     def not_in_any_group_of(self, course):
-        return self.filter(~(Q(leader_of__course=course) | Q(member_of__course=course)))
+        return self.exclude(pk__in=CourseGroupMember.objects.filter(
+            course=course).values('student_id'))
 
     def in_any_group(self, any=True):
-        if any:
-            query = Q(leader_of__isnull=False) | Q(member_of__isnull=False)
-        else:
-            query = Q(leader_of__isnull=True) & Q(member_of__isnull=True)
+        query = Q(pk__in=CourseGroupMember.objects.values('student_id'))
+        return self.filter(query if any else ~query)
 
-        return self.filter(query)
+    def ungrouped_in(self, course):
+        """
+        Students taking `course` and in no group of it
+
+        Groups are excluded with a NOT EXISTS anti-join probing the unique
+        (course, student) index of `CourseGroupMember`.
+        """
+        qn = connection.ops.quote_name
+        return self.filter(takes__course=course).extra(where=[(
+            'NOT EXISTS (SELECT 1 FROM {group_member} '
+            'WHERE {group_member}.{course} = %s AND {group_member}.{student} = {table}.{id})'
+        ).format(
+            group_member=qn(CourseGroupMember._meta.db_table), table=qn(Student._meta.db_table),
+            course=qn('course_id'), student=qn('student_id'), id=qn('id'),
+        )], params=[getattr(course, 'pk', course)])
 
 
 class StudentManager(models.Manager):
@@ -600,7 +1213,37 @@ class Student(ModelDiffMixin, UserProfile):
 
     def get_all_courses(self):
         return self.courses.all()
-        
+
+    def get_transcript(self):
+        """
+        Get all courses taken with grades, and per-semester and cumulative averages
+
+        Averages only count graded courses. Grades are not masked, see `mask_transcript`.
+        :return: dict of `courses`, `semesters` and `average`
+        """
+        def semester_key(row):
+            return Course.get_semester_order(row['year'], row['semester'])
+
+        courses = [
+            dict(id=row['id'], course=row['course_id'], title=row['course__title'],
+                 year=row['course__year'], semester=row['course__semester'], grade=row['grade'])
+            for row in self.takes.values(
+                'id', 'course_id', 'course__title', 'course__year', 'course__semester', 'grade',
+            )
+        ]
+        courses.sort(key=lambda row: semester_key(row) + (row['title'], ))
+
+        semesters = [
+            dict(year=row['course__year'], semester=row['course__semester'],
+                 total=row['total'] or 0, count=row['count'])
+            for row in self.takes.order_by().values(
+                'course__year', 'course__semester',
+            ).annotate(total=Sum('grade'), count=Count('grade'))
+        ]
+        semesters.sort(key=semester_key)
+
+        return build_transcript(courses, semesters)
+
     def get_course(self, pk):
         try:
             return self.courses.get(pk=pk)
@@ -616,12 +1259,9 @@ class Student(ModelDiffMixin, UserProfile):
         course = self.get_course(course_pk)
         if not course:
             raise ValidationError('This student does not take the course.')
-        qs = self.member_of.filter(course=course)
-        if not qs.exists():
-            qs = self.leader_of.filter(course=course)
-            if not qs.exists():
-                return None
-        return qs[0]    # only return the first group, there should be only one
+        group_member = self.course_group_members.filter(
+            course=course).select_related('group').first()
+        return group_member.group if group_member else None
 
     def get_classmates(self):
         return self.s_class.students.exclude(pk=self.pk)
@@ -1343,6 +1983,14 @@ class Teaches(ModelDiffMixin, models.Model):
             inst.remove_perms_for_course_stu(student.user)
 
 
+@receiver(post_save, sender=Teaches)
+@receiver(post_delete, sender=Teaches)
+def teaches_bump_versions(instance, **kwargs):
+    # before `teaches_assign_perms` resets the diff
+    course_pks = {instance.course_id, instance.get_old_field('course')} - {None}
+    bump_resource_versions(*[get_course_resource_key(pk, 'teaches') for pk in course_pks])
+
+
 @receiver(post_save, sender=Teaches)
 def teaches_assign_perms(instance, created, **kwargs):
     teaches = instance
@@ -1373,7 +2021,8 @@ def teaches_remove_perms(instance, **kwargs):
 
 class GroupQuerySet(models.QuerySet):
     def has_student(self, student):
-        return self.filter(Q(members=student) | Q(leader=student)).distinct()
+        return self.filter(pk__in=CourseGroupMember.objects.filter(
+            student=student).values('group_id'))
 
 
 class GroupManager(models.Manager):
@@ -1382,6 +2031,9 @@ class GroupManager(models.Manager):
 
 class Group(ModelDiffMixin, models.Model):
 
+    # times to pick another number when a concurrent save took it
+    NUMBER_RETRIES = 5
+
     number = models.CharField(
         verbose_name='group number',
         max_length=10,
@@ -1403,6 +2055,7 @@ class Group(ModelDiffMixin, models.Model):
     objects = GroupManager.from_queryset(GroupQuerySet)()
 
     class Meta:
+        unique_together = (('course', 'number'), )
         permissions = (
             ('view_group', 'Can view group'),
             ('view_group_base', "Can view group, base level"),
@@ -1432,7 +2085,7 @@ class Group(ModelDiffMixin, models.Model):
             return
 
         if not self.pk:  # created
-            if self.number not in self.course.NUMBERS_LIST:
+            if not is_group_label(self.number, self.course.NUMBERS_LIST):
                 raise ValidationError({'number': 'Number should be in the list.'})
             elif self.number in self.course.get_used_group_numbers():
                 raise ValidationError({'number': 'Number already used.'})
@@ -1440,17 +2093,20 @@ class Group(ModelDiffMixin, models.Model):
             old_number = self.get_old_field('number')
             if not old_number:
                 return
-            if self.number not in self.course.NUMBERS_LIST:
+            if not is_group_label(self.number, self.course.NUMBERS_LIST):
                 raise ValidationError({'number': 'Number should be in the list.'})
             elif self.number in self.course.get_used_group_numbers():
                 raise ValidationError({'number': 'Number already used.'})
 
     def validate_leader(self):
         """
-        Validate if `leader` takes `course`
+        Validate if `leader` takes `course` and is in no other group of it
         """
         if not self.leader.is_taking(self.course):
             raise ValidationError({'leader': 'Group leader does not take the course.'})
+        if self.course.group_members.filter(
+                student=self.leader).exclude(group_id=self.pk).exists():
+            raise ValidationError({'leader': 'Group leader is already in another group.'})
 
     def clean(self):
         self.validate_group_number()
@@ -1458,11 +2114,38 @@ class Group(ModelDiffMixin, models.Model):
 
     def save(self, *args, **kwargs):
         self.full_clean()
-        if not self.number:
-            # if number is empty, fill in default number
-            self.number = self.course.get_next_group_number()
+        if self.number:
+            if not self.save_with_number(self.number, *args, **kwargs):
+                raise ValidationError({'number': 'Number already used.'})
+            return
+
+        # if number is empty, fill in default number, skipping numbers
+        # other groups take at the same time
+        taken = []
+        for i in range(self.NUMBER_RETRIES):
+            number = self.course.get_free_group_numbers(exclude=taken)[0]
+            if self.save_with_number(number, *args, **kwargs):
+                return
+            taken.append(number)
+        raise ValidationError({'number': 'No group number available, try again.'})
+
+    def save_with_number(self, number, *args, **kwargs):
+        """
+        Save with `number` in a savepoint
 
-        super(Group, self).save(*args, **kwargs)
+        Return False if another group of the course has the number, which
+        `validate_group_number` cannot see when saved concurrently.
+        """
+        self.number = number
+        try:
+            with transaction.atomic():
+                super(Group, self).save(*args, **kwargs)
+        except IntegrityError:
+            if not Group.objects.filter(
+                    course_id=self.course_id, number=number).exclude(pk=self.pk).exists():
+                raise
+            return False
+        return True
 
     # Object permission related methods
     # -------------------------------------------------------------------------
@@ -1511,6 +2194,92 @@ class Group(ModelDiffMixin, models.Model):
     def remove_leader_perms(self):
         self.remove_perms_for_leader(self.leader.user)
 
+    def transfer_leadership(self, student):
+        """
+        Make a member the leader, and the leader a member, in one transaction
+
+        Each table is written with a single UPDATE and no signals are sent.  The
+        leader permission moves from the old leader to the new one, which is all
+        `group_assign_perms` would change.
+        Raise ValidationError if `student` is not a member of the group.
+        :param student: Student instance or pk
+        """
+        student_pk = getattr(student, 'pk', student)
+        old_leader_pk = self.leader_id
+        if student_pk == old_leader_pk:
+            return
+
+        with transaction.atomic():
+            # the membership row now belongs to the old leader
+            if not self.group_memberships.filter(student_id=student_pk).update(
+                    student=old_leader_pk):
+                raise ValidationError({'leader': 'New leader should be a member of the group.'})
+            Group.objects.filter(pk=self.pk).update(leader=student_pk)
+            self.course_group_members.filter(student_id__in=[old_leader_pk, student_pk]).update(
+                role=Case(
+                    When(student_id=student_pk, then=Value(CourseGroupMember.ROLE_LEADER)),
+                    default=Value(CourseGroupMember.ROLE_MEMBER),
+                    output_field=models.CharField(),
+                ))
+
+            user_pks = dict(Student.objects.filter(
+                pk__in=[old_leader_pk, student_pk]).values_list('pk', 'user_id'))
+            UserObjectPermission.objects.filter(
+                user_id=user_pks[old_leader_pk],
+                permission__content_type__app_label='core',
+                permission__codename='change_group_advanced',
+                object_pk=str(self.pk),
+            ).update(user=user_pks[student_pk])
+
+            bump_resource_versions(get_course_resource_key(self.course_id, 'analytics'),
+                                   get_course_resource_key(self.course_id, 'groups'))
+
+        self.leader_id = student_pk
+        # drop the cached old leader instance
+        self.__dict__.pop(Group._meta.get_field('leader').get_cache_name(), None)
+        self.save_all_field_diff()
+
+
+@receiver(post_save, sender=Group)
+def group_update_group_members(sender, **kwargs):
+    """
+    Connected before `group_assign_perms`, which resets the field diff.
+    """
+    group, created = kwargs['instance'], kwargs['created']
+    if created:
+        CourseGroupMember.objects.create(course_id=group.course_id, student_id=group.leader_id,
+                                         group=group, role=CourseGroupMember.ROLE_LEADER)
+        return
+
+    if group.get_field_diff('course'):
+        group.course_group_members.update(course=group.course_id)
+    old_leader_pk = group.get_old_field('leader')
+    if old_leader_pk:
+        group.course_group_members.filter(
+            student_id=old_leader_pk, role=CourseGroupMember.ROLE_LEADER).delete()
+        # the new leader may have been a member until now
+        CourseGroupMember.objects.update_or_create(
+            course_id=group.course_id, student_id=group.leader_id,
+            defaults=dict(group=group, role=CourseGroupMember.ROLE_LEADER))
+
+
+@receiver(post_save, sender=Group)
+def group_update_summary(sender, **kwargs):
+    """
+    Connected before `group_assign_perms`, which resets the field diff.
+    """
+    group, created = kwargs['instance'], kwargs['created']
+    if created:
+        CourseSummary.add(group.course_id, group_count=1)
+    elif group.get_field_diff('course'):
+        refresh_course_summaries(group.get_old_field('course'), group.course_id)
+
+
+@receiver(post_delete, sender=Group)
+def group_remove_from_summary(sender, **kwargs):
+    group = kwargs['instance']
+    CourseSummary.add(group.course_id, group_count=-1)
+
 
 @receiver(post_save, sender=Group)
 def group_assign_perms(**kwargs):
@@ -1554,6 +2323,14 @@ def group_remove_perms(**kwargs):
     group.remove_perms_for_leader(group.leader.user)
 
 
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_bump_versions(sender, **kwargs):
+    group = kwargs['instance']
+    bump_resource_versions(get_course_resource_key(group.course_id, 'analytics'),
+                           get_course_resource_key(group.course_id, 'groups'))
+
+
 class GroupContactInfo(ContactInfo):
     group = models.ForeignKey(Group, related_name='contact_infos')
 
@@ -1592,6 +2369,219 @@ class GroupMembership(ModelDiffMixin, models.Model):
         super(GroupMembership, self).save(*args, **kwargs)
 
 
+@receiver(post_save, sender=GroupMembership)
+def group_membership_update_group_members(sender, **kwargs):
+    """
+    Connected before `group_membership_update_summary`, which resets the field diff.
+    """
+    membership, created = kwargs['instance'], kwargs['created']
+    if created:
+        CourseGroupMember.objects.create(
+            course_id=membership.group.course_id, student_id=membership.student_id,
+            group_id=membership.group_id, role=CourseGroupMember.ROLE_MEMBER)
+    elif membership.has_changed:
+        CourseGroupMember.objects.filter(
+            group_id=membership.get_old_field('group') or membership.group_id,
+            student_id=membership.get_old_field('student') or membership.student_id,
+            role=CourseGroupMember.ROLE_MEMBER,
+        ).update(course=membership.group.course_id, student=membership.student_id,
+                 group=membership.group_id)
+
+
+@receiver(post_delete, sender=GroupMembership)
+def group_membership_remove_group_members(sender, **kwargs):
+    membership = kwargs['instance']
+    CourseGroupMember.objects.filter(
+        group_id=membership.group_id, student_id=membership.student_id,
+        role=CourseGroupMember.ROLE_MEMBER).delete()
+
+
+@receiver(post_save, sender=GroupMembership)
+def group_membership_update_summary(sender, **kwargs):
+    membership, created = kwargs['instance'], kwargs['created']
+    if created:
+        CourseSummary.add(membership.group.course_id, member_count=1)
+    elif membership.get_field_diff('group'):
+        refresh_course_summaries(*Group.objects.filter(
+            pk__in=[membership.get_old_field('group'), membership.group_id],
+        ).values_list('course_id', flat=True))
+    membership.save_all_field_diff()
+
+
+@receiver(post_delete, sender=GroupMembership)
+def group_membership_remove_from_summary(sender, **kwargs):
+    membership = kwargs['instance']
+    CourseSummary.add(membership.group.course_id, member_count=-1)
+
+
+@receiver(post_save, sender=GroupMembership)
+@receiver(post_delete, sender=GroupMembership)
+def group_membership_bump_versions(sender, **kwargs):
+    membership = kwargs['instance']
+    bump_resource_versions(get_course_resource_key(membership.group.course_id, 'analytics'),
+                           get_course_resource_key(membership.group.course_id, 'groups'))
+
+
+class CourseGroupMember(models.Model):
+    """
+    Who is in which group of a course, leaders and members alike.
+
+    Mirrors `Group.leader` and `GroupMembership`, kept in sync by their signal
+    handlers and by the bulk paths of `Course`, so that being in a group of a
+    course is a single indexed lookup instead of two ORed joins.  It also
+    guarantees a student is in at most one group of a course.
+    Use `refresh_course_group_members` after changes bypassing signals.
+    """
+    ROLE_LEADER = 'leader'
+    ROLE_MEMBER = 'member'
+    ROLE_CHOICES = (
+        (ROLE_LEADER, 'Leader'),
+        (ROLE_MEMBER, 'Member'),
+    )
+
+    course = models.ForeignKey(Course, related_name='group_members')
+    student = models.ForeignKey(Student, related_name='course_group_members')
+    group = models.ForeignKey(Group, related_name='course_group_members')
+    role = models.CharField(max_length=10, choices=ROLE_CHOICES)
+
+    class Meta:
+        unique_together = (('course', 'student'), )
+        index_together = (('group', 'role'), )
+
+    def __str__(self):
+        return '({group})-({student})-{role}'.format(
+            group=str(self.group), student=str(self.student), role=self.role)
+
+
+class GroupRequest(models.Model):
+    """
+    A queued request of a student to create a group, used in sign-up rush mode.
+
+    Requests are checked cheaply against the cached roster of the course when
+    enqueued, and committed by a single worker in arrival order, see
+    `process_group_requests`.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_DONE = 'done'
+    STATUS_REJECTED = 'rejected'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_REJECTED, 'Rejected'),
+        (STATUS_FAILED, 'Failed'),
+    )
+
+    course = models.ForeignKey(Course, related_name='group_requests')
+    leader = models.ForeignKey(Student, related_name='group_requests')
+    name = models.CharField(max_length=255, default='', blank=True)
+    member_pks = models.TextField(
+        default='',
+        blank=True,
+        help_text='Comma separated pks of members.',
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    error = models.TextField(default='', blank=True)
+    group = models.ForeignKey(Group, related_name='+', null=True, blank=True,
+                              on_delete=models.SET_NULL)
+    created_dtm = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='created time',
+    )
+
+    class Meta:
+        index_together = (('status', 'id'), )
+
+    def __str__(self):
+        return '{course}-{leader}-{status}'.format(
+            course=str(self.course), leader=str(self.leader), status=self.status)
+
+    @classmethod
+    def enqueue(cls, course, leader, name='', members=()):
+        """
+        Queue a group creation request without touching groups of the course
+
+        Raise ValidationError if the leader or a member does not take the course,
+        by the cached roster.
+        :param members: pks of members
+        """
+        member_pks = sorted(set(int(pk) for pk in members))
+        roster = get_course_roster(course.pk)
+        if leader.pk not in roster:
+            raise ValidationError({'leader': 'Group leader does not take the course.'})
+        if leader.pk in member_pks:
+            raise ValidationError({'members': 'Group leader cannot be a member.'})
+        not_taking = [pk for pk in member_pks if pk not in roster]
+        if not_taking:
+            raise ValidationError({
+                'members': 'Students {0} do not take the course.'.format(not_taking)
+            })
+        return cls.objects.create(course=course, leader=leader, name=name,
+                                  member_pks=','.join(str(pk) for pk in member_pks))
+
+    def get_member_pks(self):
+        return [int(pk) for pk in self.member_pks.split(',') if pk]
+
+    def process(self):
+        """
+        Create the requested group, or record why not
+
+        Requests breaking a rule are rejected.  Any other error, e.g. an
+        `IntegrityError` of a concurrent insert, fails the request instead of
+        leaving it pending, so that the requests behind it are still processed.
+        """
+        member_pks = self.get_member_pks()
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    if CourseGroupMember.objects.filter(
+                            course_id=self.course_id,
+                            student_id__in=[self.leader_id] + member_pks).exists():
+                        raise ValidationError({'members': 'Some students are already in a group.'})
+                    members = list(Student.objects.filter(pk__in=member_pks))
+                    if len(members) != len(member_pks):
+                        raise ValidationError({'members': 'Some students do not exist.'})
+                    self.group = self.course.add_group(members=members, name=self.name,
+                                                       leader_id=self.leader_id)
+            except ValidationError as e:
+                self.status = self.STATUS_REJECTED
+                self.error = ' '.join(e.messages)
+            except Exception as e:
+                self.group = None
+                self.status = self.STATUS_FAILED
+                self.error = '{0}: {1}'.format(type(e).__name__, e)
+            else:
+                self.status = self.STATUS_DONE
+            self.save()
+
+
+class AssignmentQuerySet(models.QuerySet):
+    def with_no_in_course(self):
+        """
+        Annotate `no_in_course`, the ranking number of each assignment in its course
+
+        Assignments are ranked by time assigned, then by id.  Counted in the same
+        query with a correlated subquery, see `Assignment.get_no_in_course`.
+        """
+        qn = connection.ops.quote_name
+        table = qn(Assignment._meta.db_table)
+        return self.extra(select={
+            'no_in_course': (
+                'SELECT COUNT(*) FROM {table} AS {other} '
+                'WHERE {other}.{course} = {table}.{course} '
+                'AND ({other}.{dtm} < {table}.{dtm} '
+                'OR ({other}.{dtm} = {table}.{dtm} AND {other}.{id} <= {table}.{id}))'
+            ).format(
+                table=table, other=qn('other_assignment'), course=qn('course_id'),
+                dtm=qn('assigned_dtm'), id=qn('id'),
+            ),
+        })
+
+
+class AssignmentManager(models.Manager):
+    pass
+
+
 class Assignment(models.Model):
 
     course = models.ForeignKey(Course, related_name='assignments')
@@ -1614,9 +2604,12 @@ class Assignment(models.Model):
         ]
     )
 
+    objects = AssignmentManager.from_queryset(AssignmentQuerySet)()
+
     class Meta:
         verbose_name = "course assignment"
         verbose_name_plural = "course assignments"
+        index_together = (('course', 'assigned_dtm'), ('course', 'deadline_dtm'), )
 
     def __str__(self):
         return '{course}-#{no}-{title}'.format(
@@ -1646,19 +2639,46 @@ class Assignment(models.Model):
         """
         Return the ranking digital number of this assignment in its course
         according to the time assigned
+
+        Use the value annotated by `AssignmentQuerySet.with_no_in_course` if any,
+        otherwise count with one query.
         """
-        qs_list = []
-        for assignmt in self.course.assignments.all():
-            qs_list.append((assignmt.id, assignmt.assigned_dtm))
-        ranking = 1
-        while qs_list:
-            oldest = min(qs_list, key=lambda e: e[1])
-            if oldest[0] == self.id:
-                break
-            else:
-                ranking += 1
-                qs_list.remove(oldest)
-        return ranking
+        no_in_course = getattr(self, 'no_in_course', None)
+        if no_in_course is not None:
+            return no_in_course
+        return self.course.assignments.filter(
+            Q(assigned_dtm__lt=self.assigned_dtm) |
+            Q(assigned_dtm=self.assigned_dtm, pk__lte=self.pk)
+        ).count()
+
+
+@receiver(post_save, sender=Assignment)
+def assignment_update_summary(sender, **kwargs):
+    assignment, created = kwargs['instance'], kwargs['created']
+    if created:
+        CourseSummary.add(assignment.course_id, assignment_count=1)
+
+
+@receiver(post_delete, sender=Assignment)
+def assignment_remove_from_summary(sender, **kwargs):
+    assignment = kwargs['instance']
+    CourseSummary.add(assignment.course_id, assignment_count=-1)
+
+
+@receiver(post_save, sender=Assignment)
+@receiver(post_delete, sender=Assignment)
+def assignment_bump_versions(sender, **kwargs):
+    assignment = kwargs['instance']
+    bump_resource_versions(get_course_resource_key(assignment.course_id, 'calendar'),
+                           get_course_resource_key(assignment.course_id, 'assignments'))
+    if kwargs.get('created', True):
+        bump_resource_versions(get_course_resource_key(assignment.course_id, 'gradebook'))
+
+
+@receiver(post_delete, sender=Assignment)
+def assignment_bump_gradebook_removals(sender, **kwargs):
+    assignment = kwargs['instance']
+    bump_resource_versions(get_course_resource_key(assignment.course_id, 'gradebook_removals'))
 
 
 class Takes(ModelDiffMixin, models.Model):
@@ -1866,6 +2886,30 @@ class Takes(ModelDiffMixin, models.Model):
             student.remove_perms_for_course_stu(stu.user)
 
 
+@receiver(post_save, sender=Takes)
+def takes_update_summary(sender, **kwargs):
+    """
+    Connected before `takes_assign_perms`, which resets the field diff.
+    """
+    takes, created = kwargs['instance'], kwargs['created']
+    if created:
+        CourseSummary.add(takes.course_id, student_count=1,
+                          **CourseSummary.get_grade_deltas(None, takes.grade))
+    elif takes.get_field_diff('course'):
+        refresh_course_summaries(takes.get_old_field('course'), takes.course_id)
+    elif takes.get_field_diff('grade'):
+        old_grade, new_grade = takes.get_field_diff('grade')
+        CourseSummary.add(takes.course_id,
+                          **CourseSummary.get_grade_deltas(old_grade, new_grade))
+
+
+@receiver(post_delete, sender=Takes)
+def takes_remove_from_summary(sender, **kwargs):
+    takes = kwargs['instance']
+    CourseSummary.add(takes.course_id, student_count=-1,
+                      **CourseSummary.get_grade_deltas(takes.grade, None))
+
+
 @receiver(post_save, sender=Takes)
 def takes_assign_perms(sender, **kwargs):
     """
@@ -1889,6 +2933,7 @@ def takes_assign_perms(sender, **kwargs):
             old_stu = Student.objects.get(pk=old_stu_pk)
             takes.remove_student_perms(old_stu)
             takes.assign_student_perms()
+            bump_resource_versions(get_student_resource_key(old_stu_pk, 'transcript'))
 
     takes.save_all_field_diff()
 
@@ -1900,8 +2945,366 @@ def takes_remove_perms(sender, **kwargs):
     takes.remove_student_perms(takes.student)
 
 
+@receiver(post_save, sender=Takes)
+@receiver(post_delete, sender=Takes)
+def takes_bump_versions(sender, **kwargs):
+    takes = kwargs['instance']
+    bump_resource_versions(get_student_resource_key(takes.student_id, 'transcript'),
+                           get_course_resource_key(takes.course_id, 'analytics'),
+                           get_course_resource_key(takes.course_id, 'takes'))
+    if kwargs.get('created', True):
+        bump_resource_versions(get_course_resource_key(takes.course_id, 'gradebook'),
+                               get_course_resource_key(takes.course_id, 'roster'))
+
+
+@receiver(post_delete, sender=Takes)
+def takes_bump_gradebook_removals(sender, **kwargs):
+    takes = kwargs['instance']
+    bump_resource_versions(get_course_resource_key(takes.course_id, 'gradebook_removals'))
+
+
+class AssignmentScore(models.Model):
+    takes = models.ForeignKey(Takes, related_name='assignment_scores')
+    assignment = models.ForeignKey(Assignment, related_name='scores')
+    score = models.DecimalField(
+        max_digits=5,
+        decimal_places=2,
+        validators=[MinValueValidator(0), MaxValueValidator(100), ]
+    )
+    modified_dtm = models.DateTimeField(
+        auto_now=True,
+        verbose_name='modified time',
+    )
+
+    class Meta:
+        unique_together = (('takes', 'assignment'), )
+
+    def __str__(self):
+        return '({takes})-({assignment})'.format(
+            takes=str(self.takes),
+            assignment=self.assignment.title,
+        )
+
+    def validate_takes(self):
+        """
+        Takes and assignment should belong to the same course
+        """
+        if self.takes.course_id != self.assignment.course_id:
+            raise ValidationError({'takes': 'Student does not take the course of the assignment.'})
+
+    def clean(self):
+        self.validate_takes()
+
+    def save(self, *args, **kwargs):
+        self.full_clean()
+        super(AssignmentScore, self).save(*args, **kwargs)
+
+
+@receiver(post_save, sender=AssignmentScore)
+@receiver(post_delete, sender=AssignmentScore)
+def assignment_score_bump_versions(sender, **kwargs):
+    score = kwargs['instance']
+    bump_resource_versions(get_course_resource_key(score.assignment.course_id, 'gradebook'))
+
+
+@receiver(post_delete, sender=AssignmentScore)
+def assignment_score_bump_gradebook_removals(sender, **kwargs):
+    score = kwargs['instance']
+    bump_resource_versions(
+        get_course_resource_key(score.assignment.course_id, 'gradebook_removals'))
+
+
+class CourseSummary(models.Model):
+    """
+    Counters of a course, so that listing courses needs no per-course counting.
+
+    Signal handlers of takes, groups, group memberships and assignments keep them
+    up to date with F() increments.  Use `refresh_course_summaries` after changes
+    bypassing signals, e.g. bulk updates.
+    """
+    course = models.OneToOneField(Course, related_name='summary')
+    student_count = models.IntegerField(default=0)
+    group_count = models.IntegerField(default=0)
+    member_count = models.IntegerField(
+        default=0,
+        help_text='Count of group members, excluding leaders.',
+    )
+    assignment_count = models.IntegerField(default=0)
+    graded_count = models.IntegerField(default=0)
+    grade_total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name_plural = 'course summaries'
+
+    def __str__(self):
+        return 'summary of {course}'.format(course=str(self.course))
+
+    @property
+    def ungrouped_count(self):
+        # every group has exactly one leader
+        return self.student_count - self.group_count - self.member_count
+
+    @property
+    def average_grade(self):
+        return get_grade_average(self.grade_total, self.graded_count)
+
+    @classmethod
+    def add(cls, course_pk, **deltas):
+        """
+        Add deltas to counters of a course with one UPDATE
+
+        e.g. `CourseSummary.add(1, student_count=1)`
+        """
+        deltas = dict((name, F(name) + delta) for name, delta in deltas.items() if delta)
+        if deltas:
+            cls.objects.filter(course_id=course_pk).update(**deltas)
+
+    @staticmethod
+    def get_grade_deltas(old_grade, new_grade):
+        """
+        Return deltas of grade counters when a grade changes from `old_grade` to `new_grade`
+
+        Either grade can be `None`.
+        """
+        return dict(
+            graded_count=(new_grade is not None) - (old_grade is not None),
+            grade_total=(new_grade or 0) - (old_grade or 0),
+        )
+
+
+class ResourceVersion(models.Model):
+    """
+    Version counter of a cacheable resource, e.g. the gradebook of a course.
+
+    Bump it whenever the resource changes, so that payloads cached under an
+    older version are never served again.
+    """
+    key = models.CharField(max_length=255, unique=True)
+    version = models.PositiveIntegerField(default=0)
+    modified_dtm = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='modified time',
+    )
+
+    def __str__(self):
+        return '{key}-v{version}'.format(key=self.key, version=self.version)
+
+
 # Global Functions
 # ------------------------------------------------------------------------------
+def get_course_resource_key(course_pk, name):
+    """
+    Return the `ResourceVersion` key of a resource of a course
+
+    e.g. `get_course_resource_key(1, 'gradebook')` to `'course:1:gradebook'`
+    """
+    return 'course:{0}:{1}'.format(course_pk, name)
+
+
+def get_student_resource_key(student_pk, name):
+    """
+    Return the `ResourceVersion` key of a resource of a student
+
+    e.g. `get_student_resource_key(1, 'transcript')` to `'student:1:transcript'`
+    """
+    return 'student:{0}:{1}'.format(student_pk, name)
+
+
+def get_resource_versions(*keys):
+    """
+    Return versions of resources with one query
+
+    :param keys: `ResourceVersion` keys
+    :return: dict mapping key to (version, modified time), (0, None) if never bumped
+    """
+    versions = dict((key, (0, None)) for key in keys)
+    for key, version, modified_dtm in ResourceVersion.objects.filter(
+            key__in=keys).values_list('key', 'version', 'modified_dtm'):
+        versions[key] = (version, modified_dtm)
+    return versions
+
+
+def bump_resource_versions(*keys):
+    """
+    Increase versions of resources atomically
+
+    Existing counters are increased with batched UPDATEs, missing ones are created.
+    :param keys: `ResourceVersion` keys
+    """
+    now = timezone.now()
+    keys = sorted(set(keys))
+    for start in range(0, len(keys), 300):
+        batch = keys[start:start + 300]
+        query = ResourceVersion.objects.filter(key__in=batch)
+        query.update(version=F('version') + 1, modified_dtm=now)
+        existing = set(query.values_list('key', flat=True))
+        for key in batch:
+            if key in existing:
+                continue
+            try:
+                with transaction.atomic():
+                    ResourceVersion.objects.create(key=key, version=1, modified_dtm=now)
+            except IntegrityError:
+                # created concurrently
+                ResourceVersion.objects.filter(key=key).update(
+                    version=F('version') + 1, modified_dtm=now)
+
+
+def get_course_roster(course_pk):
+    """
+    Return pks of students taking a course, cached until its takes change
+
+    :return: frozenset of student pks
+    """
+    version_key = get_course_resource_key(course_pk, 'roster')
+    version = get_resource_versions(version_key)[version_key][0]
+    cache_key = 'roster:{0}:{1}'.format(course_pk, version)
+    roster = cache.get(cache_key)
+    if roster is None:
+        roster = frozenset(Takes.objects.filter(
+            course_id=course_pk).values_list('student_id', flat=True))
+        cache.set(cache_key, roster)
+    return roster
+
+
+def process_group_requests(limit=None):
+    """
+    Process pending group requests in arrival order
+
+    Only one worker should run at a time, so that requests never race.
+    :param limit: max number of requests to process, all if `None`
+    :return: count of requests processed
+    """
+    requests = GroupRequest.objects.filter(
+        status=GroupRequest.STATUS_PENDING).select_related('course').order_by('id')
+    if limit is not None:
+        requests = requests[:limit]
+    count = 0
+    for group_request in requests:
+        group_request.process()
+        count += 1
+    return count
+
+
+def build_transcript(courses, semesters):
+    """
+    Assemble a transcript from its courses and per-semester grade sums
+
+    :param courses: list of course dicts, in semester order
+    :param semesters: list of dicts of `year`, `semester`, `total` and `count` of grades,
+        in semester order
+    :return: dict of `courses`, `semesters` and `average`
+    """
+    total = sum(semester['total'] for semester in semesters)
+    count = sum(semester['count'] for semester in semesters)
+    return {
+        'courses': courses,
+        'semesters': [
+            dict(year=semester['year'], semester=semester['semester'],
+                 average=get_grade_average(semester['total'], semester['count']),
+                 count=semester['count'])
+            for semester in semesters
+        ],
+        'average': get_grade_average(total, count),
+    }
+
+
+def mask_transcript(transcript, visible_takes, graded_takes):
+    """
+    Limit a transcript to what a user may see
+
+    Courses whose takes are not visible are dropped, grades of takes not graded are
+    set to `None`, and averages are recomputed from the remaining grades.
+    :param transcript: dict returned by `Student.get_transcript`
+    :param visible_takes: set of pks of takes the user can view
+    :param graded_takes: set of pks of takes whose grade the user can view
+    :return: masked transcript
+    """
+    courses = transcript['courses']
+    if all(row['id'] in visible_takes and row['id'] in graded_takes for row in courses):
+        return transcript
+
+    courses = [
+        dict(row, grade=row['grade'] if row['id'] in graded_takes else None)
+        for row in courses if row['id'] in visible_takes
+    ]
+    semesters = []
+    for row in courses:
+        if not semesters or (semesters[-1]['year'], semesters[-1]['semester']) != (
+                row['year'], row['semester']):
+            semesters.append(dict(year=row['year'], semester=row['semester'], total=0, count=0))
+        if row['grade'] is not None:
+            semesters[-1]['total'] += row['grade']
+            semesters[-1]['count'] += 1
+    return build_transcript(courses, semesters)
+
+
+def refresh_course_summaries(*course_pks):
+    """
+    Recompute counters of courses from scratch
+
+    Missing summaries are created, and pks of missing courses are ignored.
+    :param course_pks: pks of courses
+    """
+    course_pks = list(Course.objects.filter(
+        pk__in=[pk for pk in course_pks if pk]).values_list('pk', flat=True))
+    if not course_pks:
+        return
+
+    def count_by_course(queryset, course_field):
+        return dict(queryset.filter(**{course_field + '__in': course_pks}).order_by().values_list(
+            course_field).annotate(count=Count('pk')))
+
+    student_counts = count_by_course(Takes.objects, 'course_id')
+    group_counts = count_by_course(Group.objects, 'course_id')
+    member_counts = count_by_course(GroupMembership.objects, 'group__course_id')
+    assignment_counts = count_by_course(Assignment.objects, 'course_id')
+    grades = dict(
+        (row['course_id'], row)
+        for row in Takes.objects.filter(course_id__in=course_pks).order_by().values(
+            'course_id').annotate(total=Sum('grade'), count=Count('grade'))
+    )
+
+    for pk in course_pks:
+        CourseSummary.objects.update_or_create(course_id=pk, defaults=dict(
+            student_count=student_counts.get(pk, 0),
+            group_count=group_counts.get(pk, 0),
+            member_count=member_counts.get(pk, 0),
+            assignment_count=assignment_counts.get(pk, 0),
+            graded_count=grades[pk]['count'] if pk in grades else 0,
+            grade_total=(grades[pk]['total'] or 0) if pk in grades else 0,
+        ))
+
+
+def refresh_course_group_members(*course_pks):
+    """
+    Rebuild `CourseGroupMember` rows of courses from group leaders and memberships
+
+    Only the first group of a student in a course is kept.
+    :param course_pks: pks of courses
+    """
+    rows = list(Group.objects.filter(course_id__in=course_pks).order_by('pk').values_list(
+        'course_id', 'leader_id', 'pk'))
+    leader_count = len(rows)
+    rows.extend(GroupMembership.objects.filter(group__course_id__in=course_pks).order_by(
+        'group_id', 'pk').values_list('group__course_id', 'student_id', 'group_id'))
+
+    seen = set()
+    group_members = []
+    for i, (course_pk, student_pk, group_pk) in enumerate(rows):
+        if (course_pk, student_pk) in seen:
+            continue
+        seen.add((course_pk, student_pk))
+        group_members.append(CourseGroupMember(
+            course_id=course_pk, student_id=student_pk, group_id=group_pk,
+            role=(CourseGroupMember.ROLE_LEADER if i < leader_count
+                  else CourseGroupMember.ROLE_MEMBER),
+        ))
+    with transaction.atomic():
+        CourseGroupMember.objects.filter(course_id__in=course_pks).delete()
+        CourseGroupMember.objects.bulk_create(group_members, batch_size=300)
+
+
 def get_role_of(user):
     """
     Return an instance of one of the roles:['Student', 'Instructor', 'Assistant',
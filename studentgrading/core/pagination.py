@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+from django.utils import six
+
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+
+class DeadlineCursorPagination(CursorPagination):
+    """
+    Paginate assignments by deadline, soonest first.
+    """
+    ordering = ('deadline_dtm', 'id')
+    page_size = 20
+
+
+class StudentIdCursorPagination(CursorPagination):
+    """
+    Paginate students by student ID, which is unique.
+    """
+    ordering = ('s_id', )
+    page_size = 50
+
+
+class HeaderCursorPagination(CursorPagination):
+    """
+    Paginate by pk, keeping the page as a plain list in the response body.
+
+    Pagination is opt-in: lists are whole unless `?cursor`, `?page_size` or
+    `?count` is given, so clients not reading headers still get every item.
+    Links to the next and previous pages are given in the `Link` header.
+    Pages are fetched by keyset, so deep pages cost the same as the first one,
+    and nothing is counted unless asked with `?count=approximate`: then
+    `X-Approximate-Count` is the count of items up to `approximate_count_limit`,
+    e.g. `1000+` if there are more.
+
+    Pages of `values()` rows, e.g. those of `fastpath.FastPath`, are paginated
+    the same way.
+    """
+    ordering = ('id', )
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    count_query_param = 'count'
+    approximate_count_limit = 1000
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not any(param in request.query_params for param in (
+                self.cursor_query_param, self.page_size_query_param, self.count_query_param)):
+            return None
+        self.approximate_count = None
+        if request.query_params.get(self.count_query_param) == 'approximate':
+            self.approximate_count = (
+                queryset.order_by()[:self.approximate_count_limit + 1].count()
+            )
+        return super(HeaderCursorPagination, self).paginate_queryset(queryset, request, view)
+
+    def _get_position_from_instance(self, instance, ordering):
+        if isinstance(instance, dict):
+            return six.text_type(instance[ordering[0].lstrip('-')])
+        return super(HeaderCursorPagination, self)._get_position_from_instance(instance, ordering)
+
+    def get_paginated_response(self, data):
+        headers = {}
+        links = [
+            '<{0}>; rel="{1}"'.format(url, rel)
+            for url, rel in ((self.get_next_link(), 'next'), (self.get_previous_link(), 'prev'))
+            if url
+        ]
+        if links:
+            headers['Link'] = ', '.join(links)
+        if self.approximate_count is not None:
+            if self.approximate_count > self.approximate_count_limit:
+                headers['X-Approximate-Count'] = '{0}+'.format(self.approximate_count_limit)
+            else:
+                headers['X-Approximate-Count'] = str(self.approximate_count)
+        return Response(data, headers=headers)
+
+
+class DeadlineHeaderCursorPagination(HeaderCursorPagination):
+    """
+    Paginate assignments by deadline like `HeaderCursorPagination`.
+    """
+    ordering = ('deadline_dtm', 'id')
@@ -14,6 +14,19 @@ SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
 User = get_user_model()
 
 
+def get_permission_user(request):
+    """
+    Return the requesting user fetched again, with a fresh permission cache
+
+    It is fetched once per request, or once per batch of requests until a
+    request of the batch changes anything, see `viewsets.Batch`.
+    """
+    user = getattr(request, '_permission_user', None)
+    if user is None or user.pk != request.user.pk:
+        user = request._permission_user = User.objects.get(pk=request.user.pk)
+    return user
+
+
 class FourLevelObjectPermissions(permissions.BasePermission):
     """
     A variant based on DjangoModelPermissions and DjangoObjectPermissions
@@ -74,7 +87,7 @@ class FourLevelObjectPermissions(permissions.BasePermission):
             request.user and
             (request.user.is_authenticated() or not self.authenticated_users_only) and
             # Repopulate the permission cache
-            User.objects.get(pk=request.user.pk).has_perm(perms[0])
+            get_permission_user(request).has_perm(perms[0])
         )
 
     def get_required_object_permissions(self, method, model_cls):
@@ -97,7 +110,7 @@ class FourLevelObjectPermissions(permissions.BasePermission):
 
         model_cls = queryset.model
         # Repopulate the permission cache
-        user = User.objects.get(pk=request.user.pk)
+        user = get_permission_user(request)
 
         perms = self.get_required_object_permissions(request.method, model_cls)
 
@@ -178,3 +191,48 @@ class IsInstructor(permissions.BasePermission):
 
         return isinstance(user_role, Instructor)
 
+
+class IsCourseInstructor(permissions.BasePermission):
+    """
+    Allows access only to instructors giving the course of the object.
+
+    The object should be a `Course` or have a `course` attribute.
+    """
+
+    def has_permission(self, request, view):
+        user_role = get_role_of(request.user)
+
+        return isinstance(user_role, Instructor)
+
+    def has_object_permission(self, request, view, obj):
+        course = obj if isinstance(obj, Course) else obj.course
+
+        return course.is_given_by(get_role_of(request.user))
+
+
+class IsCourseMember(permissions.BasePermission):
+    """
+    Allows access only to students taking or instructors giving the course of the object.
+
+    The object should be a `Course` or have a `course` attribute.
+    """
+
+    def has_object_permission(self, request, view, obj):
+        course = obj if isinstance(obj, Course) else obj.course
+        user_role = get_role_of(request.user)
+
+        if isinstance(user_role, Student):
+            return course.is_taken_by(user_role)
+        if isinstance(user_role, Instructor):
+            return course.is_given_by(user_role)
+        return False
+
+
+class CanChangeGroupLeader(permissions.BasePermission):
+    """
+    Allows access only to users who may change the leader of the group object,
+    i.e. its leader and instructors of its course.
+    """
+
+    def has_object_permission(self, request, view, obj):
+        return has_four_level_perm('core.change_group_advanced', request.user, obj)
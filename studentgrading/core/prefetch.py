@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""
+Plan how to load querysets for read serializers.
+
+A plan is built once per serializer class by walking its declared fields:
+
+* nested serializers and non pk-only relations to one object are `select_related`,
+* `many=True` relations and serializers are `prefetch_related`,
+* columns read by the fields are loaded with `only()`, when all of them are known.
+
+`only()` is never applied to models using `ModelDiffMixin`, which read every field
+on init, so deferring any of them would cost one query per instance.
+"""
+from django.core.exceptions import FieldDoesNotExist
+
+from rest_framework import serializers
+from rest_framework.relations import ManyRelatedField, RelatedField
+
+from .models import ModelDiffMixin
+
+
+def can_defer(model):
+    """
+    Return whether fields of `model` can be deferred without extra queries
+    """
+    return not issubclass(model, ModelDiffMixin)
+
+
+def get_model_field(model, name):
+    """
+    Return the field or relation `name` of `model`, also looked up by attname,
+    or `None` if there is none
+    """
+    try:
+        return model._meta.get_field(name)
+    except FieldDoesNotExist:
+        for field in model._meta.concrete_fields:
+            if field.attname == name:
+                return field
+        return None
+
+
+def join_lookup(path, name):
+    return '{0}__{1}'.format(path, name) if path else name
+
+
+class PrefetchPlan(object):
+    """
+    Relations and columns read by a serializer, see `get_prefetch_plan`.
+
+    `only` is `None` when some column read by the serializer cannot be told,
+    e.g. a field reading a method or a `SerializerMethodField`.  Names listed in
+    `unresolved` are read from the model but are no fields of it, so `only()`
+    is only applied if the queryset annotates all of them.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.select_related = []
+        self.prefetch_related = []
+        self.only = []
+        self.unresolved = []
+
+    def apply(self, queryset):
+        """
+        Return `queryset` loading everything in this plan
+        """
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*self.prefetch_related)
+        if self.only is not None and can_defer(queryset.model):
+            annotated = set(queryset.query.annotations) | set(queryset.query.extra)
+            if annotated.issuperset(self.unresolved):
+                queryset = queryset.only(*self.only)
+        return queryset
+
+    def add_relation(self, path, prefetched):
+        lookups = self.prefetch_related if prefetched else self.select_related
+        if path not in lookups:
+            lookups.append(path)
+
+    def add_serializer(self, serializer, model, path='', prefetched=False):
+        """
+        Add fields of `serializer` reading instances of `model`
+
+        :param path: lookup of `model` from the planned model, '' for itself
+        :param prefetched: whether `model` is loaded by `prefetch_related`
+        :return: lookups of columns read, or `None` if unknown
+        """
+        columns = [join_lookup(path, model._meta.pk.name)]
+        known = True
+        for field in serializer.fields.values():
+            if field.write_only:
+                continue
+            if not self.add_field(field, model, path, prefetched, columns):
+                known = False
+        return columns if known else None
+
+    def add_field(self, field, model, path, prefetched, columns):
+        """
+        Add a field reading instances of `model`, and the columns it reads to `columns`
+
+        :return: whether the columns read are known
+        """
+        if isinstance(field, serializers.SerializerMethodField):
+            return False
+
+        if not field.source_attrs:
+            # source='*', the field reads the instance itself
+            if isinstance(field, serializers.BaseSerializer):
+                nested_columns = self.add_serializer(field, model, path, prefetched)
+                if nested_columns is None:
+                    return False
+                columns.extend(nested_columns)
+                return True
+            parent_field_name = getattr(field, 'parent_field_name', None)
+            if parent_field_name:
+                # child hyperlinks read the foreign key to the parent only
+                columns.append(join_lookup(path, parent_field_name))
+                return True
+            if isinstance(field, RelatedField):
+                lookup_field = field.lookup_field
+                if lookup_field == 'pk':
+                    lookup_field = model._meta.pk.name
+                columns.append(join_lookup(path, lookup_field))
+                return True
+            return False
+
+        return self.add_single(field, model, field.source_attrs, path, prefetched, columns)
+
+    def add_single(self, field, model, source_attrs, path, prefetched, columns):
+        """
+        Add a field reading `source_attrs` of instances of `model`
+
+        :return: whether the columns read are known
+        """
+        # follow relations to one object up to the last attribute
+        for name in source_attrs[:-1]:
+            model_field = get_model_field(model, name)
+            if (model_field is None or not model_field.is_relation or
+                    model_field.many_to_many or model_field.one_to_many):
+                return False
+            path = join_lookup(path, name)
+            self.add_relation(path, prefetched)
+            if model_field.concrete:
+                columns.append(path)
+            model = model_field.related_model
+            if not (model_field.concrete and can_defer(model)):
+                # load the related instance with all its columns
+                columns = []
+
+        name = source_attrs[-1]
+        model_field = get_model_field(model, name)
+        lookup = join_lookup(path, name)
+        if model_field is None:
+            if not path:
+                self.unresolved.append(name)
+            return not path
+
+        if isinstance(field, (ManyRelatedField, serializers.ListSerializer)):
+            if not model_field.is_relation:
+                return False
+            self.add_relation(lookup, True)
+            child = getattr(field, 'child_relation', None) or field.child
+            if isinstance(child, serializers.BaseSerializer):
+                self.add_serializer(child, model_field.related_model, lookup, True)
+            return True
+
+        if not model_field.is_relation:
+            columns.append(lookup)
+            return True
+        if model_field.many_to_many or model_field.one_to_many:
+            return False
+
+        related_model = model_field.related_model
+        if model_field.concrete:
+            columns.append(lookup)
+        if isinstance(field, serializers.BaseSerializer):
+            self.add_relation(lookup, prefetched)
+            nested_columns = self.add_serializer(field, related_model, lookup, prefetched)
+            if model_field.concrete and nested_columns is not None and can_defer(related_model):
+                columns.extend(nested_columns)
+        elif not (isinstance(field, RelatedField) and
+                  field.use_pk_only_optimization() and model_field.concrete):
+            self.add_relation(lookup, prefetched)
+        return True
+
+
+_prefetch_plans = {}
+
+
+def get_prefetch_plan(serializer_class, **kwargs):
+    """
+    Return the `PrefetchPlan` of a model serializer class, built on first use
+
+    :param kwargs: arguments of the serializer choosing its fields, i.e. `fields`
+        and `exclude` of `SparseFieldsetMixin`
+    """
+    key = (serializer_class, ) + tuple(
+        (name, tuple(sorted(value))) for name, value in sorted(kwargs.items()) if value is not None
+    )
+    plan = _prefetch_plans.get(key)
+    if plan is None:
+        serializer = serializer_class(**kwargs)
+        plan = PrefetchPlan(serializer.Meta.model)
+        plan.only = plan.add_serializer(serializer, plan.model)
+        _prefetch_plans[key] = plan
+    return plan
+
+
+def prefetch_for_serializer(queryset, serializer_class, **kwargs):
+    """
+    Return `queryset` loading everything `serializer_class` reads, see `PrefetchPlan`
+    """
+    return get_prefetch_plan(serializer_class, **kwargs).apply(queryset)
@@ -1,15 +1,21 @@
 # -*- coding: utf-8 -*-
+from collections import OrderedDict
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.urlresolvers import reverse, resolve, Resolver404
+from django.db import models
 
 from rest_framework import serializers
-from rest_framework.relations import reverse
 
 from .models import (
-    Student, Class, Course, Takes,
-    Instructor, Teaches, Group, GroupMembership,
-    has_four_level_perm, Assignment,
+    Student, Class, Course, CourseSummary, Takes,
+    Instructor, Teaches, Group, GroupMembership, GroupRequest,
+    has_four_level_perm, ObjectPermissionCache, Assignment,
     get_role_of,
 )
+from ..utils.grading import CURVE_METHODS, CURVE_TARGET
+from ..utils import hyperlinks
 
 from studentgrading.users import serializers as users_serializers
 
@@ -17,7 +23,24 @@ from studentgrading.users import serializers as users_serializers
 # -----------------------------------------------------------------------------
 # Custom Fields Class
 # -----------------------------------------------------------------------------
-class ChildHyperlinkedIdentityField(serializers.HyperlinkedIdentityField):
+class HyperlinkedPkField(hyperlinks.HyperlinkedRelatedField):
+    """
+    Accept a hyperlink like `HyperlinkedRelatedField`, but return the pk in it
+    without looking up the object.
+    """
+
+    def get_object(self, view_name, view_args, view_kwargs):
+        return int(view_kwargs[self.lookup_url_kwarg])
+
+
+def get_parent_pk(obj, parent_field_name):
+    """
+    Return the pk of the parent of `obj` from its foreign key, without loading the parent
+    """
+    return getattr(obj, obj._meta.get_field(parent_field_name).attname)
+
+
+class ChildHyperlinkedIdentityField(hyperlinks.HyperlinkedIdentityField):
 
     def __init__(self, *args, **kwargs):
         self.parent_field_name = kwargs.pop('parent_field_name', None)
@@ -39,19 +62,31 @@ class ChildHyperlinkedIdentityField(serializers.HyperlinkedIdentityField):
 
     def get_url(self, obj, view_name, request, format):
         url_kwargs = {
-            self.get_parent_query_lookup(): getattr(obj, self.get_parent_field_name()).pk,
+            self.get_parent_query_lookup(): get_parent_pk(obj, self.get_parent_field_name()),
             'pk': obj.pk,
         }
-        return reverse(view_name, kwargs=url_kwargs, request=request, format=format)
+        return self.reverse(view_name, kwargs=url_kwargs, request=request, format=format)
+
 
+class ChildHyperlinkedRelatedField(hyperlinks.HyperlinkedRelatedField):
+    """
+    Link to a nested route, e.g. `courses/{parent_lookup_course}/instructors/{pk}`
 
-class ChildHyperlinkedRelatedField(serializers.HyperlinkedRelatedField):
+    Pass `ids_field` to show another attribute of the related object than its pk
+    in the compact representation, e.g. `instructor_id` of a teaches.
+    """
 
     def __init__(self, *args, **kwargs):
         self.parent_field_name = kwargs.pop('parent_field_name', None)
         self.parent_query_lookup = kwargs.pop('parent_query_lookup', None)
+        self.ids_field = kwargs.pop('ids_field', 'pk')
         super(ChildHyperlinkedRelatedField, self).__init__(*args, **kwargs)
 
+    def to_representation(self, value):
+        if hyperlinks.is_ids_repr(self.context.get('request')):
+            return getattr(value, self.ids_field)
+        return super(ChildHyperlinkedRelatedField, self).to_representation(value)
+
     def get_parent_field_name(self):
         assert self.parent_field_name is not None, (
             "'%s' should either include a `parent_field_name` attribute, "
@@ -67,10 +102,10 @@ class ChildHyperlinkedRelatedField(serializers.HyperlinkedRelatedField):
 
     def get_url(self, obj, view_name, request, format):
         url_kwargs = {
-            self.get_parent_query_lookup(): getattr(obj, self.get_parent_field_name()).pk,
+            self.get_parent_query_lookup(): get_parent_pk(obj, self.get_parent_field_name()),
             'pk': obj.pk,
         }
-        return reverse(view_name, kwargs=url_kwargs, request=request, format=format)
+        return self.reverse(view_name, kwargs=url_kwargs, request=request, format=format)
 
     def get_object(self, view_name, view_args, view_kwargs):
         parent_query_lookup = self.get_parent_query_lookup()
@@ -81,6 +116,159 @@ class ChildHyperlinkedRelatedField(serializers.HyperlinkedRelatedField):
         return self.get_queryset().get(**lookup_kwargs)
 
 
+# -----------------------------------------------------------------------------
+# Sparse Fieldsets
+# -----------------------------------------------------------------------------
+class SparseFieldsetMixin(object):
+    """
+    Keep only the fields named in the `fields` argument, and drop those named
+    in `exclude`, e.g. from `?fields=` and `?exclude=`.
+
+    Dropped fields are never evaluated, and are left out of the prefetch plan too.
+    Masked fields are popped from the representation for this reason.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.sparse_fields = kwargs.pop('fields', None)
+        self.sparse_exclude = kwargs.pop('exclude', None)
+        super(SparseFieldsetMixin, self).__init__(*args, **kwargs)
+
+    def get_fields(self):
+        fields = super(SparseFieldsetMixin, self).get_fields()
+        for param, names in (('fields', self.sparse_fields), ('exclude', self.sparse_exclude)):
+            unknown = [name for name in names or () if name not in fields]
+            if unknown:
+                raise serializers.ValidationError({
+                    param: 'Unknown fields: {0}.'.format(', '.join(unknown))
+                })
+
+        for name in list(fields):
+            if ((self.sparse_fields is not None and name not in self.sparse_fields) or
+                    (self.sparse_exclude and name in self.sparse_exclude)):
+                del fields[name]
+        return fields
+
+
+# -----------------------------------------------------------------------------
+# Expandable Relations
+# -----------------------------------------------------------------------------
+def get_permission_cache(request):
+    """
+    Return the `ObjectPermissionCache` of the requesting user, shared by all
+    serializers of the request
+    """
+    permission_cache = getattr(request, '_permission_cache', None)
+    if permission_cache is None or permission_cache.user != request.user:
+        permission_cache = request._permission_cache = ObjectPermissionCache(request.user)
+    return permission_cache
+
+
+class VisibleListSerializer(serializers.ListSerializer):
+    """
+    List only the objects the requesting user can view, see `ObjectPermissionCache.can_view`
+    """
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.Manager) else data
+        request = self.context.get('request')
+        if request is not None:
+            permission_cache = get_permission_cache(request)
+            iterable = [item for item in iterable if permission_cache.can_view(item)]
+        return super(VisibleListSerializer, self).to_representation(iterable)
+
+
+class ExpandableFieldsMixin(object):
+    """
+    Replace the hyperlinks named in the `expand` argument by the objects they
+    link to, e.g. from `?expand=instructors,groups.members`.
+
+    `expandable_fields` maps field names to the name of the read serializer of
+    linked objects and its arguments.  Dotted names expand fields of expanded
+    objects in turn.  Every expanded object is masked by its own permissions,
+    loaded for all objects of the response at once by the root serializer, and
+    expanded lists leave out objects the user cannot view, like list views do.
+    """
+    expandable_fields = {}
+
+    def __init__(self, *args, **kwargs):
+        self.expand_paths = kwargs.pop('expand', None) or ()
+        self.permissions_prefetched = False
+        super(ExpandableFieldsMixin, self).__init__(*args, **kwargs)
+
+    def get_expansions(self):
+        """
+        Return dotted names to expand in each expanded field, by field name
+        """
+        expansions = OrderedDict()
+        for path in self.expand_paths:
+            name, _, rest = path.partition('.')
+            expansions.setdefault(name, [])
+            if rest:
+                expansions[name].append(rest)
+        return expansions
+
+    def get_fields(self):
+        fields = super(ExpandableFieldsMixin, self).get_fields()
+        expansions = self.get_expansions()
+        unknown = [name for name in expansions if name not in self.expandable_fields]
+        if unknown:
+            raise serializers.ValidationError({
+                'expand': 'Cannot expand fields: {0}.'.format(', '.join(unknown))
+            })
+
+        for name, expand in expansions.items():
+            serializer_name, kwargs = self.expandable_fields[name]
+            serializer_class = globals()[serializer_name]
+            kwargs = dict(kwargs)
+            if kwargs.pop('many', False):
+                fields[name] = VisibleListSerializer(
+                    child=serializer_class(read_only=True, expand=expand),
+                    read_only=True, **kwargs
+                )
+            else:
+                fields[name] = serializer_class(read_only=True, expand=expand, **kwargs)
+        return fields
+
+    def collect_instances(self, instances, collected):
+        """
+        Add `instances` and all objects expanded from them to `collected`
+        """
+        instances = [instance for instance in instances if instance is not None]
+        collected.extend(instances)
+        for name in self.get_expansions():
+            field = self.fields.get(name)
+            if field is None:
+                # dropped by a sparse fieldset
+                continue
+            related = []
+            for instance in instances:
+                value = field.get_attribute(instance)
+                if isinstance(value, models.Manager):
+                    related.extend(value.all())
+                else:
+                    related.append(value)
+            getattr(field, 'child', field).collect_instances(related, collected)
+
+    def to_representation(self, instance):
+        if not self.permissions_prefetched:
+            self.permissions_prefetched = True
+            request = self.context.get('request')
+            if self.parent is None:
+                instances = [instance]
+            elif (isinstance(self.parent, serializers.ListSerializer) and
+                  self.parent.parent is None):
+                instances = self.parent.instance
+            else:
+                # objects expanded by the root are prefetched already
+                instances = None
+            if request is not None and instances is not None:
+                collected = []
+                self.collect_instances(instances, collected)
+                get_permission_cache(request).prefetch(collected)
+
+        return super(ExpandableFieldsMixin, self).to_representation(instance)
+
+
 # -----------------------------------------------------------------------------
 # Relationship Mixins
 # -----------------------------------------------------------------------------
@@ -105,16 +293,39 @@ class CreateTakesMixin(object):
         return validated_data
 
 
-class ReadTakesMixin(object):
-    def to_representation(self, instance):
-        ret = super(ReadTakesMixin, self).to_representation(instance)
-        user = self.context['request'].user
-        if not has_four_level_perm('core.view_takes', user, instance):
-            del ret['grade']
+class MaskedFieldsMixin(object):
+    """
+    Remove fields from the representation by four-level permissions of the
+    requesting user on the instance.
+
+    `masked_fields` is a sequence of (perm, field names) from the highest level
+    down.  The names of each perm are removed when none of the perms up to it is
+    granted, i.e. the fields shown for each level are known before any instance.
+    """
+    masked_fields = ()
+
+    def get_masked_fields(self, instance):
+        user = get_permission_cache(self.context['request'])
+        masked = []
+        for perm, names in self.masked_fields:
+            if has_four_level_perm(perm, user, instance):
+                break
+            masked.extend(names)
+        return masked
 
+    def to_representation(self, instance):
+        ret = super(MaskedFieldsMixin, self).to_representation(instance)
+        for name in self.get_masked_fields(instance):
+            ret.pop(name, None)
         return ret
 
 
+class ReadTakesMixin(MaskedFieldsMixin):
+    masked_fields = (
+        ('core.view_takes', ('grade', )),
+    )
+
+
 class CreateTeachesMixin(object):
 
     def to_internal_value(self, data):
@@ -165,8 +376,8 @@ class CreateAssignmentMixin(object):
 # -----------------------------------------------------------------------------
 # Student Serializers
 # -----------------------------------------------------------------------------
-class CreateStudentSerializer(serializers.HyperlinkedModelSerializer):
-    takes = serializers.HyperlinkedIdentityField(
+class CreateStudentSerializer(hyperlinks.HyperlinkedModelSerializer):
+    takes = hyperlinks.HyperlinkedIdentityField(
         view_name='api:student-course-list',
         lookup_url_kwarg='parent_lookup_student',
     )
@@ -185,8 +396,11 @@ class CreateStudentSerializer(serializers.HyperlinkedModelSerializer):
         }
 
 
-class ReadStudentSerializer(serializers.HyperlinkedModelSerializer):
-    takes = serializers.HyperlinkedIdentityField(
+class ReadStudentSerializer(SparseFieldsetMixin,
+                            ExpandableFieldsMixin,
+                            MaskedFieldsMixin,
+                            hyperlinks.HyperlinkedModelSerializer):
+    takes = hyperlinks.HyperlinkedIdentityField(
         source='takes',
         view_name='api:student-course-list',
         lookup_url_kwarg='parent_lookup_student',
@@ -194,6 +408,10 @@ class ReadStudentSerializer(serializers.HyperlinkedModelSerializer):
 
     user = users_serializers.ReadlUserSerializer()
 
+    expandable_fields = {
+        'takes': ('ReadStudentTakesSerializer', {'many': True}),
+    }
+
     class Meta:
         model = Student
         fields = ('url', 'id', 'user', 'name', 'sex', 's_id', 's_class', 'takes', )
@@ -205,27 +423,18 @@ class ReadStudentSerializer(serializers.HyperlinkedModelSerializer):
             }
         }
 
-    def to_representation(self, instance):
-        ret = super(ReadStudentSerializer, self).to_representation(instance)
-        user = self.context['request'].user
-        if not has_four_level_perm('core.view_student', user, instance):
-            del ret['user']
-
-            if not has_four_level_perm('core.view_student_advanced', user, instance):
-                del ret['takes']
-
-                if not has_four_level_perm('core.view_student_normal', user, instance):
-                    del ret['s_id']
-                    del ret['s_class']
-
-        return ret
+    masked_fields = (
+        ('core.view_student', ('user', )),
+        ('core.view_student_advanced', ('takes', )),
+        ('core.view_student_normal', ('s_id', 's_class', )),
+    )
 
 
 # -----------------------------------------------------------------------------
 # Instructor Serializers
 # -----------------------------------------------------------------------------
-class CreateInstructorSerializer(serializers.HyperlinkedModelSerializer):
-    teaches = serializers.HyperlinkedIdentityField(
+class CreateInstructorSerializer(hyperlinks.HyperlinkedModelSerializer):
+    teaches = hyperlinks.HyperlinkedIdentityField(
         view_name='api:instructor-course-list',
         lookup_url_kwarg='parent_lookup_instructor',
     )
@@ -239,15 +448,22 @@ class CreateInstructorSerializer(serializers.HyperlinkedModelSerializer):
         }
 
 
-class ReadInstructorSerializer(serializers.HyperlinkedModelSerializer):
+class ReadInstructorSerializer(SparseFieldsetMixin,
+                               ExpandableFieldsMixin,
+                               MaskedFieldsMixin,
+                               hyperlinks.HyperlinkedModelSerializer):
 
-    teaches = serializers.HyperlinkedIdentityField(
+    teaches = hyperlinks.HyperlinkedIdentityField(
         view_name='api:instructor-course-list',
         lookup_url_kwarg='parent_lookup_instructor',
     )
 
     user = users_serializers.ReadlUserSerializer()
 
+    expandable_fields = {
+        'teaches': ('ReadInstructorTeachesSerializer', {'many': True}),
+    }
+
     class Meta:
         model = Instructor
         fields = ('url', 'id', 'user', 'name', 'sex', 'inst_id', 'teaches')
@@ -257,23 +473,17 @@ class ReadInstructorSerializer(serializers.HyperlinkedModelSerializer):
             'user': {'view_name': 'api:user-detail', },
         }
 
-    def to_representation(self, instance):
-        ret = super(ReadInstructorSerializer, self).to_representation(instance)
-        user = self.context['request'].user
-        if not has_four_level_perm('core.view_instructor', user, instance):
-            del ret['user']
-
-            if not has_four_level_perm('core.view_instructor_normal', user, instance):
-                del ret['inst_id']
-
-        return ret
+    masked_fields = (
+        ('core.view_instructor', ('user', )),
+        ('core.view_instructor_normal', ('inst_id', )),
+    )
 
 
 # -----------------------------------------------------------------------------
 # StudentTakes Serializers (students/{pk}/courses/)
 # -----------------------------------------------------------------------------
 class CreateStudentTakesSerializer(CreateTakesMixin,
-                                     serializers.HyperlinkedModelSerializer):
+                                   hyperlinks.HyperlinkedModelSerializer):
 
     url = ChildHyperlinkedIdentityField(
         view_name='api:student-course-detail',
@@ -289,14 +499,21 @@ class CreateStudentTakesSerializer(CreateTakesMixin,
         }
 
 
-class ReadStudentTakesSerializer(ReadTakesMixin,
-                                   serializers.HyperlinkedModelSerializer):
+class ReadStudentTakesSerializer(SparseFieldsetMixin,
+                                 ExpandableFieldsMixin,
+                                 ReadTakesMixin,
+                                 hyperlinks.HyperlinkedModelSerializer):
 
     url = ChildHyperlinkedIdentityField(
         view_name='api:student-course-detail',
         parent_field_name='student',
     )
 
+    expandable_fields = {
+        'student': ('ReadStudentSerializer', {}),
+        'course': ('ReadCourseSerializer', {}),
+    }
+
     class Meta:
         model = Takes
         fields = ('url', 'id', 'student', 'course', 'grade')
@@ -318,7 +535,7 @@ class BaseWriteStudentTakesSerializer(CreateStudentTakesSerializer):
 # InstructorTeaches Serializers (instructors/{pk}/courses/)
 # -----------------------------------------------------------------------------
 class CreateInstructorTeachesSerializer(CreateTeachesMixin,
-                                        serializers.HyperlinkedModelSerializer):
+                                        hyperlinks.HyperlinkedModelSerializer):
 
     url = ChildHyperlinkedIdentityField(
         view_name='api:instructor-course-detail',
@@ -334,13 +551,20 @@ class CreateInstructorTeachesSerializer(CreateTeachesMixin,
         }
 
 
-class ReadInstructorTeachesSerializer(serializers.HyperlinkedModelSerializer):
+class ReadInstructorTeachesSerializer(SparseFieldsetMixin,
+                                      ExpandableFieldsMixin,
+                                      hyperlinks.HyperlinkedModelSerializer):
 
     url = ChildHyperlinkedIdentityField(
         view_name='api:instructor-course-detail',
         parent_field_name='instructor',
     )
 
+    expandable_fields = {
+        'instructor': ('ReadInstructorSerializer', {}),
+        'course': ('ReadCourseSerializer', {}),
+    }
+
     class Meta:
         model = Teaches
         fields = ('url', 'id', 'instructor', 'course')
@@ -354,7 +578,26 @@ class ReadInstructorTeachesSerializer(serializers.HyperlinkedModelSerializer):
 # -----------------------------------------------------------------------------
 # Course Serializers (courses/{pk}/)
 # -----------------------------------------------------------------------------
-class ReadCourseSerializer(serializers.HyperlinkedModelSerializer):
+class CourseSummarySerializer(serializers.ModelSerializer):
+
+    ungrouped_count = serializers.IntegerField(read_only=True)
+    average_grade = serializers.DecimalField(
+        max_digits=5,
+        decimal_places=2,
+        read_only=True,
+    )
+
+    class Meta:
+        model = CourseSummary
+        fields = ('student_count', 'group_count', 'ungrouped_count',
+                  'assignment_count', 'average_grade')
+        read_only_fields = fields
+
+
+class ReadCourseSerializer(SparseFieldsetMixin,
+                           ExpandableFieldsMixin,
+                           MaskedFieldsMixin,
+                           hyperlinks.HyperlinkedModelSerializer):
 
     instructors = ChildHyperlinkedRelatedField(
         source='teaches',
@@ -362,18 +605,26 @@ class ReadCourseSerializer(serializers.HyperlinkedModelSerializer):
         read_only=True,
         view_name='api:course-instructor-detail',
         parent_field_name='course',
+        ids_field='instructor_id',
     )
 
-    groups = serializers.HyperlinkedRelatedField(
+    groups = hyperlinks.HyperlinkedRelatedField(
         many=True,
         read_only=True,
         view_name='api:group-detail',
     )
 
+    summary = CourseSummarySerializer(read_only=True)
+
+    expandable_fields = {
+        'instructors': ('ReadCourseTeachesSerializer', {'source': 'teaches', 'many': True}),
+        'groups': ('ReadGroupSerializer', {'many': True}),
+    }
+
     class Meta:
         model = Course
         fields = ('url', 'id', 'title', 'year', 'semester', 'description',
-                  'min_group_size', 'max_group_size', 'instructors', 'groups')
+                  'min_group_size', 'max_group_size', 'instructors', 'groups', 'summary')
         read_only_fields = (
             'title', 'year', 'semester', 'description',
             'min_group_size', 'max_group_size', 'instructors'
@@ -382,30 +633,24 @@ class ReadCourseSerializer(serializers.HyperlinkedModelSerializer):
             'url': {'view_name': 'api:course-detail'},
         }
 
-    def to_representation(self, instance):
-        ret = super(ReadCourseSerializer, self).to_representation(instance)
-        user = self.context['request'].user
-        if not has_four_level_perm('core.view_course', user, instance):
-            del ret['min_group_size']
-            del ret['max_group_size']
-            del ret['groups']
-
-            if not has_four_level_perm('core.view_course_advanced', user, instance):
-                del ret['instructors']
-
-        return ret
+    # the summary carries the average grade, so only course instructors see it
+    masked_fields = (
+        ('core.change_course_base', ('summary', )),
+        ('core.view_course', ('min_group_size', 'max_group_size', 'groups', )),
+        ('core.view_course_advanced', ('instructors', )),
+    )
 
 
-class CreateCourseSerializer(serializers.HyperlinkedModelSerializer):
+class CreateCourseSerializer(hyperlinks.HyperlinkedModelSerializer):
 
-    instructors = serializers.HyperlinkedRelatedField(
+    instructors = hyperlinks.HyperlinkedRelatedField(
         many=True,
         required=False,
         queryset=Instructor.objects.all(),
         view_name='api:instructor-detail',
     )
 
-    groups = serializers.HyperlinkedRelatedField(
+    groups = hyperlinks.HyperlinkedRelatedField(
         many=True,
         read_only=True,
         view_name='api:group-detail',
@@ -447,7 +692,7 @@ class BaseWriteCourseSerializer(CreateCourseSerializer):
 # CourseInstructors Serializers (courses/{pk}/instructors/)
 # -----------------------------------------------------------------------------
 class CourseTeachesSerializer(CreateTeachesMixin,
-                              serializers.HyperlinkedModelSerializer):
+                              hyperlinks.HyperlinkedModelSerializer):
 
     url = ChildHyperlinkedIdentityField(
         view_name='api:course-instructor-detail',
@@ -463,13 +708,20 @@ class CourseTeachesSerializer(CreateTeachesMixin,
         }
 
 
-class ReadCourseTeachesSerializer(serializers.HyperlinkedModelSerializer):
+class ReadCourseTeachesSerializer(SparseFieldsetMixin,
+                                  ExpandableFieldsMixin,
+                                  hyperlinks.HyperlinkedModelSerializer):
 
     url = ChildHyperlinkedIdentityField(
         view_name='api:course-instructor-detail',
         parent_field_name='course',
     )
 
+    expandable_fields = {
+        'instructor': ('ReadInstructorSerializer', {}),
+        'course': ('ReadCourseSerializer', {}),
+    }
+
     class Meta:
         model = Teaches
         fields = ('url', 'id', 'instructor', 'course')
@@ -484,7 +736,7 @@ class ReadCourseTeachesSerializer(serializers.HyperlinkedModelSerializer):
 # CourseTakes Serializers (courses/{pk}/takes/)
 # -----------------------------------------------------------------------------
 class CreateCourseTakesSerializer(CreateTakesMixin,
-                                     serializers.HyperlinkedModelSerializer):
+                                  hyperlinks.HyperlinkedModelSerializer):
 
     url = ChildHyperlinkedIdentityField(
         view_name='api:course-takes-detail',
@@ -500,14 +752,21 @@ class CreateCourseTakesSerializer(CreateTakesMixin,
         }
 
 
-class ReadCourseTakesSerializer(ReadTakesMixin,
-                                   serializers.HyperlinkedModelSerializer):
+class ReadCourseTakesSerializer(SparseFieldsetMixin,
+                                ExpandableFieldsMixin,
+                                ReadTakesMixin,
+                                hyperlinks.HyperlinkedModelSerializer):
 
     url = ChildHyperlinkedIdentityField(
         view_name='api:course-takes-detail',
         parent_field_name='course',
     )
 
+    expandable_fields = {
+        'student': ('ReadStudentSerializer', {}),
+        'course': ('ReadCourseSerializer', {}),
+    }
+
     class Meta:
         model = Takes
         fields = ('url', 'id', 'student', 'course', 'grade')
@@ -527,11 +786,11 @@ class BaseWriteCourseTakesSerializer(CreateCourseTakesSerializer):
 # -----------------------------------------------------------------------------
 # Group Serializers (groups/, courses/{pk}/groups/)
 # -----------------------------------------------------------------------------
-class CreateGroupSerializer(serializers.HyperlinkedModelSerializer):
+class CreateGroupSerializer(hyperlinks.HyperlinkedModelSerializer):
     """
     Serializer for create a group.
     """
-    members = serializers.HyperlinkedRelatedField(
+    members = hyperlinks.HyperlinkedRelatedField(
         many=True,
         required=False,
         queryset=Student.objects.all(),
@@ -553,21 +812,26 @@ class CreateGroupSerializer(serializers.HyperlinkedModelSerializer):
         Accept student urls as parameters to `members` and `leader`.
         """
         members_data = validated_data.pop('members', None)
-        group = Group.objects.create(**validated_data)
-        if members_data:
-            for member in members_data:
-                GroupMembership.objects.create(student=member, group=group)
-        return group
+        course = validated_data.pop('course')
+        return course.add_group(members=members_data or (), **validated_data)
 
 
-class ReadGroupSerializer(serializers.HyperlinkedModelSerializer):
+class ReadGroupSerializer(SparseFieldsetMixin,
+                          ExpandableFieldsMixin,
+                          hyperlinks.HyperlinkedModelSerializer):
 
-    members = serializers.HyperlinkedRelatedField(
+    members = hyperlinks.HyperlinkedRelatedField(
         many=True,
         read_only=True,
         view_name='api:student-detail',
     )
 
+    expandable_fields = {
+        'course': ('ReadCourseSerializer', {}),
+        'leader': ('ReadStudentSerializer', {}),
+        'members': ('ReadStudentSerializer', {'many': True}),
+    }
+
     class Meta:
         model = Group
         fields = ('url', 'id', 'number', 'name', 'course', 'leader', 'members', )
@@ -579,9 +843,9 @@ class ReadGroupSerializer(serializers.HyperlinkedModelSerializer):
         }
 
 
-class WriteGroupSerializer(serializers.HyperlinkedModelSerializer):
+class WriteGroupSerializer(hyperlinks.HyperlinkedModelSerializer):
 
-    members = serializers.HyperlinkedRelatedField(
+    members = hyperlinks.HyperlinkedRelatedField(
         many=True,
         read_only=True,
         view_name='api:group-detail',
@@ -621,7 +885,9 @@ class WriteGroupSerializer(serializers.HyperlinkedModelSerializer):
 # -----------------------------------------------------------------------------
 # Group Serializers (groups/, courses/{pk}/groups/)
 # -----------------------------------------------------------------------------
-class ReadAssignmentSerializer(serializers.HyperlinkedModelSerializer):
+class ReadAssignmentSerializer(SparseFieldsetMixin,
+                               ExpandableFieldsMixin,
+                               hyperlinks.HyperlinkedModelSerializer):
 
     deadline = serializers.DateTimeField(
         source='deadline_dtm',
@@ -638,6 +904,10 @@ class ReadAssignmentSerializer(serializers.HyperlinkedModelSerializer):
         read_only=True,
     )
 
+    expandable_fields = {
+        'course': ('ReadCourseSerializer', {}),
+    }
+
     class Meta:
         model = Assignment
         fields = ('url', 'id', 'course', 'title', 'description', 'deadline',
@@ -651,7 +921,7 @@ class ReadAssignmentSerializer(serializers.HyperlinkedModelSerializer):
 
 
 class CreateAssignmentSerializer(CreateAssignmentMixin,
-                                 serializers.HyperlinkedModelSerializer):
+                                 hyperlinks.HyperlinkedModelSerializer):
 
     deadline = serializers.DateTimeField(
         source='deadline_dtm',
@@ -679,7 +949,7 @@ class CreateAssignmentSerializer(CreateAssignmentMixin,
         }
 
 
-class WriteAssignmentSerializer(serializers.HyperlinkedModelSerializer):
+class WriteAssignmentSerializer(hyperlinks.HyperlinkedModelSerializer):
 
     deadline = serializers.DateTimeField(
         source='deadline_dtm',
@@ -707,10 +977,198 @@ class WriteAssignmentSerializer(serializers.HyperlinkedModelSerializer):
         }
 
 
-class ClassSerializer(serializers.HyperlinkedModelSerializer):
+class AssignmentScoreEntrySerializer(serializers.Serializer):
+    """
+    One entry of bulk score entry: a student and his/her score.
+    """
+    student = serializers.IntegerField()
+    score = serializers.DecimalField(
+        max_digits=5,
+        decimal_places=2,
+        min_value=0,
+        max_value=100,
+    )
 
-    url = serializers.HyperlinkedIdentityField(view_name='api:class-detail')
-    students = serializers.HyperlinkedRelatedField(
+
+class GradebookQuerySerializer(serializers.Serializer):
+    """
+    Query parameters of the gradebook.
+    """
+    since = serializers.DateTimeField(required=False)
+
+
+class UpcomingAssignmentsQuerySerializer(serializers.Serializer):
+    """
+    Query parameters of upcoming assignments.
+    """
+    days = serializers.IntegerField(required=False, default=14, min_value=1, max_value=365)
+
+
+class FormGroupsSerializer(serializers.Serializer):
+    """
+    Parameters of automatic group formation.
+    """
+    balance = serializers.ChoiceField(
+        choices=('class', 'grade'),
+        required=False,
+        allow_null=True,
+        default=None,
+    )
+
+
+class GroupSpecSerializer(serializers.Serializer):
+    """
+    One group of a bulk group creation.
+    """
+    leader = HyperlinkedPkField(
+        queryset=Student.objects.all(),
+        view_name='api:student-detail',
+    )
+    members = HyperlinkedPkField(
+        many=True,
+        required=False,
+        queryset=Student.objects.all(),
+        view_name='api:student-detail',
+    )
+    name = serializers.CharField(required=False, allow_blank=True, default='')
+
+
+class AddGroupsSerializer(serializers.Serializer):
+    """
+    Parameters of a bulk group creation.
+    """
+    groups = GroupSpecSerializer(many=True)
+
+
+class CandidateQuerySerializer(serializers.Serializer):
+    """
+    Query parameters of candidate students.
+    """
+    search = serializers.CharField(required=False, allow_blank=True, default='')
+
+
+class CandidateStudentSerializer(serializers.Serializer):
+    """
+    A student who may join a group, with only what a student picker shows.
+    """
+    id = serializers.IntegerField()
+    s_id = serializers.CharField()
+    name = serializers.CharField()
+    s_class = serializers.CharField(source='s_class.class_id')
+
+
+class TransferLeadershipSerializer(serializers.Serializer):
+    """
+    Parameters of transferring the leadership of a group.
+    """
+    leader = HyperlinkedPkField(
+        queryset=Student.objects.all(),
+        view_name='api:student-detail',
+    )
+
+
+class SignupRushSerializer(serializers.Serializer):
+    """
+    Parameters of turning sign-up rush mode on or off.
+    """
+    enabled = serializers.BooleanField()
+
+
+class EnqueueGroupSerializer(serializers.Serializer):
+    """
+    Parameters of a group creation request queued in sign-up rush mode.
+    """
+    name = serializers.CharField(required=False, allow_blank=True, default='')
+    members = HyperlinkedPkField(
+        many=True,
+        required=False,
+        queryset=Student.objects.all(),
+        view_name='api:student-detail',
+    )
+
+
+class GroupRequestSerializer(hyperlinks.HyperlinkedModelSerializer):
+
+    class Meta:
+        model = GroupRequest
+        fields = ('url', 'id', 'course', 'leader', 'name', 'status', 'error', 'group', )
+        read_only_fields = fields
+        extra_kwargs = {
+            'url': {'view_name': 'api:grouprequest-detail'},
+            'course': {'view_name': 'api:course-detail'},
+            'leader': {'view_name': 'api:student-detail'},
+            'group': {'view_name': 'api:group-detail'},
+        }
+
+
+class CohortQuerySerializer(serializers.Serializer):
+    """
+    Query parameters of cohort analytics.
+    """
+    title = serializers.CharField(max_length=255)
+
+
+class CurveGradesSerializer(serializers.Serializer):
+    """
+    Parameters of grade curving.
+    """
+    method = serializers.ChoiceField(choices=CURVE_METHODS)
+    scale = serializers.FloatField(required=False, default=1)
+    offset = serializers.FloatField(required=False, default=0)
+    target_mean = serializers.FloatField(required=False, min_value=0, max_value=100)
+    target_sd = serializers.FloatField(required=False, min_value=0)
+    commit = serializers.BooleanField(required=False, default=False)
+
+    def validate(self, data):
+        if data['method'] == CURVE_TARGET and 'target_mean' not in data:
+            raise serializers.ValidationError({'target_mean': 'This field is required.'})
+        return data
+
+
+class TranscriptCourseSerializer(serializers.Serializer):
+    """
+    One course of a transcript.
+
+    Grade is removed unless its takes is in `graded_takes` of the context.
+    """
+    id = serializers.IntegerField()
+    course = serializers.SerializerMethodField()
+    title = serializers.CharField()
+    year = serializers.IntegerField()
+    semester = serializers.CharField()
+    grade = serializers.DecimalField(max_digits=5, decimal_places=2, allow_null=True)
+
+    def get_course(self, obj):
+        request = self.context['request']
+        if hyperlinks.is_ids_repr(request):
+            return obj['course']
+        return hyperlinks.reverse('api:course-detail', kwargs={'pk': obj['course']},
+                                  request=request)
+
+    def to_representation(self, instance):
+        ret = super(TranscriptCourseSerializer, self).to_representation(instance)
+        if instance['id'] not in self.context['graded_takes']:
+            del ret['grade']
+        return ret
+
+
+class TranscriptSemesterSerializer(serializers.Serializer):
+    year = serializers.IntegerField()
+    semester = serializers.CharField()
+    average = serializers.DecimalField(max_digits=5, decimal_places=2, allow_null=True)
+    count = serializers.IntegerField()
+
+
+class TranscriptSerializer(serializers.Serializer):
+    courses = TranscriptCourseSerializer(many=True)
+    semesters = TranscriptSemesterSerializer(many=True)
+    average = serializers.DecimalField(max_digits=5, decimal_places=2, allow_null=True)
+
+
+class ClassSerializer(hyperlinks.HyperlinkedModelSerializer):
+
+    url = hyperlinks.HyperlinkedIdentityField(view_name='api:class-detail')
+    students = hyperlinks.HyperlinkedRelatedField(
         many=True,
         queryset=Class.objects.all(),
         view_name='api:student-detail',
@@ -722,3 +1180,42 @@ class ClassSerializer(serializers.HyperlinkedModelSerializer):
         read_only_fields = ('url', 'class_id', )
 
 
+class BatchRequestSerializer(serializers.Serializer):
+    """
+    One request of a batch, see `viewsets.Batch`.
+
+    `url` is an API path relative to the host, with an optional query string.
+    """
+    method = serializers.ChoiceField(choices=('GET', 'POST', 'PUT', 'PATCH', 'DELETE'),
+                                     default='GET')
+    url = serializers.CharField()
+    body = serializers.JSONField(required=False)
+
+    def validate_url(self, value):
+        path = value.partition('?')[0]
+        if not path.startswith(reverse('api:api-root')):
+            raise serializers.ValidationError('Enter an API path relative to the host.')
+        try:
+            func = resolve(path).func
+        except Resolver404:
+            # answered by a 404 in the batch
+            return value
+        # also matches format suffixes, e.g. batch.json
+        if func == resolve(reverse('api:batch')).func:
+            raise serializers.ValidationError('Batches cannot be nested.')
+        return value
+
+
+class BatchSerializer(serializers.Serializer):
+    """
+    Requests of a batch, at most `settings.BATCH_MAX_REQUESTS` of them.
+    """
+    requests = BatchRequestSerializer(many=True)
+
+    def validate_requests(self, value):
+        if not value:
+            raise serializers.ValidationError('This list may not be empty.')
+        if len(value) > settings.BATCH_MAX_REQUESTS:
+            raise serializers.ValidationError(
+                'Ensure this list has at most {0} requests.'.format(settings.BATCH_MAX_REQUESTS))
+        return value
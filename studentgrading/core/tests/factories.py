@@ -11,7 +11,7 @@ from studentgrading.core.models import (
     Assignment, Course, UserProfile, Student, Instructor,
     Class, Takes, Teaches, Group, ContactInfoType, ContactInfo,
     StudentContactInfo, InstructorContactInfo, GroupContactInfo,
-    GroupMembership,
+    GroupMembership, AssignmentScore,
 )
 
 
@@ -197,3 +197,13 @@ class GroupMembershipFactory(factory.django.DjangoModelFactory):
 
     student = factory.SubFactory(StudentFactory)
     group = factory.SubFactory(GroupFactory)
+
+
+class AssignmentScoreFactory(factory.django.DjangoModelFactory):
+    class Meta:
+        model = AssignmentScore
+
+    assignment = factory.SubFactory(AssignmentFactory)
+    takes = factory.SubFactory(TakesFactory,
+                               course=factory.SelfAttribute('..assignment.course'))
+    score = factory.LazyAttribute(lambda o: Decimal(random.randint(0, 10000)) / 100)
@@ -10,18 +10,31 @@ from django.db.models.signals import post_save
 from django.utils import timezone
 
 from django.test import TestCase
+from django.core.cache import cache
+from decimal import Decimal
 from guardian.shortcuts import remove_perm, assign_perm
 import environ
 from . import factories
 from ..models import (
-    Course, Student, Instructor, ContactInfoType, import_student, get_role_of,
+    Course, Student, Instructor, ContactInfoType, import_student, get_role_of, Group,
     Assignment,
-    assign_four_level_perm, has_four_level_perm
+    assign_four_level_perm, has_four_level_perm,
+    get_course_resource_key, get_resource_versions, bump_resource_versions,
+    mask_transcript, refresh_course_summaries, CourseSummary,
+    GroupRequest, get_course_roster, process_group_requests,
+    CourseGroupMember, refresh_course_group_members,
 )
 
 User = get_user_model()
 
 
+def none_first(value):
+    """
+    Sort key putting `None` before any value, which Python 3 cannot compare
+    """
+    return value is not None, value
+
+
 class UserTests(TestCase):
 
     def test_save(self):
@@ -148,6 +161,40 @@ class StudentMethodTests(TestCase):
         self.assertTrue(stu1.is_classmate_of(stu2))
         self.assertTrue(stu2.is_classmate_of(stu1))
 
+    def test_get_transcript(self):
+        stu1 = factories.StudentFactory()
+        cs1 = factories.CourseFactory(title='B', year=2015, semester='AUT')
+        cs2 = factories.CourseFactory(title='A', year=2015, semester='AUT')
+        cs3 = factories.CourseFactory(title='C', year=2015, semester='SPG')
+        cs4 = factories.CourseFactory(title='D', year=2016, semester='SPG')
+        t1 = factories.TakesFactory(student=stu1, course=cs1, grade=Decimal('80'))
+        t2 = factories.TakesFactory(student=stu1, course=cs2, grade=Decimal('91'))
+        t3 = factories.TakesFactory(student=stu1, course=cs3, grade=Decimal('70'))
+        t4 = factories.TakesFactory(student=stu1, course=cs4, grade=None)
+
+        with self.assertNumQueries(2):
+            transcript = stu1.get_transcript()
+        # spring comes before autumn
+        self.assertEqual([row['id'] for row in transcript['courses']],
+                         [t3.pk, t2.pk, t1.pk, t4.pk])
+        self.assertEqual(
+            [(row['year'], row['semester'], row['average'], row['count'])
+             for row in transcript['semesters']],
+            [(2015, 'SPG', Decimal('70'), 1), (2015, 'AUT', Decimal('85.50'), 2),
+             (2016, 'SPG', None, 0)],
+        )
+        self.assertEqual(transcript['average'], Decimal('80.33'))
+
+        # masking
+        self.assertIs(mask_transcript(transcript, {t1.pk, t2.pk, t3.pk, t4.pk},
+                                      {t1.pk, t2.pk, t3.pk, t4.pk}), transcript)
+        masked = mask_transcript(transcript, {t1.pk, t2.pk, t3.pk}, {t1.pk, t3.pk})
+        self.assertEqual([row['id'] for row in masked['courses']], [t3.pk, t2.pk, t1.pk])
+        self.assertIsNone(masked['courses'][1]['grade'])
+        self.assertEqual([row['average'] for row in masked['semesters']],
+                         [Decimal('70'), Decimal('80')])
+        self.assertEqual(masked['average'], Decimal('75'))
+
     def test_is_taking_same_course(self):
         course = factories.CourseFactory()
         stu1 = factories.StudentTakesCourseFactory(courses__course=course)
@@ -217,6 +264,20 @@ class StudentManagerTests(TestCase):
         self.assertEqual(Student.objects.not_in_any_group_of(course1.pk).count(), 3)
         self.assertEqual(Student.objects.in_any_group(False).count(), 3)
 
+    def test_ungrouped_in(self):
+        course1 = factories.CourseFactory()
+        course2 = factories.CourseFactory()
+        stu1 = factories.StudentTakesCourseFactory(courses__course=course1)
+        stu2 = factories.StudentTakesCourseFactory(courses__course=course1)
+        factories.TakesFactory(student=stu2, course=course2)
+        factories.StudentTakesCourseFactory(courses__course=course2)
+        factories.GroupFactory(course=course1, members=(stu1, ))
+        factories.GroupFactory(course=course2, leader=stu2)
+
+        self.assertEqual(list(Student.objects.ungrouped_in(course1)), [stu2])
+        self.assertEqual(list(Student.objects.ungrouped_in(course1.pk)), [stu2])
+        self.assertEqual(Student.objects.ungrouped_in(course2).count(), 1)
+
 
 class StudentPermsTests(TestCase):
     def test_has_perms_for_course_stu(self):
@@ -409,6 +470,22 @@ class CourseAssignmentMethodTests(TestCase):
         self.assertEqual(ca2.get_no_in_course(), 2)
         self.assertEqual(ca3.get_no_in_course(), 3)
 
+    def test_with_no_in_course(self):
+        course = factories.CourseFactory()
+        ca1 = factories.AssignmentFactory(course=course)
+        ca2 = factories.AssignmentFactory(course=course)
+        ca3 = factories.AssignmentFactory(course=course)
+        factories.AssignmentFactory()
+        # same assigned time ranks by id
+        Assignment.objects.filter(pk=ca3.pk).update(assigned_dtm=ca1.assigned_dtm)
+
+        with self.assertNumQueries(1):
+            numbers = dict(
+                (assignmt.pk, assignmt.get_no_in_course())
+                for assignmt in Assignment.objects.filter(course=course).with_no_in_course()
+            )
+        self.assertEqual(numbers, {ca1.pk: 1, ca3.pk: 2, ca2.pk: 3})
+
 
 class GroupMethodTests(TestCase):
 
@@ -439,6 +516,44 @@ class GroupMethodTests(TestCase):
         grp3 = factories.GroupFactory(course=course)
         self.assertEqual(grp3.number, course.NUMBERS_LIST[0])
 
+    def test_save_with_number(self):
+        course1 = factories.CourseFactory()
+        grp1 = factories.GroupFactory(course=course1)
+        stu1 = factories.StudentTakesCourseFactory(courses__course=course1)
+
+        # number taken by a concurrent save, which validation did not see
+        grp2 = Group(course=course1, leader=stu1)
+        self.assertFalse(grp2.save_with_number(grp1.number))
+        self.assertIsNone(grp2.pk)
+        self.assertTrue(grp2.save_with_number('AB'))
+        self.assertEqual(course1.get_used_group_numbers().count(), 2)
+
+    def test_transfer_leadership(self):
+        course1 = factories.CourseFactory()
+        inst1 = factories.InstructorTeachesCourseFactory(courses__course=course1)
+        stu1 = factories.StudentTakesCourseFactory(courses__course=course1)
+        stu2 = factories.StudentTakesCourseFactory(courses__course=course1)
+        stu3 = factories.StudentTakesCourseFactory(courses__course=course1)
+        grp1 = factories.GroupFactory(course=course1, leader=stu1, members=(stu2, ))
+
+        # not a member
+        with self.assertRaises(ValidationError) as cm:
+            grp1.transfer_leadership(stu3)
+        self.assertIn('leader', cm.exception.message_dict)
+
+        grp1.transfer_leadership(stu2)
+        self.assertEqual(grp1.leader, stu2)
+        grp1 = Group.objects.get(pk=grp1.pk)
+        self.assertEqual(grp1.leader, stu2)
+        self.assertEqual(list(grp1.members.all()), [stu1])
+        self.assertEqual(set(course1.group_members.values_list('student_id', 'role')),
+                         {(stu1.pk, 'member'), (stu2.pk, 'leader')})
+        self.assertTrue(grp1.has_perms_for_leader(stu2.user))
+        self.assertFalse(grp1.has_perms_for_leader(stu1.user))
+        self.assertTrue(grp1.has_perms_for_course_stu(stu1.user))
+        self.assertTrue(grp1.has_perms_for_course_inst(inst1.user))
+        self.assertEqual(CourseSummary.objects.get(course=course1).member_count, 1)
+
     def test_number(self):
         # check number
         course1 = factories.CourseFactory()
@@ -470,6 +585,144 @@ class GroupMethodTests(TestCase):
         group1 = factories.GroupFactory(course=course1, leader=stu1)
         self.assertTrue(course1.groups.filter(pk=group1.pk).exists())
 
+        # but not lead another group
+        with self.assertRaises(ValidationError) as cm:
+            factories.GroupFactory(course=course1, leader=stu1)
+        self.assertIn('leader', cm.exception.message_dict)
+
+
+class CourseGroupMemberTests(TestCase):
+
+    def get_rows(self, course):
+        return set(course.group_members.values_list('student_id', 'group_id', 'role'))
+
+    def test_sync(self):
+        course1 = factories.CourseFactory()
+        stu1 = factories.StudentTakesCourseFactory(courses__course=course1)
+        stu2 = factories.StudentTakesCourseFactory(courses__course=course1)
+        grp1 = factories.GroupFactory(course=course1, leader=stu1)
+        self.assertEqual(self.get_rows(course1), {(stu1.pk, grp1.pk, 'leader')})
+
+        membership = factories.GroupMembershipFactory(group=grp1, student=stu2)
+        self.assertEqual(self.get_rows(course1), {(stu1.pk, grp1.pk, 'leader'),
+                                                  (stu2.pk, grp1.pk, 'member')})
+
+        # change leader the way `WriteGroupSerializer` does
+        grp1.leader = stu2
+        grp1.save()
+        membership.delete()
+        factories.GroupMembershipFactory(group=grp1, student=stu1)
+        self.assertEqual(self.get_rows(course1), {(stu2.pk, grp1.pk, 'leader'),
+                                                  (stu1.pk, grp1.pk, 'member')})
+
+        grp1.delete()
+        self.assertEqual(self.get_rows(course1), set())
+
+    def test_bulk_paths(self):
+        course1 = factories.CourseFactory()
+        stus = [factories.StudentTakesCourseFactory(courses__course=course1) for i in range(4)]
+        grp1, = course1.add_groups([dict(leader=stus[0], members=[stus[1]])])
+        grp2 = course1.add_group(members=[stus[3]], leader=stus[2])
+        self.assertEqual(self.get_rows(course1), {
+            (stus[0].pk, grp1.pk, 'leader'), (stus[1].pk, grp1.pk, 'member'),
+            (stus[2].pk, grp2.pk, 'leader'), (stus[3].pk, grp2.pk, 'member'),
+        })
+
+    def test_refresh_course_group_members(self):
+        course1 = factories.CourseFactory()
+        stu1 = factories.StudentTakesCourseFactory(courses__course=course1)
+        grp1 = factories.GroupFactory(course=course1, members=(stu1, ))
+        rows = self.get_rows(course1)
+
+        CourseGroupMember.objects.all().delete()
+        refresh_course_group_members(course1.pk)
+        self.assertEqual(self.get_rows(course1), rows)
+        self.assertEqual(len(rows), 2)
+        self.assertIn((grp1.leader_id, grp1.pk, 'leader'), rows)
+
+
+class GroupRequestTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_get_course_roster(self):
+        course1 = factories.CourseFactory()
+        stu1 = factories.StudentTakesCourseFactory(courses__course=course1)
+        self.assertEqual(get_course_roster(course1.pk), {stu1.pk})
+        with self.assertNumQueries(1):
+            get_course_roster(course1.pk)
+
+        stu2 = factories.StudentTakesCourseFactory(courses__course=course1)
+        self.assertEqual(get_course_roster(course1.pk), {stu1.pk, stu2.pk})
+        stu1.takes.get(course=course1).delete()
+        self.assertEqual(get_course_roster(course1.pk), {stu2.pk})
+
+    def test_enqueue(self):
+        course1 = factories.CourseFactory()
+        stu1 = factories.StudentTakesCourseFactory(courses__course=course1)
+        stu2 = factories.StudentTakesCourseFactory(courses__course=course1)
+        stu3 = factories.StudentFactory()
+
+        with self.assertRaises(ValidationError) as cm:
+            GroupRequest.enqueue(course1, stu3)
+        self.assertIn('leader', cm.exception.message_dict)
+        with self.assertRaises(ValidationError) as cm:
+            GroupRequest.enqueue(course1, stu1, members=[stu3.pk])
+        self.assertIn('members', cm.exception.message_dict)
+        with self.assertRaises(ValidationError) as cm:
+            GroupRequest.enqueue(course1, stu1, members=[stu1.pk])
+        self.assertIn('members', cm.exception.message_dict)
+
+        group_request = GroupRequest.enqueue(course1, stu1, 'g', [stu2.pk])
+        self.assertEqual(group_request.status, GroupRequest.STATUS_PENDING)
+        self.assertEqual(group_request.get_member_pks(), [stu2.pk])
+        self.assertFalse(course1.groups.exists())
+
+    def test_process_group_requests(self):
+        course1 = factories.CourseFactory()
+        stu1 = factories.StudentTakesCourseFactory(courses__course=course1)
+        stu2 = factories.StudentTakesCourseFactory(courses__course=course1)
+        stu3 = factories.StudentTakesCourseFactory(courses__course=course1)
+
+        GroupRequest.enqueue(course1, stu1, 'first', [stu2.pk])
+        # stu2 is taken by the earlier request
+        GroupRequest.enqueue(course1, stu3, 'second', [stu2.pk])
+        GroupRequest.enqueue(course1, stu3, 'third')
+
+        self.assertEqual(process_group_requests(), 3)
+        self.assertEqual(process_group_requests(), 0)
+
+        req1, req2, req3 = GroupRequest.objects.order_by('id')
+        self.assertEqual(req1.status, GroupRequest.STATUS_DONE)
+        self.assertEqual(req1.group.leader, stu1)
+        self.assertEqual(list(req1.group.members.all()), [stu2])
+        self.assertTrue(req1.group.has_perms_for_leader(stu1.user))
+        self.assertEqual(req2.status, GroupRequest.STATUS_REJECTED)
+        self.assertTrue(req2.error)
+        self.assertIsNone(req2.group)
+        self.assertEqual(req3.status, GroupRequest.STATUS_DONE)
+        self.assertEqual(course1.groups.count(), 2)
+
+    def test_process_failed(self):
+        course1 = factories.CourseFactory()
+        stu1 = factories.StudentTakesCourseFactory(courses__course=course1)
+        group_request = GroupRequest.enqueue(course1, stu1, 'first')
+
+        def add_group(**kwargs):
+            factories.GroupFactory(course=course1)
+            raise IntegrityError('UNIQUE constraint failed')
+        group_request.course.add_group = add_group
+
+        group_request.process()
+        group_request.refresh_from_db()
+        self.assertEqual(group_request.status, GroupRequest.STATUS_FAILED)
+        self.assertIn('IntegrityError', group_request.error)
+        self.assertIsNone(group_request.group)
+        # the group added before the error is rolled back
+        self.assertFalse(course1.groups.exists())
+        self.assertEqual(process_group_requests(), 0)
+
 
 class GroupMembershipMethodTests(TestCase):
 
@@ -619,6 +872,18 @@ class CourseMethodTests(TestCase):
         factories.GroupFactory(course=course)
         self.assertEqual(course.get_next_group_number(), course.NUMBERS_LIST[1])
 
+    def test_get_free_group_numbers(self):
+        course = factories.CourseFactory()
+        for i in range(len(course.NUMBERS_LIST)):
+            factories.GroupFactory(course=course)
+        self.assertEqual(course.get_next_group_number(), 'AA')
+        grp = factories.GroupFactory(course=course)
+        self.assertEqual(grp.number, 'AA')
+
+        course.groups.get(number='C').delete()
+        self.assertEqual(course.get_free_group_numbers(3), ['C', 'AB', 'AC'])
+        self.assertEqual(course.get_free_group_numbers(2, exclude=['C']), ['AB', 'AC'])
+
     def test_add_group(self):
         course = factories.CourseFactory()
         stu = factories.StudentTakesCourseFactory(courses__course=course)
@@ -631,6 +896,48 @@ class CourseMethodTests(TestCase):
         )
         self.assertEqual(course.groups.count(), 1)
 
+        # members are validated together
+        stu2 = factories.StudentFactory()
+        with self.assertRaises(ValidationError) as cm:
+            course.add_group(
+                members=(stu, stu2),
+                leader=factories.StudentTakesCourseFactory(courses__course=course),
+            )
+        self.assertIn('members', cm.exception.message_dict)
+
+    def test_add_groups(self):
+        course = factories.CourseFactory()
+        inst = factories.InstructorTeachesCourseFactory(courses__course=course)
+        stus = [factories.StudentTakesCourseFactory(courses__course=course) for i in range(5)]
+        grp1 = factories.GroupFactory(course=course)
+
+        groups = course.add_groups([
+            dict(leader=stus[0], members=[stus[1].pk, stus[2].pk], name='first'),
+            dict(leader=stus[3].pk),
+        ])
+        self.assertEqual([grp.leader for grp in groups], [stus[0], stus[3]])
+        self.assertEqual(groups[0].name, 'first')
+        self.assertEqual(set(groups[0].members.all()), {stus[1], stus[2]})
+        self.assertFalse(groups[1].members.exists())
+        for grp in groups:
+            self.assertTrue(grp.has_perms_for_course_inst(inst.user))
+            self.assertTrue(grp.has_perms_for_leader(grp.leader.user))
+        summary = CourseSummary.objects.get(course=course)
+        self.assertEqual((summary.group_count, summary.member_count), (3, 2))
+
+        # nothing created if any student is invalid
+        invalid_groups = (
+            [dict(leader=stus[4], members=[stus[1]])],                 # in a group
+            [dict(leader=stus[4], members=[grp1.leader])],             # leads a group
+            [dict(leader=stus[4]), dict(leader=stus[4])],              # twice
+            [dict(leader=stus[4], members=[factories.StudentFactory()])],  # not taking
+        )
+        for specs in invalid_groups:
+            with self.assertRaises(ValidationError) as cm:
+                course.add_groups(specs)
+            self.assertIn('groups', cm.exception.message_dict)
+        self.assertEqual(course.groups.count(), 3)
+
     def test_add_assignment(self):
         course = factories.CourseFactory()
         self.assertEqual(course.assignments.count(), 0)
@@ -667,6 +974,72 @@ class CourseMethodTests(TestCase):
         self.assertTrue(course1.has_group_including(stu2))
         self.assertFalse(course1.has_group_including(stu3))
 
+    def test_get_cohort_analytics(self):
+        cs1 = factories.CourseFactory(title='Maths', year=2015, semester='AUT')
+        cs2 = factories.CourseFactory(title='Maths', year=2015, semester='SPG')
+        cs3 = factories.CourseFactory(title='Maths', year=2016, semester='SPG')
+        factories.CourseFactory(title='Physics')
+        for grade in ('60', '80'):
+            factories.TakesFactory(course=cs2, grade=Decimal(grade))
+        for grade in ('75', '85', '95'):
+            factories.TakesFactory(course=cs1, grade=Decimal(grade))
+        grp1 = factories.GroupFactory(course=cs1)
+        factories.GroupMembershipFactory(
+            group=grp1, student=factories.StudentTakesCourseFactory(courses__course=cs1))
+        factories.GroupFactory(course=cs1)
+
+        with self.assertNumQueries(3):
+            analytics = Course.objects.get_cohort_analytics('Maths')
+        self.assertEqual(analytics['grades']['count'], 5)
+        self.assertEqual([row['course'] for row in analytics['offerings']],
+                         [cs2.pk, cs1.pk, cs3.pk])
+        spring, autumn, empty = analytics['offerings']
+        self.assertEqual(spring['grades']['mean'], 70)
+        self.assertEqual(autumn['grades']['mean'], 85)
+        self.assertEqual(autumn['drift'], 15)
+        self.assertIsNone(spring['drift'])
+        self.assertIsNone(empty['drift'])
+        self.assertEqual(autumn['group_sizes']['count'], 2)
+        self.assertEqual(autumn['group_sizes']['mean'], 1.5)
+        self.assertEqual(spring['group_sizes']['count'], 0)
+
+    def test_form_groups(self):
+        course1 = factories.CourseFactory(min_group_size=2, max_group_size=3)
+        inst1 = factories.InstructorTeachesCourseFactory(courses__course=course1)
+        grp1 = factories.GroupFactory(course=course1)
+        students = [factories.StudentTakesCourseFactory(courses__course=course1)
+                    for i in range(7)]
+        grades = [90, 40, 80, 50, 70, 60, None]
+        for stu, grade in zip(students, grades):
+            stu.takes.filter(course=course1).update(grade=grade)
+
+        groups = course1.form_groups(balance='grade')
+        self.assertEqual(len(groups), 3)
+        self.assertEqual(sorted(grp.members.count() + 1 for grp in groups), [2, 2, 3])
+        self.assertNotIn(grp1.number, [grp.number for grp in groups])
+        self.assertFalse(course1.get_students_not_in_any_group().exists())
+        # best students lead groups
+        self.assertEqual([grp.leader for grp in groups], [students[0], students[2], students[4]])
+
+        # perms are the same as groups created one by one
+        for grp in groups:
+            self.assertTrue(grp.has_perms_for_course_inst(inst1.user))
+            self.assertTrue(grp.has_perms_for_leader(grp.leader.user))
+            for stu in students:
+                self.assertTrue(grp.has_perms_for_course_stu(stu.user))
+        self.assertEqual(CourseSummary.objects.get(course=course1).group_count, 4)
+
+        # no more students
+        self.assertEqual(course1.form_groups(), [])
+
+    def test_form_groups_bounds(self):
+        course1 = factories.CourseFactory(min_group_size=3, max_group_size=4)
+        for i in range(5):
+            factories.StudentTakesCourseFactory(courses__course=course1)
+        with self.assertRaises(ValidationError):
+            course1.form_groups()
+        self.assertFalse(course1.groups.exists())
+
 
 class CoursePermsTests(TestCase):
 
@@ -753,6 +1126,213 @@ class AssignmentTests(TestCase):
         self.assertIn('deadline_dtm', cm.exception.message_dict)
 
 
+class AssignmentScoreTests(TestCase):
+
+    def test_save(self):
+        score1 = factories.AssignmentScoreFactory()
+        self.assertEqual(score1.takes.course, score1.assignment.course)
+
+        # student should take the course of the assignment
+        with self.assertRaises(ValidationError) as cm:
+            factories.AssignmentScoreFactory(takes=factories.TakesFactory())
+        self.assertIn('takes', cm.exception.message_dict)
+
+        # score should be in range
+        with self.assertRaises(ValidationError) as cm:
+            factories.AssignmentScoreFactory(score='100.01')
+        self.assertIn('score', cm.exception.message_dict)
+
+    def test_set_assignment_scores(self):
+        course1 = factories.CourseFactory()
+        a1 = factories.AssignmentFactory(course=course1)
+        stu1 = factories.StudentTakesCourseFactory(courses__course=course1)
+        stu2 = factories.StudentTakesCourseFactory(courses__course=course1)
+
+        count = course1.set_assignment_scores(a1, {stu1.pk: '80', stu2.pk: 90.5})
+        self.assertEqual(count, 2)
+        self.assertEqual(a1.scores.get(takes__student=stu2).score, Decimal('90.5'))
+
+        # overwrite existing scores
+        course1.set_assignment_scores(a1, {stu1.pk: '70'})
+        self.assertEqual(a1.scores.count(), 2)
+        self.assertEqual(a1.scores.get(takes__student=stu1).score, Decimal('70'))
+
+        # student not taking the course
+        with self.assertRaises(ValidationError) as cm:
+            course1.set_assignment_scores(a1, {factories.StudentFactory().pk: '70'})
+        self.assertIn('scores', cm.exception.message_dict)
+
+        # invalid score
+        with self.assertRaises(ValidationError) as cm:
+            course1.set_assignment_scores(a1, {stu1.pk: '101'})
+        self.assertIn('scores', cm.exception.message_dict)
+
+        # assignment of other course
+        with self.assertRaises(ValidationError) as cm:
+            course1.set_assignment_scores(factories.AssignmentFactory(), {stu1.pk: '70'})
+        self.assertIn('assignment', cm.exception.message_dict)
+
+    def test_recompute_grades(self):
+        course1 = factories.CourseFactory()
+        a1 = factories.AssignmentFactory(course=course1, grade_ratio='0.4')
+        a2 = factories.AssignmentFactory(course=course1, grade_ratio='0.6')
+        stu1 = factories.StudentTakesCourseFactory(courses__course=course1)
+        stu2 = factories.StudentTakesCourseFactory(courses__course=course1)
+        stu3 = factories.StudentTakesCourseFactory(courses__course=course1)
+        stu4 = factories.StudentTakesCourseFactory(courses__course=course1)
+        stu4.takes.filter(course=course1).update(grade=Decimal('77'))
+
+        course1.set_assignment_scores(a1, {stu1.pk: '80', stu2.pk: '50'})
+        course1.set_assignment_scores(a2, {stu1.pk: '90'})
+
+        # the grades, then the summary and versions of the course
+        with self.assertNumQueries(15):
+            self.assertEqual(course1.recompute_grades(), 2)
+
+        self.assertEqual(stu1.takes.get(course=course1).grade, Decimal('86.00'))
+        self.assertEqual(stu2.takes.get(course=course1).grade, Decimal('20.00'))
+        self.assertIsNone(stu3.takes.get(course=course1).grade)
+        # takes without scores keep the grade entered by hand
+        self.assertEqual(stu4.takes.get(course=course1).grade, Decimal('77'))
+
+    def test_get_gradebook(self):
+        course1 = factories.CourseFactory()
+        a1 = factories.AssignmentFactory(course=course1)
+        a2 = factories.AssignmentFactory(course=course1)
+        stu1 = factories.StudentTakesCourseFactory(courses__course=course1)
+        stu2 = factories.StudentTakesCourseFactory(courses__course=course1)
+        course1.set_assignment_scores(a1, {stu1.pk: '80', stu2.pk: '70.5'})
+        course1.set_assignment_scores(a2, {stu2.pk: '60'})
+
+        with self.assertNumQueries(2):
+            gradebook = course1.get_gradebook()
+        self.assertEqual(gradebook['students'], [stu1.pk, stu2.pk])
+        self.assertEqual(gradebook['assignments'], [a1.pk, a2.pk])
+        self.assertEqual(gradebook['scores'], [[80.0, None], [70.5, 60.0]])
+
+        # only modified scores
+        since = timezone.now()
+        course1.set_assignment_scores(a2, {stu1.pk: '90'})
+        gradebook = course1.get_gradebook(since)
+        self.assertEqual(gradebook['students'], [stu1.pk])
+        self.assertEqual(gradebook['assignments'], [a2.pk])
+        self.assertEqual(gradebook['scores'], [[90.0]])
+        self.assertFalse(gradebook['full'])
+
+        # the whole gradebook once a score is deleted
+        since = timezone.now()
+        a1.scores.get(takes__student=stu2).delete()
+        gradebook = course1.get_gradebook(since)
+        self.assertTrue(gradebook['full'])
+        self.assertEqual(gradebook['scores'], [[80.0, 90.0], [None, 60.0]])
+
+        # or a takes
+        since = timezone.now()
+        stu1.takes.get(course=course1).delete()
+        gradebook = course1.get_gradebook(since)
+        self.assertTrue(gradebook['full'])
+        self.assertEqual(gradebook['students'], [stu2.pk])
+
+    def test_curve_grades(self):
+        course1 = factories.CourseFactory()
+        for grade in ('60', '70', '80'):
+            factories.TakesFactory(course=course1, grade=Decimal(grade))
+        factories.TakesFactory(course=course1, grade=None)
+
+        # preview does not save
+        result = course1.curve_grades('target', target_mean=75)
+        self.assertEqual(result['before']['mean'], 70.0)
+        self.assertEqual(result['after']['mean'], 75.0)
+        self.assertEqual(result['count'], 0)
+        self.assertEqual(sorted(course1.takes.values_list('grade', flat=True), key=none_first),
+                         [None, Decimal('60'), Decimal('70'), Decimal('80')])
+
+        # commit, then refresh the summary and versions of the course
+        with self.assertNumQueries(13):
+            result = course1.curve_grades('linear', commit=True, scale=1.5, offset=1)
+        self.assertEqual(result['count'], 3)
+        self.assertEqual(sorted(course1.takes.values_list('grade', flat=True), key=none_first),
+                         [None, Decimal('91'), Decimal('100'), Decimal('100')])
+
+        with self.assertRaises(ValidationError):
+            course1.curve_grades('unknown')
+
+
+class CourseSummaryTests(TestCase):
+
+    def assertSummaryEqual(self, course, counts):
+        summary = CourseSummary.objects.get(course=course)
+        self.assertEqual(
+            (summary.student_count, summary.group_count, summary.ungrouped_count,
+             summary.assignment_count, summary.average_grade),
+            counts,
+        )
+
+    def test_incremental_update(self):
+        course1 = factories.CourseFactory()
+        self.assertSummaryEqual(course1, (0, 0, 0, 0, None))
+
+        stu1 = factories.StudentTakesCourseFactory(courses__course=course1)
+        stu2 = factories.StudentTakesCourseFactory(courses__course=course1)
+        takes3 = factories.TakesFactory(course=course1, grade=Decimal('80'))
+        self.assertSummaryEqual(course1, (3, 0, 3, 0, Decimal('80')))
+
+        grp1 = factories.GroupFactory(course=course1, leader=stu1)
+        factories.GroupMembershipFactory(group=grp1, student=stu2)
+        factories.AssignmentFactory(course=course1)
+        self.assertSummaryEqual(course1, (3, 1, 1, 1, Decimal('80')))
+
+        takes1 = stu1.takes.get(course=course1)
+        takes1.grade = Decimal('91')
+        takes1.save()
+        self.assertSummaryEqual(course1, (3, 1, 1, 1, Decimal('85.50')))
+
+        takes3.delete()
+        self.assertSummaryEqual(course1, (2, 1, 0, 1, Decimal('91')))
+
+        grp1.delete()
+        self.assertSummaryEqual(course1, (2, 0, 2, 1, Decimal('91')))
+
+        # moving takes to another course
+        course2 = factories.CourseFactory()
+        takes1.course = course2
+        takes1.save()
+        self.assertSummaryEqual(course1, (1, 0, 1, 1, None))
+        self.assertSummaryEqual(course2, (1, 0, 1, 0, Decimal('91')))
+
+    def test_refresh_course_summaries(self):
+        course1 = factories.CourseFactory()
+        factories.TakesFactory(course=course1, grade=Decimal('60'))
+        factories.TakesFactory(course=course1, grade=Decimal('70'))
+        grp1 = factories.GroupFactory(course=course1)
+        factories.GroupMembershipFactory(
+            group=grp1, student=factories.StudentTakesCourseFactory(courses__course=course1))
+
+        CourseSummary.objects.filter(course=course1).delete()
+        refresh_course_summaries(course1.pk, course1.pk + 100)
+        self.assertSummaryEqual(course1, (4, 1, 2, 0, Decimal('65')))
+
+        # bulk grade updates refresh the summary
+        course1.curve_grades('linear', commit=True, offset=10)
+        self.assertSummaryEqual(course1, (4, 1, 2, 0, Decimal('75')))
+
+
+class ResourceVersionTests(TestCase):
+
+    def test_bump_resource_versions(self):
+        course1 = factories.CourseFactory()
+        key = get_course_resource_key(course1.pk, 'gradebook')
+        self.assertEqual(get_resource_versions(key)[key], (0, None))
+
+        bump_resource_versions(key)
+        bump_resource_versions(key)
+        self.assertEqual(get_resource_versions(key)[key][0], 2)
+
+        # changes of course resources bump versions
+        factories.AssignmentFactory(course=course1)
+        self.assertEqual(get_resource_versions(key)[key][0], 3)
+
+
 class InstructorMethodTests(TestCase):
 
     def test_add_course(self):
@@ -7,13 +7,23 @@ from datetime import timedelta
 from django.core.urlresolvers import reverse
 from django.contrib.auth import get_user_model
 from django.utils import timezone
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
 
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.request import Request
+from rest_framework.test import APITestCase, APIRequestFactory
 
 from . import factories
+from ..fastpath import get_fast_path
+from ..pagination import HeaderCursorPagination
+from ..serializers import ReadStudentSerializer, ReadCourseTakesSerializer, ReadGroupSerializer
+from ..viewsets import StudentViewSet, CourseTakesViewSet, GroupViewSet, CourseGroupsViewSet
+from ...utils.hyperlinks import IDS_MEDIA_TYPE
 from ..models import (
-    Student, Instructor, Course, Takes, Group,
+    Student, Instructor, Course, Takes, Group, GroupRequest,
+    process_group_requests,
 )
 
 User = get_user_model()
@@ -74,6 +84,9 @@ class StudentAPITests(APITestUtilsMixin, APITestCase):
     def get_student_detail(self, stu):
         return self.client.get(reverse('api:student-detail', kwargs={'pk': stu.pk}))
 
+    def get_student_transcript(self, stu):
+        return self.client.get(reverse('api:student-detail', kwargs={'pk': stu.pk}) + 'transcript/')
+
     def post_student(self, stu_dict):
         return self.client.post(reverse('api:student-list'), stu_dict)
 
@@ -248,6 +261,63 @@ class StudentAPITests(APITestUtilsMixin, APITestCase):
             response = self.delete_student(stu)
             self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
+    def test_get_transcript(self):
+        course1 = factories.CourseFactory()
+        course2 = factories.CourseFactory()
+        stu1 = factories.StudentFactory()
+        factories.TakesFactory(student=stu1, course=course1, grade=decimal.Decimal('80'))
+        factories.TakesFactory(student=stu1, course=course2, grade=decimal.Decimal('90'))
+        stu2 = factories.StudentTakesCourseFactory(courses__course=course1)
+        inst1 = factories.InstructorTeachesCourseFactory(courses__course=course1)
+
+        # student self sees everything
+        self.force_authenticate_user(stu1.user)
+        response = self.get_student_transcript(stu1)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['courses']), 2)
+        self.assertEqual(response.data['average'], '85.00')
+
+        # course student cannot see grades
+        self.force_authenticate_user(stu2.user)
+        response = self.get_student_transcript(stu1)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['courses']), 1)
+        self.assertNotIn('grade', response.data['courses'][0])
+        self.assertIsNone(response.data['average'])
+
+        # course instructor only sees his/her course
+        self.force_authenticate_user(inst1.user)
+        response = self.get_student_transcript(stu1)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['courses']), 1)
+        self.assertEqual(response.data['courses'][0]['grade'], '80.00')
+        self.assertEqual(response.data['average'], '80.00')
+
+        # changes of grades show up
+        takes = stu1.takes.get(course=course1)
+        takes.grade = decimal.Decimal('60')
+        takes.save()
+        response = self.get_student_transcript(stu1)
+        self.assertEqual(response.data['average'], '60.00')
+
+    def test_expand_takes(self):
+        course1 = factories.CourseFactory()
+        course2 = factories.CourseFactory()
+        inst1 = factories.InstructorTeachesCourseFactory(courses__course=course1)
+        stu1 = factories.StudentTakesCourseFactory(courses__course=course1)
+        factories.TakesFactory(student=stu1, course=course2)
+        takes1 = Takes.objects.get(student=stu1, course=course1)
+
+        # expanded takes are those the nested view lists
+        self.force_authenticate_user(inst1.user)
+        url = reverse('api:student-detail', kwargs={'pk': stu1.pk})
+        response = self.client.get(url, dict(expand='takes'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([takes_dict['id'] for takes_dict in response.data['takes']], [takes1.pk])
+        response = self.client.get(
+            reverse('api:student-course-list', kwargs={'parent_lookup_student': stu1.pk}))
+        self.assertEqual([takes_dict['id'] for takes_dict in response.data], [takes1.pk])
+
     @unittest.skipIf(print_api_response, print_api_response_reason)
     def test_print_get_student(self):
         course1 = factories.CourseFactory()
@@ -701,14 +771,16 @@ class CourseAITests(APITestUtilsMixin, APITestCase):
     def is_course_inst_fields(self, course_dict):
         return (set(course_dict.keys()) ==
                 {'url', 'id', 'title', 'year', 'semester', 'description', 'min_group_size',
-                 'max_group_size', 'instructors', 'groups'})
+                 'max_group_size', 'instructors', 'groups', 'summary'})
 
     def is_normal_inst_fields(self, course_dict):
         return (set(course_dict.keys()) ==
                 {'url', 'id', 'title', 'year', 'semester', 'description', 'instructors'})
 
     def is_course_stu_fields(self, course_dict):
-        return self.is_course_inst_fields(course_dict)
+        return (set(course_dict.keys()) ==
+                {'url', 'id', 'title', 'year', 'semester', 'description', 'min_group_size',
+                 'max_group_size', 'instructors', 'groups'})
 
     def is_normal_stu_fields(self, course_dict):
         return (set(course_dict.keys()) ==
@@ -731,9 +803,43 @@ class CourseAITests(APITestUtilsMixin, APITestCase):
     def get_giving_courses(self):
         return self.client.get(reverse('api:course-list') + 'giving/')
 
+    def recompute_grades(self, course):
+        return self.client.post(reverse('api:course-detail', kwargs={'pk': course.pk}) + 'recompute_grades/')
+
+    def get_gradebook(self, course, data=None):
+        return self.client.get(reverse('api:course-detail', kwargs={'pk': course.pk}) + 'gradebook/',
+                               data)
+
+    def curve(self, course, data):
+        return self.client.post(reverse('api:course-detail', kwargs={'pk': course.pk}) + 'curve/',
+                                data, format='json')
+
     def get_taking_courses(self):
         return self.client.get(reverse('api:course-list') + 'taking/')
 
+    def get_cohort(self, data=None):
+        return self.client.get(reverse('api:course-list') + 'cohort/', data)
+
+    def get_candidates(self, course, data=None):
+        return self.client.get(reverse('api:course-detail', kwargs={'pk': course.pk}) + 'candidates/',
+                               data)
+
+    def add_groups(self, course, groups):
+        return self.client.post(reverse('api:course-detail', kwargs={'pk': course.pk}) + 'add_groups/',
+                                dict(groups=groups), format='json')
+
+    def signup_rush(self, course, enabled):
+        return self.client.post(reverse('api:course-detail', kwargs={'pk': course.pk}) + 'signup_rush/',
+                                dict(enabled=enabled), format='json')
+
+    def form_groups(self, course, data=None):
+        return self.client.post(reverse('api:course-detail', kwargs={'pk': course.pk}) + 'form_groups/',
+                                data or {}, format='json')
+
+    def get_calendar(self, course, **extra):
+        return self.client.get(reverse('api:course-detail', kwargs={'pk': course.pk}) + 'calendar/',
+                               **extra)
+
     @unittest.skipIf(print_api_response, print_api_response_reason)
     def test_print_get(self):
         course1 = factories.CourseFactory()
@@ -836,6 +942,54 @@ class CourseAITests(APITestUtilsMixin, APITestCase):
         response = self.get_course_detail(course1)
         self.assertTrue(self.is_normal_inst_fields(response.data))
 
+    def test_expand(self):
+        stu1 = factories.StudentFactory()
+        inst1 = factories.InstructorFactory()
+        course1 = factories.CourseFactory()
+        factories.TakesFactory(student=stu1, course=course1)
+        factories.TeachesFactory(instructor=inst1, course=course1)
+        group1 = factories.GroupFactory(course=course1, leader=stu1)
+        url = reverse('api:course-detail', kwargs={'pk': course1.pk})
+
+        def add_member():
+            stu = factories.StudentTakesCourseFactory(courses__course=course1)
+            course1.add_group_members(group1, [stu])
+
+        self.force_authenticate_user(stu1.user)
+        response = self.client.get(url, dict(expand='instructors.instructor,groups.members'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(self.is_course_stu_fields(response.data))
+        teaches_dict = response.data['instructors'][0]
+        self.assertEqual(teaches_dict['instructor']['id'], inst1.pk)
+        group_dict = response.data['groups'][0]
+        self.assertTrue(self.is_group_fields(group_dict))
+        self.assertEqual(group_dict['members'], [])
+
+        # expanded objects are masked as if got on their own
+        for i in range(4):
+            add_member()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, dict(expand='groups.members'))
+        for member_dict in response.data['groups'][0]['members']:
+            self.assertEqual(member_dict, self.client.get(member_dict['url']).data)
+        instructor_url = teaches_dict['instructor']['url']
+        self.assertEqual(teaches_dict['instructor'], self.client.get(instructor_url).data)
+
+        # permissions of expanded objects are loaded in bulk
+        add_member()
+        with CaptureQueriesContext(connection) as more_context:
+            self.client.get(url, dict(expand='groups.members'))
+        self.assertEqual(len(more_context), len(context))
+
+        # hyperlinks still shown unless expanded
+        response = self.client.get(url, dict(expand='groups'))
+        self.assertTrue(response.data['groups'][0]['members'][0].startswith('http'))
+
+        response = self.client.get(url, dict(expand='title'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(url, dict(expand='groups.foo'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_lazy_object(self):
         stu1 = factories.StudentFactory()
         inst1 = factories.InstructorFactory()
@@ -1079,6 +1233,34 @@ class CourseAITests(APITestUtilsMixin, APITestCase):
         response = self.get_giving_courses()
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
+    def test_get_giving_summary(self):
+        course1 = factories.CourseFactory()
+        inst1 = factories.InstructorTeachesCourseFactory(courses__course=course1)
+        stu1 = factories.TakesFactory(course=course1, grade=decimal.Decimal('70')).student
+        factories.TakesFactory(course=course1, grade=decimal.Decimal('80'))
+        factories.GroupFactory(course=course1)
+        factories.AssignmentFactory(course=course1)
+
+        self.force_authenticate_user(inst1.user)
+        response = self.get_giving_courses()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]['summary'], {
+            'student_count': 3, 'group_count': 1, 'ungrouped_count': 2,
+            'assignment_count': 1, 'average_grade': '75.00',
+        })
+
+        # students of the course cannot see the average grade
+        self.force_authenticate_user(stu1.user)
+        response = self.get_taking_courses()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('summary', response.data[0])
+        response = self.get_course_detail(course1)
+        self.assertNotIn('summary', response.data)
+        response = self.client.get(reverse('api:student-course-list',
+                                           kwargs={'parent_lookup_student': stu1.pk}),
+                                   dict(expand='course'))
+        self.assertNotIn('summary', response.data[0]['course'])
+
     def test_get_taking(self):
         stu1 = factories.StudentFactory()
         for i in range(3):
@@ -1094,6 +1276,290 @@ class CourseAITests(APITestUtilsMixin, APITestCase):
         response = self.get_taking_courses()
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
+    def test_recompute_grades(self):
+        course1 = factories.CourseFactory()
+        inst1 = factories.InstructorTeachesCourseFactory(courses__course=course1)
+        stu1 = factories.StudentTakesCourseFactory(courses__course=course1)
+        a1 = factories.AssignmentFactory(course=course1, grade_ratio='0.5')
+        course1.set_assignment_scores(a1, {stu1.pk: '90'})
+
+        # students and other insts cannot
+        self.force_authenticate_user(stu1.user)
+        response = self.recompute_grades(course1)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.force_authenticate_user(factories.InstructorFactory().user)
+        response = self.recompute_grades(course1)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        # course inst can
+        self.force_authenticate_user(inst1.user)
+        response = self.recompute_grades(course1)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Takes.objects.get(student=stu1, course=course1).grade,
+                         decimal.Decimal('45'))
+
+    def test_curve(self):
+        course1 = factories.CourseFactory()
+        inst1 = factories.InstructorTeachesCourseFactory(courses__course=course1)
+        stu1 = factories.StudentTakesCourseFactory(courses__course=course1)
+        stu2 = factories.StudentTakesCourseFactory(courses__course=course1)
+        Takes.objects.filter(course=course1, student=stu1).update(grade=decimal.Decimal('60'))
+        Takes.objects.filter(course=course1, student=stu2).update(grade=decimal.Decimal('80'))
+
+        # students cannot
+        self.force_authenticate_user(stu1.user)
+        response = self.curve(course1, {'method': 'zscore'})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        # preview
+        self.force_authenticate_user(inst1.user)
+        response = self.curve(course1, {'method': 'zscore'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['after']['mean'], 50.0)
+        self.assertEqual(Takes.objects.get(course=course1, student=stu1).grade,
+                         decimal.Decimal('60'))
+
+        # target needs target_mean
+        response = self.curve(course1, {'method': 'target'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # commit
+        response = self.curve(course1, {'method': 'target', 'target_mean': 75, 'commit': True})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(Takes.objects.get(course=course1, student=stu1).grade,
+                         decimal.Decimal('65'))
+
+    def test_get_cohort(self):
+        course1 = factories.CourseFactory(title='Maths', year=2015)
+        course2 = factories.CourseFactory(title='Maths', year=2016)
+        inst1 = factories.InstructorTeachesCourseFactory(courses__course=course2)
+        stu1 = factories.StudentFactory()
+        factories.TakesFactory(student=stu1, course=course1, grade=decimal.Decimal('80'))
+
+        # students and insts not giving the course cannot
+        self.force_authenticate_user(stu1.user)
+        response = self.get_cohort({'title': 'Maths'})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.force_authenticate_user(factories.InstructorFactory().user)
+        response = self.get_cohort({'title': 'Maths'})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        # title is required
+        self.force_authenticate_user(inst1.user)
+        response = self.get_cohort()
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.get_cohort({'title': 'Maths'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['offerings']), 2)
+        self.assertEqual(response.data['grades']['mean'], 80)
+
+        # new grades show up
+        factories.TakesFactory(course=course2, grade=decimal.Decimal('90'))
+        response = self.get_cohort({'title': 'Maths'})
+        self.assertEqual(response.data['grades']['mean'], 85)
+        self.assertEqual(response.data['offerings'][1]['drift'], 10)
+
+    def test_get_candidates(self):
+        course1 = factories.CourseFactory()
+        inst1 = factories.InstructorTeachesCourseFactory(courses__course=course1)
+        stu1 = factories.StudentTakesCourseFactory(courses__course=course1,
+                                                   s_id='2012001', name='Alice')
+        stu2 = factories.StudentTakesCourseFactory(courses__course=course1,
+                                                   s_id='2012002', name='Bob')
+        stu3 = factories.StudentTakesCourseFactory(courses__course=course1,
+                                                   s_id='2013001', name='Carol')
+        factories.GroupFactory(course=course1, members=(stu3, ))
+
+        # not in the course
+        self.force_authenticate_user(factories.StudentFactory().user)
+        response = self.get_candidates(course1)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.force_authenticate_user(stu1.user)
+        response = self.get_candidates(course1)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([stu['s_id'] for stu in response.data['results']], ['2012001', '2012002'])
+        self.assertEqual(set(response.data['results'][0].keys()),
+                         {'id', 's_id', 'name', 's_class'})
+        self.assertEqual(response.data['results'][0]['s_class'], stu1.s_class.class_id)
+
+        self.force_authenticate_user(inst1.user)
+        response = self.get_candidates(course1, dict(search='Bo'))
+        self.assertEqual([stu['id'] for stu in response.data['results']], [stu2.pk])
+        response = self.get_candidates(course1, dict(search='2013'))
+        self.assertEqual(response.data['results'], [])
+
+    def test_add_groups(self):
+        course1 = factories.CourseFactory()
+        inst1 = factories.InstructorTeachesCourseFactory(courses__course=course1)
+        stu1 = factories.StudentTakesCourseFactory(courses__course=course1)
+        stu2 = factories.StudentTakesCourseFactory(courses__course=course1)
+        stu3 = factories.StudentTakesCourseFactory(courses__course=course1)
+        groups = [
+            dict(leader=get_student_url(stu1), members=[get_student_url(stu2)], name='g1'),
+            dict(leader=get_student_url(stu3)),
+        ]
+
+        self.force_authenticate_user(stu1.user)
+        response = self.add_groups(course1, groups)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.force_authenticate_user(inst1.user)
+        response = self.add_groups(course1, groups)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data), 2)
+        self.assertTrue(self.is_group_fields(response.data[0]))
+        self.assertEqual(response.data[0]['name'], 'g1')
+        self.assertEqual(response.data[0]['members'],
+                         ['http://testserver' + get_student_url(stu2)])
+
+        # students already in groups
+        response = self.add_groups(course1, groups)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(course1.groups.count(), 2)
+
+    def test_post_group_in_signup_rush(self):
+        cache.clear()
+        course1 = factories.CourseFactory()
+        inst1 = factories.InstructorTeachesCourseFactory(courses__course=course1)
+        stu1 = factories.StudentTakesCourseFactory(courses__course=course1)
+        stu2 = factories.StudentTakesCourseFactory(courses__course=course1)
+        stu3 = factories.StudentFactory()
+
+        # only course inst can turn it on
+        self.force_authenticate_user(stu1.user)
+        response = self.signup_rush(course1, True)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.force_authenticate_user(inst1.user)
+        response = self.signup_rush(course1, True)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(Course.objects.get(pk=course1.pk).signup_rush)
+
+        # members not taking the course are rejected at once
+        self.force_authenticate_user(stu1.user)
+        response = self.post_group(course1, dict(name='rush', members=[get_student_url(stu3)]))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.post_group(course1, dict(name='rush', members=[get_student_url(stu2)]))
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], GroupRequest.STATUS_PENDING)
+        self.assertFalse(course1.groups.exists())
+
+        process_group_requests()
+        response = self.client.get(response['Location'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], GroupRequest.STATUS_DONE)
+        group1 = course1.groups.get()
+        self.assertEqual(group1.leader, stu1)
+        self.assertEqual(list(group1.members.all()), [stu2])
+
+        # others cannot see the request
+        self.force_authenticate_user(stu2.user)
+        response = self.client.get(reverse('api:grouprequest-detail',
+                                           kwargs={'pk': GroupRequest.objects.get().pk}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_form_groups(self):
+        course1 = factories.CourseFactory(min_group_size=1, max_group_size=2)
+        inst1 = factories.InstructorTeachesCourseFactory(courses__course=course1)
+        stu1 = factories.StudentTakesCourseFactory(courses__course=course1)
+        for i in range(4):
+            factories.StudentTakesCourseFactory(courses__course=course1)
+
+        self.force_authenticate_user(stu1.user)
+        response = self.form_groups(course1)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.force_authenticate_user(inst1.user)
+        response = self.form_groups(course1, {'balance': 'nonsense'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.form_groups(course1, {'balance': 'class'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data), 3)
+        self.assertEqual(course1.groups.count(), 3)
+
+    def test_get_calendar(self):
+        course1 = factories.CourseFactory()
+        stu1 = factories.StudentTakesCourseFactory(courses__course=course1)
+        a1 = factories.AssignmentFactory(course=course1, title='Report')
+        factories.AssignmentFactory(title='Other')
+
+        self.force_authenticate_user(stu1.user)
+        response = self.get_calendar(course1)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/calendar'))
+        # unfold lines folded at 75 octets
+        content = response.content.decode('utf-8').replace('\r\n ', '')
+        self.assertIn('UID:assignment-{0}@studentgrading'.format(a1.pk), content)
+        self.assertEqual(content.count('BEGIN:VEVENT'), 1)
+        etag = response['ETag']
+        last_modified = response['Last-Modified']
+
+        # unchanged feed
+        response = self.get_calendar(course1, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        response = self.get_calendar(course1, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # changed feed
+        a1.title = 'Final report'
+        a1.save()
+        response = self.get_calendar(course1, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('Final report', response.content.decode('utf-8').replace('\r\n ', ''))
+
+    def test_get_gradebook(self):
+        course1 = factories.CourseFactory()
+        inst1 = factories.InstructorTeachesCourseFactory(courses__course=course1)
+        stu1 = factories.StudentTakesCourseFactory(courses__course=course1)
+        a1 = factories.AssignmentFactory(course=course1)
+        course1.set_assignment_scores(a1, {stu1.pk: '90'})
+
+        # students and other insts cannot
+        self.force_authenticate_user(stu1.user)
+        response = self.get_gradebook(course1)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.force_authenticate_user(factories.InstructorFactory().user)
+        response = self.get_gradebook(course1)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        # course inst can
+        self.force_authenticate_user(inst1.user)
+        response = self.get_gradebook(course1)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['students'], [stu1.pk])
+        self.assertEqual(response.data['assignments'], [a1.pk])
+        self.assertEqual(response.data['scores'], [[90.0]])
+
+        # new scores show up
+        course1.set_assignment_scores(a1, {stu1.pk: '95'})
+        response = self.get_gradebook(course1)
+        self.assertEqual(response.data['scores'], [[95.0]])
+
+        # scores modified since, and the whole gradebook once an assignment is deleted
+        since = timezone.now()
+        a2 = factories.AssignmentFactory(course=course1)
+        course1.set_assignment_scores(a2, {stu1.pk: '60'})
+        response = self.get_gradebook(course1, {'since': since.isoformat()})
+        self.assertEqual(response.data['assignments'], [a2.pk])
+        self.assertFalse(response.data['full'])
+        a2.delete()
+        response = self.get_gradebook(course1, {'since': since.isoformat()})
+        self.assertEqual(response.data['assignments'], [a1.pk])
+        self.assertEqual(response.data['scores'], [[95.0]])
+        self.assertTrue(response.data['full'])
+
+        # invalid since
+        response = self.get_gradebook(course1, {'since': 'not a time'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     @unittest.skipIf(print_api_response, print_api_response_reason)
     def test_print_post_group(self):
         course1 = factories.CourseFactory()
@@ -1676,6 +2142,35 @@ class GroupAPITests(APITestUtilsMixin, APITestCase):
         group1 = Group.objects.get(pk=group1.pk)
         self.assertEqual(group1.leader, stu1)
 
+    def test_transfer_leadership(self):
+        course1 = factories.CourseFactory()
+        stu1 = factories.StudentTakesCourseFactory(courses__course=course1)
+        stu2 = factories.StudentTakesCourseFactory(courses__course=course1)
+        stu3 = factories.StudentTakesCourseFactory(courses__course=course1)
+        group1 = factories.GroupFactory(course=course1, leader=stu1, members=(stu2, ))
+        url = reverse('api:group-detail', kwargs={'pk': group1.pk}) + 'transfer_leadership/'
+
+        # member cannot
+        self.force_authenticate_user(stu2.user)
+        response = self.client.post(url, dict(leader=get_student_url(stu2)))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        # only to a member
+        self.force_authenticate_user(stu1.user)
+        response = self.client.post(url, dict(leader=get_student_url(stu3)))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(url, dict(leader=get_student_url(stu2)))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['leader'], 'http://testserver' + get_student_url(stu2))
+        group1 = Group.objects.get(pk=group1.pk)
+        self.assertEqual(group1.leader, stu2)
+        self.assertEqual(list(group1.members.all()), [stu1])
+
+        # the old leader cannot any more
+        response = self.client.post(url, dict(leader=get_student_url(stu1)))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
     def test_delete_group(self):
         course1 = factories.CourseFactory()
         stu1 = factories.StudentTakesCourseFactory(courses__course=course1)
@@ -1744,6 +2239,12 @@ class AssignmentAPITests(APITestUtilsMixin, APITestCase):
     def delete_assignment(self, assignment):
         return self.client.delete(reverse('api:assignment-detail', kwargs={'pk': assignment.pk}))
 
+    def get_upcoming_assignments(self, params=None):
+        return self.client.get(reverse('api:assignment-list') + 'upcoming/', params)
+
+    def get_calendar(self, **extra):
+        return self.client.get(reverse('api:assignment-list') + 'calendar/', **extra)
+
     def is_read_field(self, data_dict):
         return (set(data_dict.keys()) ==
                 {'url', 'id', 'course', 'title', 'description', 'deadline',
@@ -1762,6 +2263,59 @@ class AssignmentAPITests(APITestUtilsMixin, APITestCase):
 
         response = self.get_assignment_detail(a1)
         self.assertTrue(self.is_read_field(response.data))
+        self.assertEqual(response.data['number'], '1')
+        response = self.get_assignment_detail(a2)
+        self.assertEqual(response.data['number'], '2')
+
+    def test_get_calendar(self):
+        course1 = factories.CourseFactory()
+        course2 = factories.CourseFactory()
+        stu1 = factories.StudentTakesCourseFactory(courses__course=course1)
+        factories.TakesFactory(student=stu1, course=course2)
+        inst1 = factories.InstructorTeachesCourseFactory(courses__course=course1)
+        factories.AssignmentFactory(course=course1)
+        factories.AssignmentFactory(course=course2)
+        factories.AssignmentFactory()
+
+        self.force_authenticate_user(stu1.user)
+        response = self.get_calendar()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.content.decode('utf-8').count('BEGIN:VEVENT'), 2)
+        response = self.get_calendar(HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.force_authenticate_user(inst1.user)
+        response = self.get_calendar()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.content.decode('utf-8').count('BEGIN:VEVENT'), 1)
+
+    def test_get_upcoming(self):
+        course1 = factories.CourseFactory()
+        course2 = factories.CourseFactory()
+        stu1 = factories.StudentTakesCourseFactory(courses__course=course1)
+        factories.TakesFactory(student=stu1, course=course2)
+        now = timezone.now()
+        a1 = factories.AssignmentFactory(course=course2, deadline_dtm=now + timedelta(days=3))
+        a2 = factories.AssignmentFactory(course=course1, deadline_dtm=now + timedelta(days=1))
+        factories.AssignmentFactory(course=course1, deadline_dtm=now + timedelta(days=20))
+        factories.AssignmentFactory(deadline_dtm=now + timedelta(days=2))
+
+        # instructors cannot
+        self.force_authenticate_user(factories.InstructorFactory().user)
+        response = self.get_upcoming_assignments()
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.force_authenticate_user(stu1.user)
+        response = self.get_upcoming_assignments()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([a['id'] for a in response.data['results']], [a2.pk, a1.pk])
+        self.assertTrue(self.is_read_field(response.data['results'][0]))
+
+        response = self.get_upcoming_assignments({'days': 30})
+        self.assertEqual(len(response.data['results']), 3)
+
+        response = self.get_upcoming_assignments({'days': 0})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
     def test_filter_get(self):
         course1 = factories.CourseFactory()
@@ -1836,4 +2390,596 @@ class AssignmentAPITests(APITestUtilsMixin, APITestCase):
 
         self.force_authenticate_user(inst1.user)
         response = self.delete_assignment(a1)
-        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+    def post_scores(self, assignment, scores):
+        return self.client.post(reverse('api:assignment-detail', kwargs={'pk': assignment.pk}) + 'scores/',
+                                scores, format='json')
+
+    def test_post_scores(self):
+        course1 = factories.CourseFactory()
+        inst1 = factories.InstructorTeachesCourseFactory(courses__course=course1)
+        stu1 = factories.StudentTakesCourseFactory(courses__course=course1)
+        stu2 = factories.StudentTakesCourseFactory(courses__course=course1)
+        a1 = factories.AssignmentFactory(course=course1)
+
+        # course inst can
+        self.force_authenticate_user(inst1.user)
+        response = self.post_scores(a1, [
+            dict(student=stu1.pk, score='80.5'), dict(student=stu2.pk, score='60'),
+        ])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(a1.scores.count(), 2)
+
+        # invalid scores
+        response = self.post_scores(a1, [dict(student=stu1.pk, score='180')])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.post_scores(a1, [dict(student=factories.StudentFactory().pk, score='80')])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # other insts and students cannot
+        self.force_authenticate_user(factories.InstructorFactory().user)
+        response = self.post_scores(a1, [dict(student=stu1.pk, score='80')])
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.force_authenticate_user(stu1.user)
+        response = self.post_scores(a1, [dict(student=stu1.pk, score='100')])
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class QueryCountAPITests(APITestUtilsMixin, APITestCase):
+    """
+    Rendering more rows must not cost more queries.
+
+    Superusers skip object permission checks, so only the queries loading what
+    the serializers read are counted by most tests.  Those of instructors and
+    students count the permissions masking fields of each row too.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser(username='foobar', password='foobar')
+        self.force_authenticate_user(self.admin)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(context)
+
+    def assertConstantQueries(self, url, add_rows):
+        """
+        Assert that getting `url` costs the same queries after `add_rows()`
+        """
+        add_rows()
+        count = self.count_queries(url)
+        for i in range(4):
+            add_rows()
+        self.assertEqual(self.count_queries(url), count)
+
+    def add_group(self, course):
+        group = factories.GroupFactory(course=course)
+        factories.GroupMembershipFactory(
+            group=group,
+            student=factories.StudentTakesCourseFactory(courses__course=course),
+        )
+        return group
+
+    def create_course(self):
+        # titled by count, random titles of many courses may clash
+        return factories.CourseFactory(title='Course {0}'.format(Course.objects.count()))
+
+    def test_users(self):
+        self.assertConstantQueries(reverse('api:user-list'), factories.UserFactory)
+
+    def test_students(self):
+        self.assertConstantQueries(reverse('api:student-list'), factories.StudentFactory)
+
+        stu1 = factories.StudentFactory()
+        url = reverse('api:student-course-list', kwargs={'parent_lookup_student': stu1.pk})
+        self.assertConstantQueries(url, lambda: factories.TakesFactory(student=stu1))
+
+    def test_instructors(self):
+        self.assertConstantQueries(reverse('api:instructor-list'), factories.InstructorFactory)
+
+        inst1 = factories.InstructorFactory()
+        url = reverse('api:instructor-course-list', kwargs={'parent_lookup_instructor': inst1.pk})
+        self.assertConstantQueries(url, lambda: factories.TeachesFactory(instructor=inst1))
+
+    def test_courses(self):
+        def add_course():
+            course = self.create_course()
+            factories.TeachesFactory(course=course)
+            self.add_group(course)
+        self.assertConstantQueries(reverse('api:course-list'), add_course)
+
+        course1 = factories.CourseFactory()
+        url = reverse('api:course-detail', kwargs={'pk': course1.pk})
+        self.assertConstantQueries(url, lambda: self.add_group(course1))
+
+        kwargs = {'parent_lookup_course': course1.pk}
+        self.assertConstantQueries(reverse('api:course-instructor-list', kwargs=kwargs),
+                                   lambda: factories.TeachesFactory(course=course1))
+        self.assertConstantQueries(reverse('api:course-takes-list', kwargs=kwargs),
+                                   lambda: factories.TakesFactory(course=course1))
+        self.assertConstantQueries(reverse('api:course-group-list', kwargs=kwargs),
+                                   lambda: self.add_group(course1))
+
+    def test_groups(self):
+        course1 = factories.CourseFactory()
+        self.assertConstantQueries(reverse('api:group-list'), lambda: self.add_group(course1))
+
+        group1 = factories.GroupFactory(course=course1)
+        url = reverse('api:group-detail', kwargs={'pk': group1.pk})
+        self.assertConstantQueries(url, lambda: factories.GroupMembershipFactory(
+            group=group1,
+            student=factories.StudentTakesCourseFactory(courses__course=course1),
+        ))
+
+    def test_group_requests(self):
+        course1 = factories.CourseFactory()
+        stu1 = factories.StudentTakesCourseFactory(courses__course=course1)
+        self.force_authenticate_user(stu1.user)
+        self.assertConstantQueries(reverse('api:grouprequest-list'),
+                                   lambda: GroupRequest.enqueue(course1, stu1))
+
+    def test_assignments(self):
+        course1 = factories.CourseFactory()
+        self.assertConstantQueries(reverse('api:assignment-list'),
+                                   lambda: factories.AssignmentFactory(course=course1))
+
+    def test_classes(self):
+        class1 = factories.ClassFactory()
+        self.assertConstantQueries(reverse('api:class-list'), factories.ClassFactory)
+
+        url = reverse('api:class-detail', kwargs={'pk': class1.pk})
+        self.assertConstantQueries(url, lambda: factories.StudentFactory(s_class=class1))
+
+    def test_as_instructor(self):
+        course1 = factories.CourseFactory()
+        inst1 = factories.InstructorTeachesCourseFactory(courses__course=course1)
+        self.force_authenticate_user(inst1.user)
+
+        # rows of the course and others, shown at different levels
+        def add_students():
+            factories.StudentTakesCourseFactory(courses__course=course1)
+            factories.StudentFactory()
+        self.assertConstantQueries(reverse('api:student-list'), add_students)
+
+        def add_courses():
+            factories.TeachesFactory(instructor=inst1, course=self.create_course())
+            self.create_course()
+        self.assertConstantQueries(reverse('api:course-list'), add_courses)
+
+        kwargs = {'parent_lookup_course': course1.pk}
+        self.assertConstantQueries(reverse('api:course-takes-list', kwargs=kwargs),
+                                   lambda: factories.TakesFactory(course=course1))
+        self.assertConstantQueries(reverse('api:course-group-list', kwargs=kwargs),
+                                   lambda: self.add_group(course1))
+        url = reverse('api:course-detail', kwargs={'pk': course1.pk})
+        self.assertConstantQueries(url + '?expand=groups.members',
+                                   lambda: self.add_group(course1))
+
+    def test_as_student(self):
+        course1 = factories.CourseFactory()
+        stu1 = factories.StudentTakesCourseFactory(courses__course=course1)
+        self.force_authenticate_user(stu1.user)
+
+        # rows of the course and others, shown at different levels
+        def add_students():
+            factories.StudentTakesCourseFactory(courses__course=course1)
+            factories.StudentFactory()
+        self.assertConstantQueries(reverse('api:student-list'), add_students)
+
+        def add_courses():
+            factories.TakesFactory(student=stu1, course=self.create_course())
+            self.create_course()
+        self.assertConstantQueries(reverse('api:course-list'), add_courses)
+
+        url = reverse('api:student-course-list', kwargs={'parent_lookup_student': stu1.pk})
+        self.assertConstantQueries(url + '?expand=course', lambda: factories.TakesFactory(
+            student=stu1, course=self.create_course()))
+        kwargs = {'parent_lookup_course': course1.pk}
+        self.assertConstantQueries(reverse('api:course-group-list', kwargs=kwargs),
+                                   lambda: self.add_group(course1))
+        url = reverse('api:course-detail', kwargs={'pk': course1.pk})
+        self.assertConstantQueries(url + '?expand=groups.members',
+                                   lambda: self.add_group(course1))
+
+    def test_expand(self):
+        course1 = factories.CourseFactory()
+        url = reverse('api:course-detail', kwargs={'pk': course1.pk})
+        url += '?expand=instructors.instructor,groups.members,groups.leader'
+
+        def add_rows():
+            factories.TeachesFactory(course=course1)
+            self.add_group(course1)
+        self.assertConstantQueries(url, add_rows)
+
+        url = reverse('api:course-takes-list', kwargs={'parent_lookup_course': course1.pk})
+        self.assertConstantQueries(url + '?expand=student,course',
+                                   lambda: factories.TakesFactory(course=course1))
+
+    def test_ids_repr(self):
+        course1 = factories.CourseFactory()
+        # pks of instructors and of their teaches differ
+        factories.InstructorFactory()
+        teaches1 = factories.TeachesFactory(course=course1)
+        self.assertNotEqual(teaches1.pk, teaches1.instructor_id)
+        group1 = self.add_group(course1)
+        url = reverse('api:course-detail', kwargs={'pk': course1.pk})
+
+        for response in (self.client.get(url, dict(repr='ids')),
+                         self.client.get(url, HTTP_ACCEPT=IDS_MEDIA_TYPE)):
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('url', response.data)
+            self.assertEqual(response.data['instructors'], [teaches1.instructor_id])
+            self.assertEqual(response.data['groups'], [group1.pk])
+            self.assertNotIn(b'http', response.content)
+        self.assertNotEqual(self.client.get(url, HTTP_ACCEPT=IDS_MEDIA_TYPE)['ETag'],
+                            self.client.get(url)['ETag'])
+
+        # nested and expanded objects too
+        response = self.client.get(url, dict(repr='ids', expand='groups.members'))
+        member_dict = response.data['groups'][0]['members'][0]
+        self.assertEqual(member_dict['s_class'],
+                         Student.objects.get(pk=member_dict['id']).s_class_id)
+        self.assertNotIn('url', member_dict['user'])
+        self.assertNotIn(b'http', response.content)
+
+        url = reverse('api:course-takes-list', kwargs={'parent_lookup_course': course1.pk})
+        self.assertConstantQueries(url + '?repr=ids',
+                                   lambda: factories.TakesFactory(course=course1))
+        takes1 = Takes.objects.filter(course=course1).order_by('pk').first()
+        response = self.client.get(url, dict(repr='ids'))
+        self.assertEqual(set(response.data[0].keys()), {'id', 'student', 'course', 'grade'})
+        self.assertEqual(response.data[0]['id'], takes1.pk)
+        self.assertEqual(response.data[0]['student'], takes1.student_id)
+        self.assertEqual(response.data[0]['course'], course1.pk)
+
+    def test_sparse_fieldsets(self):
+        course1 = factories.CourseFactory()
+        factories.TeachesFactory(course=course1)
+        self.add_group(course1)
+        url = reverse('api:course-list')
+
+        response = self.client.get(url, dict(fields='url,title'))
+        self.assertEqual(set(response.data[0].keys()), {'url', 'title'})
+        response = self.client.get(url, dict(exclude='instructors,groups,summary'))
+        self.assertNotIn('groups', response.data[0])
+        self.assertIn('title', response.data[0])
+        response = self.client.get(reverse('api:course-detail', kwargs={'pk': course1.pk}),
+                                   dict(fields='id'))
+        self.assertEqual(response.data, {'id': course1.pk})
+
+        # unrequested relations are not loaded
+        self.assertLess(self.count_queries(url + '?fields=url,title'), self.count_queries(url))
+
+        response = self.client.get(url, dict(fields='url,foo'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_pagination(self):
+        for i in range(3):
+            factories.CourseFactory()
+        url = reverse('api:course-list')
+
+        response = self.client.get(url)
+        self.assertEqual(len(response.data), 3)
+        self.assertNotIn('Link', response)
+        self.assertNotIn('X-Approximate-Count', response)
+        response = self.client.get(url, dict(count='approximate'))
+        self.assertEqual(response['X-Approximate-Count'], '3')
+
+        # whole lists unless pages are asked for
+        paginator = HeaderCursorPagination()
+        paginator.page_size = 2
+        request = Request(APIRequestFactory().get(url))
+        self.assertIsNone(paginator.paginate_queryset(Course.objects.all(), request))
+        response = self.client.get(url, dict(page_size=2))
+        self.assertEqual(len(response.data), 2)
+        self.assertIn('rel="next"', response['Link'])
+        self.assertIn('page_size=2', response['Link'])
+
+        # follow links of small pages
+        paginator = HeaderCursorPagination()
+        paginator.page_size = 2
+        paginator.approximate_count_limit = 2
+        request = Request(APIRequestFactory().get(url, dict(count='approximate')))
+        page = paginator.paginate_queryset(Course.objects.all(), request)
+        self.assertEqual([course.pk for course in page],
+                         list(Course.objects.order_by('pk').values_list('pk', flat=True)[:2]))
+        response = paginator.get_paginated_response([])
+        self.assertEqual(response['X-Approximate-Count'], '2+')
+        next_url = response['Link'].split(';')[0].strip('<>')
+        self.assertIn('rel="next"', response['Link'])
+
+        request = Request(APIRequestFactory().get(next_url))
+        page = paginator.paginate_queryset(Course.objects.all(), request)
+        self.assertEqual(len(page), 1)
+        response = paginator.get_paginated_response([])
+        self.assertIn('rel="prev"', response['Link'])
+        self.assertNotIn('rel="next"', response['Link'])
+
+
+FAST_PATH_VIEWSETS = (StudentViewSet, CourseTakesViewSet, GroupViewSet, CourseGroupsViewSet)
+
+
+class FastPathAPITests(APITestUtilsMixin, APITestCase):
+    """
+    Lists shown by the fast path must be the same as those of the serializers.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser(username='foobar', password='foobar')
+
+        self.course1 = factories.CourseFactory()
+        self.inst1 = factories.InstructorTeachesCourseFactory(courses__course=self.course1)
+        self.stu1 = factories.StudentTakesCourseFactory(courses__course=self.course1)
+        self.stu2 = factories.StudentTakesCourseFactory(courses__course=self.course1)
+        Takes.objects.filter(student=self.stu2).update(grade=decimal.Decimal('87.50'))
+        group1 = factories.GroupFactory(course=self.course1, leader=self.stu1)
+        factories.GroupMembershipFactory(group=group1, student=self.stu2)
+        factories.GroupFactory(course=self.course1)
+        factories.StudentFactory()
+
+    def get_urls(self):
+        kwargs = {'parent_lookup_course': self.course1.pk}
+        return (
+            reverse('api:student-list'),
+            reverse('api:course-takes-list', kwargs=kwargs),
+            reverse('api:group-list'),
+            reverse('api:course-group-list', kwargs=kwargs),
+        )
+
+    def get_list(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = json.loads(response.content.decode())
+        for item in data:
+            if 'members' in item:
+                item['members'].sort()
+        return data
+
+    def get_serializer_list(self, url, **params):
+        """
+        Get a list the same way with the fast path turned off
+        """
+        for viewset in FAST_PATH_VIEWSETS:
+            viewset.fast_path = False
+        try:
+            return self.get_list(url, **params)
+        finally:
+            for viewset in FAST_PATH_VIEWSETS:
+                viewset.fast_path = True
+
+    def assertSameAsSerializer(self, **params):
+        for url in self.get_urls():
+            data = self.get_list(url, **params)
+            self.assertEqual(data, self.get_serializer_list(url, **params))
+
+    def test_same_as_serializer(self):
+        for serializer_class in (ReadStudentSerializer, ReadCourseTakesSerializer,
+                                 ReadGroupSerializer):
+            self.assertIsNotNone(get_fast_path(serializer_class))
+
+        for user in (self.admin, self.inst1.user, self.stu1.user):
+            self.force_authenticate_user(user)
+            self.assertSameAsSerializer()
+            self.assertSameAsSerializer(repr='ids')
+            self.assertSameAsSerializer(exclude='url')
+
+        # each list is checked with some rows
+        self.force_authenticate_user(self.admin)
+        for url in self.get_urls():
+            self.assertTrue(self.get_list(url))
+
+    def test_masking(self):
+        self.force_authenticate_user(self.stu1.user)
+        url = reverse('api:course-takes-list', kwargs={'parent_lookup_course': self.course1.pk})
+        data = dict((item['id'], item) for item in self.get_list(url))
+        own_takes = Takes.objects.get(student=self.stu1, course=self.course1)
+        other_takes = Takes.objects.get(student=self.stu2, course=self.course1)
+        self.assertIn('grade', data[own_takes.pk])
+        self.assertNotIn('grade', data[other_takes.pk])
+
+    def test_fallbacks(self):
+        self.force_authenticate_user(self.admin)
+        url = reverse('api:student-list')
+
+        response = self.client.get(url, HTTP_ACCEPT='text/html')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get(url, dict(expand='takes'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsInstance(response.data[0]['takes'], list)
+
+    def test_pagination(self):
+        # pages of rows follow the same links as pages of instances
+        paginator = HeaderCursorPagination()
+        paginator.page_size = 2
+        url = reverse('api:student-list')
+        rows = Student.objects.values('id', 's_id')
+
+        pks = []
+        request = Request(APIRequestFactory().get(url, dict(page_size=2)))
+        while True:
+            page = paginator.paginate_queryset(rows, request)
+            pks.extend(row['id'] for row in page)
+            next_url = paginator.get_next_link()
+            if next_url is None:
+                break
+            request = Request(APIRequestFactory().get(next_url))
+        self.assertEqual(pks, list(Student.objects.order_by('pk').values_list('pk', flat=True)))
+
+
+class ConditionalGetAPITests(APITestUtilsMixin, APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser(username='foobar', password='foobar')
+        self.force_authenticate_user(self.admin)
+
+    def assertNotModified(self, url, etag):
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def assertModified(self, url, etag):
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        return response['ETag']
+
+    def test_course_takes(self):
+        course1 = factories.CourseFactory()
+        factories.TakesFactory(course=course1)
+        url = reverse('api:course-takes-list', kwargs={'parent_lookup_course': course1.pk})
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+        self.assertIn('Cookie', response['Vary'])
+        self.assertIn('Authorization', response['Vary'])
+        self.assertNotModified(url, etag)
+
+        # other resources of the course do not matter
+        factories.AssignmentFactory(course=course1)
+        self.assertNotModified(url, etag)
+
+        takes = factories.TakesFactory(course=course1)
+        etag = self.assertModified(url, etag)
+        self.assertNotModified(url, etag)
+
+        # detail depends on the same versions
+        detail_url = reverse('api:course-takes-detail',
+                             kwargs={'parent_lookup_course': course1.pk, 'pk': takes.pk})
+        detail_etag = self.client.get(detail_url)['ETag']
+        takes.grade = 90
+        takes.save()
+        self.assertModified(url, etag)
+        self.assertModified(detail_url, detail_etag)
+
+    def test_per_user(self):
+        course1 = factories.CourseFactory()
+        url = reverse('api:course-detail', kwargs={'pk': course1.pk})
+        etag = self.client.get(url)['ETag']
+
+        admin2 = User.objects.create_superuser(username='barfoo', password='barfoo')
+        self.force_authenticate_user(admin2)
+        self.assertModified(url, etag)
+
+    def test_courses(self):
+        course1 = factories.CourseFactory()
+        url = reverse('api:course-detail', kwargs={'pk': course1.pk})
+        etag = self.client.get(url)['ETag']
+        self.assertNotModified(url, etag)
+
+        for add in (lambda: factories.TeachesFactory(course=course1),
+                    lambda: factories.TakesFactory(course=course1),
+                    lambda: factories.GroupFactory(course=course1),
+                    lambda: factories.AssignmentFactory(course=course1)):
+            add()
+            etag = self.assertModified(url, etag)
+
+        course1.title = 'foo'
+        course1.save()
+        self.assertModified(url, etag)
+
+    def test_giving(self):
+        inst1 = factories.InstructorFactory()
+        self.force_authenticate_user(inst1.user)
+        url = reverse('api:course-list') + 'giving/'
+
+        etag = self.client.get(url)['ETag']
+        self.assertNotModified(url, etag)
+
+        course1 = factories.CourseFactory()
+        factories.TeachesFactory(course=course1, instructor=inst1)
+        etag = self.assertModified(url, etag)
+        self.assertNotModified(url, etag)
+
+        # courses not given do not matter
+        factories.TakesFactory(course=factories.CourseFactory())
+        self.assertNotModified(url, etag)
+
+        factories.GroupFactory(course=course1)
+        self.assertModified(url, etag)
+
+    def test_unbound_lists(self):
+        response = self.client.get(reverse('api:course-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('ETag', response)
+
+
+class BatchAPITests(APITestUtilsMixin, APITestCase):
+
+    def post_batch(self, requests):
+        return self.client.post(reverse('api:batch'), dict(requests=requests), format='json')
+
+    def test_get(self):
+        stu1 = factories.StudentFactory()
+        course1 = factories.CourseFactory()
+        factories.TakesFactory(student=stu1, course=course1)
+        course_url = reverse('api:course-detail', kwargs={'pk': course1.pk})
+        takes_url = reverse('api:course-takes-list', kwargs={'parent_lookup_course': course1.pk})
+
+        self.force_authenticate_user(stu1.user)
+        response = self.post_batch([
+            dict(url=course_url),
+            dict(method='GET', url=takes_url + '?fields=id,grade'),
+            dict(url=reverse('api:course-detail', kwargs={'pk': course1.pk + 100})),
+            dict(url=reverse('api:api-root') + 'foo/'),
+        ])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        responses = response.data['responses']
+        self.assertEqual([r['status'] for r in responses], [200, 200, 404, 404])
+
+        # same as requested one by one
+        self.assertEqual(responses[0]['body'], self.client.get(course_url).data)
+        self.assertEqual(responses[1]['body'],
+                         self.client.get(takes_url, dict(fields='id,grade')).data)
+        self.assertIn('ETag', responses[0]['headers'])
+
+    def test_write(self):
+        inst1 = factories.InstructorFactory()
+        course1 = factories.CourseFactory()
+        factories.TeachesFactory(instructor=inst1, course=course1)
+        url = reverse('api:course-detail', kwargs={'pk': course1.pk})
+
+        self.force_authenticate_user(inst1.user)
+        response = self.post_batch([
+            dict(method='PATCH', url=url, body=dict(description='foo')),
+            dict(method='PATCH', url=url, body=dict(min_group_size='bar')),
+            dict(url=url),
+        ])
+        responses = response.data['responses']
+        self.assertEqual([r['status'] for r in responses], [200, 400, 200])
+        # a failed request does not undo the others
+        self.assertEqual(responses[2]['body']['description'], 'foo')
+        self.assertEqual(Course.objects.get(pk=course1.pk).description, 'foo')
+
+    def test_invalid(self):
+        stu1 = factories.StudentFactory()
+        self.force_authenticate_user(stu1.user)
+        url = reverse('api:student-detail', kwargs={'pk': stu1.pk})
+
+        with override_settings(BATCH_MAX_REQUESTS=2):
+            response = self.post_batch([dict(url=url)] * 3)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            response = self.post_batch([dict(url=url)] * 2)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        for request in (dict(url=reverse('api:batch')),
+                        dict(url=reverse('api:batch', kwargs={'format': 'json'})),
+                        dict(url='http://example.com' + url),
+                        dict(method='FOO', url=url)):
+            response = self.post_batch([request])
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.post_batch([])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.force_authenticate(user=None)
+        response = self.post_batch([dict(url=url)])
+        self.assertIn(response.status_code,
+                      (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN))
@@ -1,9 +1,27 @@
 # -*- coding: utf-8 -*-
+import hashlib
+import io
+import json
+from calendar import timegm
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
+from django.core.handlers.wsgi import WSGIRequest
+from django.core.urlresolvers import resolve, get_script_prefix, Resolver404
+from django.db import transaction
+from django.db.models import Q
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
 
 from rest_framework import viewsets, filters, mixins, status
 from rest_framework.response import Response
 from rest_framework.relations import reverse
+from rest_framework.renderers import JSONRenderer
 from rest_framework.decorators import detail_route, list_route
 from rest_framework.views import APIView
 from rest_framework import serializers
@@ -21,19 +39,172 @@ from .serializers import (
     CreateCourseTakesSerializer, ReadCourseTakesSerializer, BaseWriteCourseTakesSerializer,
     ReadGroupSerializer, CreateGroupSerializer, WriteGroupSerializer,
     ClassSerializer,
-    ReadAssignmentSerializer, CreateAssignmentSerializer, WriteAssignmentSerializer
+    ReadAssignmentSerializer, CreateAssignmentSerializer, WriteAssignmentSerializer,
+    AssignmentScoreEntrySerializer, GradebookQuerySerializer, CurveGradesSerializer,
+    TranscriptSerializer, CohortQuerySerializer, UpcomingAssignmentsQuerySerializer,
+    FormGroupsSerializer, AddGroupsSerializer, SignupRushSerializer,
+    CandidateQuerySerializer, CandidateStudentSerializer, TransferLeadershipSerializer,
+    EnqueueGroupSerializer, GroupRequestSerializer,
+    SparseFieldsetMixin, ExpandableFieldsMixin, BatchSerializer,
 )
 from .models import (
-    Student, Class, Course, Takes, Instructor, Teaches, Group, Assignment,
-    get_role_of,
+    Student, Class, Course, Takes, Instructor, Teaches, Group, GroupRequest, Assignment,
+    get_role_of, get_course_resource_key, get_student_resource_key, get_resource_versions,
+    mask_transcript, ObjectPermissionCache,
 )
 from .permissions import (
     FourLevelObjectPermissions, CreateGroupPermission, IsInstructor, IsStudent,
+    IsCourseInstructor, IsCourseMember, CanChangeGroupLeader,
 )
 from . import filters as core_filters
+from ..utils.ical import build_calendar
+from .pagination import (
+    DeadlineCursorPagination, StudentIdCursorPagination,
+    HeaderCursorPagination, DeadlineHeaderCursorPagination,
+)
+from .prefetch import prefetch_for_serializer
+from . import fastpath
+from ..utils import hyperlinks
+
+# seconds to cache the upcoming assignments of a user
+UPCOMING_ASSIGNMENTS_CACHE_TIMEOUT = 60
 
 
 SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+User = get_user_model()
+
+# request headers responses of `get_conditional_response` depend on
+CONDITIONAL_VARY_HEADERS = ('Accept', 'Authorization', 'Cookie')
+
+# resources of a course shown in its detail, including its summary
+COURSE_RESOURCE_NAMES = ('course', 'teaches', 'takes', 'groups', 'assignments')
+
+
+# -----------------------------------------------------------------------------
+# Helper Functions
+# -----------------------------------------------------------------------------
+def is_not_modified(request, etag, last_modified=None):
+    """
+    Check conditional request headers against the current ETag and last modified time
+
+    `If-None-Match` takes precedence over `If-Modified-Since`.
+    :param etag: quoted ETag
+    :param last_modified: datetime or `None`
+    """
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        tags = [tag[2:] if tag.startswith('W/') else tag for tag in tags]
+        return etag in tags or '*' in tags
+
+    if_modified_since = request.META.get('HTTP_IF_MODIFIED_SINCE')
+    if if_modified_since and last_modified:
+        if_modified_since = parse_http_date_safe(if_modified_since)
+        return (if_modified_since is not None and
+                timegm(last_modified.utctimetuple()) <= if_modified_since)
+    return False
+
+
+def get_field_selection(request, serializer_class):
+    """
+    Return arguments of `serializer_class` selecting its fields from comma separated
+    `?fields=` and `?exclude=`, see `SparseFieldsetMixin`, and `?expand=`,
+    see `ExpandableFieldsMixin`
+    """
+    params = []
+    if issubclass(serializer_class, SparseFieldsetMixin):
+        params.extend(['fields', 'exclude'])
+    if issubclass(serializer_class, ExpandableFieldsMixin):
+        params.append('expand')
+
+    selection = {}
+    for param in params:
+        value = request.query_params.get(param)
+        if value is not None:
+            selection[param] = tuple(name.strip() for name in value.split(',') if name.strip())
+    return selection
+
+
+def get_conditional_response(request, version_keys, respond):
+    """
+    Add an ETag and Last-Modified time derived from versions of resources to a response
+
+    The ETag also depends on the requester, as fields are masked by their object
+    permissions, and on the accepted media type, which may ask for the compact
+    representation.  Unchanged resources get 304 responses without calling `respond`,
+    so permissions are neither filtered nor objects serialized.
+    :param version_keys: `ResourceVersion` keys the response depends on,
+        `None` to respond in full
+    :param respond: function returning the full response
+    """
+    if version_keys is None:
+        return respond()
+
+    version_keys = sorted(set(version_keys))
+    versions = get_resource_versions(*version_keys)
+    etag = '"{0}"'.format(hashlib.md5('|'.join(
+        ['user={0}'.format(request.user.pk),
+         'media={0}'.format(getattr(request, 'accepted_media_type', None))] +
+        ['{0}={1}'.format(key, versions[key][0]) for key in version_keys]
+    ).encode('utf-8')).hexdigest())
+    modified_dtms = [versions[key][1] for key in version_keys if versions[key][1]]
+    last_modified = max(modified_dtms) if modified_dtms else None
+
+    if is_not_modified(request, etag, last_modified):
+        response = HttpResponseNotModified()
+    else:
+        response = respond()
+        if response.status_code != status.HTTP_200_OK:
+            return response
+
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(timegm(last_modified.utctimetuple()))
+    patch_vary_headers(response, CONDITIONAL_VARY_HEADERS)
+    return response
+
+
+def get_calendar_response(request, name, course_pks):
+    """
+    Respond an iCalendar feed of assignments of courses
+
+    Events of each course are prebuilt and cached under the course's calendar version,
+    so they are only rebuilt after an assignment of the course changes.
+    The ETag is derived from these versions, and unchanged feeds get 304 responses
+    without touching the events.
+    """
+    course_pks = sorted(course_pks)
+    version_keys = [get_course_resource_key(pk, 'calendar') for pk in course_pks]
+    versions = get_resource_versions(*version_keys)
+
+    etag = '"calendar-{0}"'.format(hashlib.md5('|'.join(
+        '{0}={1}'.format(pk, versions[key][0]) for pk, key in zip(course_pks, version_keys)
+    ).encode('utf-8')).hexdigest())
+    modified_dtms = [versions[key][1] for key in version_keys if versions[key][1]]
+    last_modified = max(modified_dtms) if modified_dtms else None
+
+    if is_not_modified(request, etag, last_modified):
+        response = HttpResponseNotModified()
+    else:
+        cache_keys = dict(
+            (pk, 'calendar:{0}:{1}'.format(pk, versions[key][0]))
+            for pk, key in zip(course_pks, version_keys)
+        )
+        blocks = cache.get_many(list(cache_keys.values()))
+        missing = [pk for pk in course_pks if cache_keys[pk] not in blocks]
+        for course in Course.objects.filter(pk__in=missing):
+            blocks[cache_keys[course.pk]] = course.get_calendar_events()
+            cache.set(cache_keys[course.pk], blocks[cache_keys[course.pk]], None)
+
+        response = HttpResponse(
+            build_calendar(name, [blocks.get(cache_keys[pk], '') for pk in course_pks]),
+            content_type='text/calendar; charset=utf-8',
+        )
+
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(timegm(last_modified.utctimetuple()))
+    return response
 
 
 # -----------------------------------------------------------------------------
@@ -54,6 +225,91 @@ class HandleValidErrorViewSetMixin(object):
             raise serializers.ValidationError(e.message_dict)
 
 
+class SerializerPrefetchMixin(object):
+    """
+    Load what the read serializer reads along with the queryset of read actions,
+    see `prefetch.PrefetchPlan`
+
+    Read serializers supporting sparse fieldsets get `?fields=` and `?exclude=`,
+    and those supporting expansions `?expand=`, which are planned as well.
+    """
+    prefetch_actions = ('list', 'retrieve', )
+
+    def get_prefetch_serializer_class(self):
+        if hasattr(self, 'get_read_serializer_class'):
+            return self.get_read_serializer_class()
+        return self.get_serializer_class()
+
+    def get_field_selection(self):
+        if getattr(self, 'action', None) not in self.prefetch_actions:
+            return {}
+        return get_field_selection(self.request, self.get_prefetch_serializer_class())
+
+    def get_queryset(self):
+        queryset = super(SerializerPrefetchMixin, self).get_queryset()
+        if getattr(self, 'action', None) in self.prefetch_actions:
+            queryset = prefetch_for_serializer(queryset, self.get_prefetch_serializer_class(),
+                                               **self.get_field_selection())
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.update(self.get_field_selection())
+        return super(SerializerPrefetchMixin, self).get_serializer(*args, **kwargs)
+
+
+class VersionConditionalMixin(object):
+    """
+    Answer conditional GETs of list and retrieve actions by versions of
+    `course_resource_names` of a course, see `get_conditional_response`
+
+    The course is the parent course of nested viewsets, the course of the
+    retrieved object, or the `course` filter of lists.  Responses not bound to
+    one course are always in full.
+
+    DRF replaces `Vary` by its default headers when finalizing responses, so the
+    headers masked responses vary on are added again afterwards.
+    """
+    course_resource_names = ()
+
+    def get_version_course_pk(self):
+        if 'parent_lookup_course' in self.kwargs:
+            return self.kwargs['parent_lookup_course']
+        if self.action == 'retrieve':
+            pk = self.kwargs.get(self.lookup_url_kwarg or self.lookup_field)
+            if not str(pk).isdigit():
+                return None
+            return self.queryset.model.objects.filter(pk=pk).values_list(
+                'course_id', flat=True).first()
+        return self.request.query_params.get('course')
+
+    def get_version_keys(self):
+        """
+        Return `ResourceVersion` keys the response depends on, or `None` if unknown
+        """
+        course_pk = self.get_version_course_pk()
+        if not self.course_resource_names or not str(course_pk).isdigit():
+            return None
+        return [get_course_resource_key(int(course_pk), name)
+                for name in self.course_resource_names]
+
+    def list(self, request, *args, **kwargs):
+        parent = super(VersionConditionalMixin, self)
+        return get_conditional_response(request, self.get_version_keys(),
+                                        lambda: parent.list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        parent = super(VersionConditionalMixin, self)
+        return get_conditional_response(request, self.get_version_keys(),
+                                        lambda: parent.retrieve(request, *args, **kwargs))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super(VersionConditionalMixin, self).finalize_response(
+            request, response, *args, **kwargs)
+        if response.has_header('ETag'):
+            patch_vary_headers(response, CONDITIONAL_VARY_HEADERS)
+        return response
+
+
 # -----------------------------------------------------------------------------
 # Filters
 # -----------------------------------------------------------------------------
@@ -95,25 +351,56 @@ class FourLevelPermCreateModelMixin(mixins.CreateModelMixin):
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
 
-class FourLevelPermListModelMixin(mixins.ListModelMixin):
+class FourLevelPermListModelMixin(SerializerPrefetchMixin, mixins.ListModelMixin):
+    """
+    List by the read serializer
+
+    With `fast_path` set, lists rendered as JSON are read by `values()` and shown
+    by the `fastpath.FastPath` of the read serializer, if it has one.  Expansions,
+    the browsable API and links with format suffixes are left to the serializer.
+    """
+    pagination_class = HeaderCursorPagination
+    fast_path = False
+
+    def get_fast_path(self):
+        if not self.fast_path:
+            return None
+        selection = self.get_field_selection()
+        if (selection.pop('expand', None) or
+                not isinstance(self.request.accepted_renderer, JSONRenderer) or
+                not hyperlinks.can_fill_templates(self.request, self.format_kwarg)):
+            return None
+        return fastpath.get_fast_path(self.get_read_serializer_class(), **selection)
+
     def list(self, request, *args, **kwargs):
         serializer_class = self.get_read_serializer_class()
         queryset = self.filter_queryset(self.get_queryset())
 
+        fast_path = self.get_fast_path()
+        if fast_path is not None:
+            rows = fast_path.get_rows(queryset)
+            page = self.paginate_queryset(rows)
+            if page is not None:
+                return self.get_paginated_response(fast_path.represent(page, request))
+            return Response(fast_path.represent(rows, request))
+
         page = self.paginate_queryset(queryset)
         if page is not None:
-            serializer = serializer_class(page, many=True, context=self.get_serializer_context())
+            serializer = serializer_class(page, many=True, context=self.get_serializer_context(),
+                                          **self.get_field_selection())
             return self.get_paginated_response(serializer.data)
 
-        serializer = serializer_class(queryset, many=True, context=self.get_serializer_context())
+        serializer = serializer_class(queryset, many=True, context=self.get_serializer_context(),
+                                      **self.get_field_selection())
         return Response(serializer.data)
 
 
-class FourLevelPermRetrieveModelMixin(mixins.RetrieveModelMixin):
+class FourLevelPermRetrieveModelMixin(SerializerPrefetchMixin, mixins.RetrieveModelMixin):
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
         serializer_class = self.get_read_serializer_class()
-        serializer = serializer_class(instance, context=self.get_serializer_context())
+        serializer = serializer_class(instance, context=self.get_serializer_context(),
+                                      **self.get_field_selection())
         return Response(serializer.data)
 
 
@@ -244,6 +531,93 @@ class Myself(APIView):
         return Response(dict(url=url), status=status.HTTP_200_OK)
 
 
+def build_batch_request(request, method, url, body=None):
+    """
+    Return the `HttpRequest` of a request in a batch, with the headers of the batch
+    but conditional ones
+    """
+    path, _, query_string = url.partition('?')
+    content = json.dumps(body).encode('utf-8') if body is not None else b''
+    environ = dict(
+        (key, value) for key, value in request.META.items() if not key.startswith('HTTP_IF_')
+    )
+    environ.update({
+        'REQUEST_METHOD': method,
+        'PATH_INFO': '/' + path[len(get_script_prefix()):],
+        'QUERY_STRING': query_string,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(content)),
+        'HTTP_ACCEPT': 'application/json',
+        'wsgi.input': io.BytesIO(content),
+    })
+    return WSGIRequest(environ)
+
+
+class Batch(APIView):
+    """
+    Run many API requests in one `POST`, and respond all their responses
+
+    Requests run in order, within the transaction of the batch but each in a
+    savepoint of its own, so that a failed request does not undo the others.
+    They share the authentication of the batch, the user `FourLevelObjectPermissions`
+    checks permissions of and the object permissions loaded by serializers,
+    which are loaded again after a request that may change anything.
+    """
+
+    def get_shared_attributes(self, request):
+        """
+        Return attributes set on the requests of the batch, see `Batch`
+        """
+        attributes = {
+            '_force_auth_user': request.user,
+            '_force_auth_token': request.auth,
+            '_permission_user': User.objects.get(pk=request.user.pk),
+            '_permission_cache': ObjectPermissionCache(request.user),
+        }
+        if hasattr(request._request, 'session'):
+            attributes['session'] = request._request.session
+        return attributes
+
+    def get_response_dict(self, response):
+        if hasattr(response, 'data'):
+            body = response.data
+        elif response.content:
+            body = response.content.decode(response.charset)
+        else:
+            body = None
+        return dict(status=response.status_code, headers=dict(response.items()), body=body)
+
+    def post(self, request, format=None):
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        responses = []
+        attributes = None
+        for item in serializer.validated_data['requests']:
+            if attributes is None:
+                attributes = self.get_shared_attributes(request)
+            sub_request = build_batch_request(request._request, item['method'], item['url'],
+                                              item.get('body'))
+            for name, value in attributes.items():
+                setattr(sub_request, name, value)
+
+            try:
+                match = resolve(sub_request.path_info)
+            except Resolver404:
+                responses.append(dict(status=status.HTTP_404_NOT_FOUND, headers={},
+                                      body=dict(detail='Not found.')))
+                continue
+
+            with transaction.atomic():
+                response = match.func(sub_request, *match.args, **match.kwargs)
+            responses.append(self.get_response_dict(response))
+
+            if item['method'] not in SAFE_METHODS:
+                attributes = None
+
+        return Response(dict(responses=responses), status=status.HTTP_200_OK)
+
+
 # -----------------------------------------------------------------------------
 # Student ViewSets
 # -----------------------------------------------------------------------------
@@ -258,6 +632,7 @@ class StudentViewSet(HandleValidErrorViewSetMixin, FourLevelPermModelViewSet):
     serializer_class = ReadStudentSerializer    # add this to ensure browsable api is okay
 
     read_serializer_class = ReadStudentSerializer
+    fast_path = True
     write_serializer_class = CreateStudentSerializer
     base_write_serializer_class = write_serializer_class
     normal_write_serializer_class = write_serializer_class
@@ -285,6 +660,35 @@ class StudentViewSet(HandleValidErrorViewSetMixin, FourLevelPermModelViewSet):
 
         return queryset
 
+    @detail_route(methods=['get'])
+    def transcript(self, request, pk=None):
+        """
+        Get all courses taken by the student with grades and averages
+
+        Only takes visible to the user are listed, and only grades visible to the user
+        are shown and averaged.
+        """
+        student = self.get_object()
+
+        version_key = get_student_resource_key(student.pk, 'transcript')
+        version = get_resource_versions(version_key)[version_key][0]
+        cache_key = 'transcript:{0}:{1}'.format(student.pk, version)
+        transcript = cache.get(cache_key)
+        if transcript is None:
+            transcript = student.get_transcript()
+            cache.set(cache_key, transcript)
+
+        visible_takes = set(FourLevelObjectPermissionsFilter().filter_queryset(
+            request, student.takes.all(), self).values_list('pk', flat=True))
+        graded_takes = set(get_objects_for_user(
+            request.user, 'core.view_takes', student.takes.all(), accept_global_perms=False,
+        ).values_list('pk', flat=True))
+
+        transcript = mask_transcript(transcript, visible_takes, graded_takes)
+        serializer = TranscriptSerializer(transcript, context=dict(
+            self.get_serializer_context(), graded_takes=graded_takes))
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
 
 # -----------------------------------------------------------------------------
 # StudentCourses ViewSet
@@ -337,8 +741,10 @@ class InstructorTeachesViewSet(HandleValidErrorViewSetMixin, FourLevelPermNested
 # -----------------------------------------------------------------------------
 # Course ViewSets
 # -----------------------------------------------------------------------------
-class CourseViewSet(HandleValidErrorViewSetMixin, FourLevelPermModelViewSet):
-    queryset = Course.objects.all()
+class CourseViewSet(HandleValidErrorViewSetMixin,
+                    VersionConditionalMixin,
+                    FourLevelPermModelViewSet):
+    queryset = Course.objects.select_related('summary')
     filter_backends = (FourLevelObjectPermissionsFilter, )
     permission_classes = (FourLevelObjectPermissions, )
     serializer_class = ReadCourseSerializer
@@ -349,37 +755,280 @@ class CourseViewSet(HandleValidErrorViewSetMixin, FourLevelPermModelViewSet):
     normal_write_serializer_class = write_serializer_class
     advanced_write_serializer_class = write_serializer_class
 
+    course_resource_names = COURSE_RESOURCE_NAMES
+
+    def get_version_course_pk(self):
+        return self.kwargs.get('pk') if self.action == 'retrieve' else None
+
     @detail_route(methods=['post'], permission_classes=[CreateGroupPermission])
     def add_group(self, request, pk=None):
         """
         Create a group to the course
+
+        In sign-up rush mode, requests of students are queued instead, see `enqueue_group`.
         """
-        self.check_object_permissions(request, Course.objects.get(pk=pk))
+        course = get_object_or_404(Course, pk=pk)
+        if course.signup_rush:
+            user_role = get_role_of(request.user)
+            if isinstance(user_role, Student):
+                return self.enqueue_group(request, course, user_role)
+
+        self.check_object_permissions(request, course)
         # put in `course` parameter
         data = request.data.copy()
         data['course'] = reverse('api:course-detail', kwargs=dict(pk=pk))
         serializer = CreateGroupSerializer(data=data, context=self.get_serializer_context())
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        try:
+            serializer.save()
+        except ValidationError as e:
+            raise serializers.ValidationError(e.message_dict)
         headers = self.get_success_headers(serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
+    @detail_route(methods=['get'], permission_classes=[IsCourseMember])
+    def candidates(self, request, pk=None):
+        """
+        Get students of the course not in any group
+
+        Pass `search` to match the beginning of student ID or name.
+        Paginated by student ID.
+        """
+        course = get_object_or_404(Course, pk=pk)
+        self.check_object_permissions(request, course)
+
+        query_serializer = CandidateQuerySerializer(data=request.query_params)
+        query_serializer.is_valid(raise_exception=True)
+        search = query_serializer.validated_data['search']
+
+        # no only(), students read every field on init, see `prefetch.can_defer`
+        queryset = Student.objects.ungrouped_in(course).select_related('s_class')
+        if search:
+            queryset = queryset.filter(Q(s_id__startswith=search) | Q(name__startswith=search))
+
+        paginator = StudentIdCursorPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = CandidateStudentSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @detail_route(methods=['post'], permission_classes=[IsCourseInstructor])
+    def add_groups(self, request, pk=None):
+        """
+        Create many groups of the course at once
+
+        Pass `groups` as a list of objects of `leader`, `members` and `name`.
+        All students are validated together, and nothing is created if any is invalid.
+        """
+        course = get_object_or_404(Course, pk=pk)
+        self.check_object_permissions(request, course)
+
+        serializer = AddGroupsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            groups = course.add_groups(serializer.validated_data['groups'])
+        except ValidationError as e:
+            raise serializers.ValidationError(e.message_dict)
+
+        order = dict((group.pk, i) for i, group in enumerate(groups))
+        groups = sorted(
+            Group.objects.filter(pk__in=list(order.keys())).prefetch_related('members'),
+            key=lambda group: order[group.pk],
+        )
+        serializer = ReadGroupSerializer(groups, many=True, context=self.get_serializer_context())
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def enqueue_group(self, request, course, student):
+        """
+        Queue a group led by `student`, checked against the cached course roster only
+
+        Respond 202 with the request, whose url tells its status once processed.
+        """
+        serializer = EnqueueGroupSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            group_request = GroupRequest.enqueue(course, student,
+                                                 serializer.validated_data['name'],
+                                                 serializer.validated_data.get('members', []))
+        except ValidationError as e:
+            raise serializers.ValidationError(e.message_dict)
+
+        serializer = GroupRequestSerializer(group_request, context=self.get_serializer_context())
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED,
+                        headers={'Location': serializer.data['url']})
+
+    @detail_route(methods=['post'], permission_classes=[IsCourseInstructor])
+    def signup_rush(self, request, pk=None):
+        """
+        Turn sign-up rush mode on or off
+
+        Pending requests are still processed after it is turned off.
+        """
+        course = get_object_or_404(Course, pk=pk)
+        self.check_object_permissions(request, course)
+
+        serializer = SignupRushSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        enabled = serializer.validated_data['enabled']
+        Course.objects.filter(pk=course.pk).update(signup_rush=enabled)
+        return Response(dict(enabled=enabled), status=status.HTTP_200_OK)
+
+    @detail_route(methods=['post'], permission_classes=[IsCourseInstructor])
+    def form_groups(self, request, pk=None):
+        """
+        Put all students not in any group into new groups
+
+        Pass `balance` as `class` or `grade` to balance groups by class or by grade.
+        """
+        course = get_object_or_404(Course, pk=pk)
+        self.check_object_permissions(request, course)
+
+        serializer = FormGroupsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            groups = course.form_groups(serializer.validated_data['balance'])
+        except ValidationError as e:
+            raise serializers.ValidationError(e.message_dict)
+
+        serializer = ReadGroupSerializer(groups, many=True, context=self.get_serializer_context())
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @detail_route(methods=['post'], permission_classes=[IsCourseInstructor])
+    def recompute_grades(self, request, pk=None):
+        """
+        Recompute grades of all students from their assignment scores
+        """
+        course = get_object_or_404(Course, pk=pk)
+        self.check_object_permissions(request, course)
+
+        count = course.recompute_grades()
+        return Response(dict(count=count), status=status.HTTP_200_OK)
+
+    @detail_route(methods=['post'], permission_classes=[IsCourseInstructor])
+    def curve(self, request, pk=None):
+        """
+        Curve grades of all students
+
+        Only previews the resulting distribution unless `commit` is true.
+        """
+        course = get_object_or_404(Course, pk=pk)
+        self.check_object_permissions(request, course)
+
+        serializer = CurveGradesSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        params = dict(serializer.validated_data)
+        method = params.pop('method')
+        commit = params.pop('commit')
+
+        try:
+            result = course.curve_grades(method, commit=commit, **params)
+        except ValidationError as e:
+            raise serializers.ValidationError(e.message_dict)
+        return Response(result, status=status.HTTP_200_OK)
+
+    @detail_route(methods=['get'])
+    def calendar(self, request, pk=None):
+        """
+        Get deadlines of assignments of the course as an iCalendar feed
+        """
+        course = get_object_or_404(Course, pk=pk)
+        self.check_object_permissions(request, course)
+        return get_calendar_response(request, str(course), [course.pk])
+
+    @detail_route(methods=['get'], permission_classes=[IsCourseInstructor])
+    def gradebook(self, request, pk=None):
+        """
+        Get assignment scores of all students as a dense matrix
+
+        Pass `since` to get only scores modified after that time.  The whole
+        matrix is returned instead, with `full` set, if anything was deleted since.
+        Only the whole matrix is cached, so that cache keys do not grow with `since`.
+        """
+        course = get_object_or_404(Course, pk=pk)
+        self.check_object_permissions(request, course)
+
+        query_serializer = GradebookQuerySerializer(data=request.query_params)
+        query_serializer.is_valid(raise_exception=True)
+        since = query_serializer.validated_data.get('since', None)
+
+        version_key = get_course_resource_key(course.pk, 'gradebook')
+        version, modified_dtm = get_resource_versions(version_key)[version_key]
+        if since is not None:
+            data = course.get_gradebook(since)
+            data['version'] = version
+            return Response(data, status=status.HTTP_200_OK)
+
+        cache_key = 'gradebook:{0}:{1}'.format(course.pk, version)
+        data = cache.get(cache_key)
+        if data is None:
+            data = course.get_gradebook()
+            data['version'] = version
+            cache.set(cache_key, data)
+
+        return Response(data, status=status.HTTP_200_OK)
+
     @list_route(methods=['get'], permission_classes=[IsInstructor])
-    def giving(self, request):
+    def cohort(self, request):
         """
-        Get a list of courses given by this instructor
+        Compare grades and group sizes of all offerings of a course title
+
+        Only instructors giving one of the offerings can see it.
         """
         self.check_permissions(request)
 
-        queryset = Course.objects.given_by(get_role_of(request.user))
+        query_serializer = CohortQuerySerializer(data=request.query_params)
+        query_serializer.is_valid(raise_exception=True)
+        title = query_serializer.validated_data['title']
+
+        if not Teaches.objects.filter(instructor=get_role_of(request.user),
+                                      course__title=title).exists():
+            self.permission_denied(request)
+
+        offering_pks = Course.objects.filter(
+            title=title).order_by('pk').values_list('pk', flat=True)
+        version_keys = [get_course_resource_key(pk, 'analytics') for pk in offering_pks]
+        versions = get_resource_versions(*version_keys)
+        cache_key = 'cohort:' + hashlib.md5('|'.join(
+            [title] + ['{0}={1}'.format(key, versions[key][0]) for key in version_keys]
+        ).encode('utf-8')).hexdigest()
+        data = cache.get(cache_key)
+        if data is None:
+            data = Course.objects.get_cohort_analytics(title)
+            cache.set(cache_key, data)
+
+        return Response(data, status=status.HTTP_200_OK)
+
+    def list_courses(self, request, courses):
+        """
+        Respond a list of `courses`, answering conditional GETs by versions of all of them
+        """
+        def respond():
+            selection = get_field_selection(request, ReadCourseSerializer)
+            queryset = prefetch_for_serializer(courses, ReadCourseSerializer, **selection)
+
+            page = self.paginate_queryset(queryset)
+            if page is not None:
+                serializer = ReadCourseSerializer(page, many=True,
+                                                  context=self.get_serializer_context(),
+                                                  **selection)
+                return self.get_paginated_response(serializer.data)
+
+            serializer = ReadCourseSerializer(queryset, many=True,
+                                              context=self.get_serializer_context(), **selection)
+            return Response(serializer.data)
+
+        version_keys = [get_course_resource_key(pk, name)
+                        for pk in courses.values_list('pk', flat=True)
+                        for name in COURSE_RESOURCE_NAMES]
+        return get_conditional_response(request, version_keys, respond)
 
-        page = self.paginate_queryset(queryset)
-        if page is not None:
-            serializer = ReadCourseSerializer(page, many=True, context=self.get_serializer_context())
-            return self.get_paginated_response(serializer.data)
+    @list_route(methods=['get'], permission_classes=[IsInstructor])
+    def giving(self, request):
+        """
+        Get a list of courses given by this instructor
+        """
+        self.check_permissions(request)
 
-        serializer = ReadCourseSerializer(queryset, many=True, context=self.get_serializer_context())
-        return Response(serializer.data)
+        return self.list_courses(request, Course.objects.given_by(get_role_of(request.user)))
 
     @list_route(methods=['get'], permission_classes=[IsStudent])
     def taking(self, request):
@@ -388,21 +1037,14 @@ class CourseViewSet(HandleValidErrorViewSetMixin, FourLevelPermModelViewSet):
         """
         self.check_permissions(request)
 
-        queryset = Course.objects.taken_by(get_role_of(request.user))
-
-        page = self.paginate_queryset(queryset)
-        if page is not None:
-            serializer = ReadCourseSerializer(page, many=True, context=self.get_serializer_context())
-            return self.get_paginated_response(serializer.data)
-
-        serializer = ReadCourseSerializer(queryset, many=True, context=self.get_serializer_context())
-        return Response(serializer.data)
+        return self.list_courses(request, Course.objects.taken_by(get_role_of(request.user)))
 
 
 # -----------------------------------------------------------------------------
 # CourseInstructors ViewSets
 # -----------------------------------------------------------------------------
 class CourseTeachesViewSet(HandleValidErrorViewSetMixin,
+                           VersionConditionalMixin,
                            FourLevelPermListModelMixin,
                            FourLevelPermRetrieveModelMixin,
                            FourLevelPermCreateModelMixin,
@@ -414,6 +1056,7 @@ class CourseTeachesViewSet(HandleValidErrorViewSetMixin,
     serializer_class = ReadCourseTeachesSerializer
 
     read_serializer_class = ReadCourseTeachesSerializer
+    course_resource_names = ('teaches', )
     write_serializer_class = CourseTeachesSerializer
     base_write_serializer_class = write_serializer_class
     normal_write_serializer_class = write_serializer_class
@@ -424,6 +1067,7 @@ class CourseTeachesViewSet(HandleValidErrorViewSetMixin,
 # CourseTakes ViewSets
 # -----------------------------------------------------------------------------
 class CourseTakesViewSet(HandleValidErrorViewSetMixin,
+                         VersionConditionalMixin,
                          FourLevelPermNestedModelViewSet):
     queryset = Takes.objects.all()
     filter_backends = (FourLevelObjectPermissionsFilter, )
@@ -431,6 +1075,8 @@ class CourseTakesViewSet(HandleValidErrorViewSetMixin,
     serializer_class = ReadCourseTakesSerializer
 
     read_serializer_class = ReadCourseTakesSerializer
+    fast_path = True
+    course_resource_names = ('takes', )
     write_serializer_class = CreateCourseTakesSerializer
     base_write_serializer_class = BaseWriteCourseTakesSerializer
     normal_write_serializer_class = write_serializer_class
@@ -441,6 +1087,7 @@ class CourseTakesViewSet(HandleValidErrorViewSetMixin,
 # Group ViewSets
 # -----------------------------------------------------------------------------
 class GroupViewSet(HandleValidErrorViewSetMixin,
+                   VersionConditionalMixin,
                    FourLevelPermListModelMixin,
                    FourLevelPermRetrieveModelMixin,
                    FourLevelPermUpdateModelMixin,
@@ -459,13 +1106,33 @@ class GroupViewSet(HandleValidErrorViewSetMixin,
     serializer_class = ReadGroupSerializer
 
     read_serializer_class = ReadGroupSerializer
+    fast_path = True
+    course_resource_names = ('groups', )
     write_serializer_class = CreateGroupSerializer
     advanced_write_serializer_class = WriteGroupSerializer
     normal_write_serializer_class = advanced_write_serializer_class
     base_write_serializer_class = advanced_write_serializer_class
 
+    @detail_route(methods=['post'], permission_classes=[CanChangeGroupLeader])
+    def transfer_leadership(self, request, pk=None):
+        """
+        Make a member of the group its leader, and the leader a member
+        """
+        group = self.get_object()
+
+        serializer = TransferLeadershipSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            group.transfer_leadership(serializer.validated_data['leader'])
+        except ValidationError as e:
+            raise serializers.ValidationError(e.message_dict)
+
+        serializer = ReadGroupSerializer(group, context=self.get_serializer_context())
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
 
 class CourseGroupsViewSet(HandleValidErrorViewSetMixin,
+                          VersionConditionalMixin,
                           FourLevelPermListModelMixin,
                           FourLevelPermRetrieveModelMixin,
                           FourLevelPermNestedGenericViewSet):
@@ -475,19 +1142,26 @@ class CourseGroupsViewSet(HandleValidErrorViewSetMixin,
     serializer_class = ReadGroupSerializer
 
     read_serializer_class = ReadGroupSerializer
+    fast_path = True
+    course_resource_names = ('groups', )
 
 
 # -----------------------------------------------------------------------------
 # Assignment ViewSets
 # -----------------------------------------------------------------------------
 class AssignmentViewSet(HandleValidErrorViewSetMixin,
+                        VersionConditionalMixin,
+                        SerializerPrefetchMixin,
                         viewsets.ModelViewSet):
 
-    queryset = Assignment.objects.all()
+    queryset = Assignment.objects.with_no_in_course()
+    pagination_class = DeadlineHeaderCursorPagination
 
     filter_backends = (filters.DjangoFilterBackend, )
     filter_class = core_filters.AssignmentFilter
 
+    course_resource_names = ('assignments', )
+
     def get_serializer_class(self):
         request_method = self.request.method
         if request_method in SAFE_METHODS:
@@ -497,11 +1171,96 @@ class AssignmentViewSet(HandleValidErrorViewSetMixin,
         else:
             return WriteAssignmentSerializer
 
+    @detail_route(methods=['post'], permission_classes=[IsCourseInstructor])
+    def scores(self, request, pk=None):
+        """
+        Enter scores of the assignment for many students at once
+
+        Accept a list of `{"student": <student id>, "score": <score>}`.
+        """
+        assignment = get_object_or_404(Assignment, pk=pk)
+        self.check_object_permissions(request, assignment)
+
+        serializer = AssignmentScoreEntrySerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        scores = dict((entry['student'], entry['score']) for entry in serializer.validated_data)
+        try:
+            count = assignment.course.set_assignment_scores(assignment, scores)
+        except ValidationError as e:
+            raise serializers.ValidationError(e.message_dict)
+
+        return Response(dict(count=count), status=status.HTTP_200_OK)
+
+    @list_route(methods=['get'])
+    def calendar(self, request):
+        """
+        Get deadlines of assignments of all courses taken or given by this user
+        as an iCalendar feed
+        """
+        user_role = get_role_of(request.user)
+        if isinstance(user_role, Student):
+            courses = Course.objects.taken_by(user_role)
+        elif isinstance(user_role, Instructor):
+            courses = Course.objects.given_by(user_role)
+        else:
+            courses = Course.objects.none()
+        return get_calendar_response(request, str(request.user),
+                                     courses.values_list('pk', flat=True))
+
+    @list_route(methods=['get'], permission_classes=[IsStudent])
+    def upcoming(self, request):
+        """
+        Get assignments due in the next `days` days of all courses taken by this student
+
+        Paginated by deadline, soonest first.
+        """
+        self.check_permissions(request)
+
+        query_serializer = UpcomingAssignmentsQuerySerializer(data=request.query_params)
+        query_serializer.is_valid(raise_exception=True)
+        days = query_serializer.validated_data['days']
+
+        cache_key = 'upcoming:{0}:{1}:{2}'.format(
+            request.user.pk, days, request.query_params.get('cursor', ''),
+        )
+        data = cache.get(cache_key)
+        if data is None:
+            now = timezone.now()
+            queryset = Assignment.objects.filter(
+                course_id__in=Takes.objects.filter(
+                    student=get_role_of(request.user)).values('course_id'),
+                deadline_dtm__gte=now,
+                deadline_dtm__lt=now + timedelta(days=days),
+            ).with_no_in_course()
+
+            paginator = DeadlineCursorPagination()
+            page = paginator.paginate_queryset(queryset, request, view=self)
+            serializer = ReadAssignmentSerializer(page, many=True,
+                                                  context=self.get_serializer_context())
+            data = paginator.get_paginated_response(serializer.data).data
+            cache.set(cache_key, data, UPCOMING_ASSIGNMENTS_CACHE_TIMEOUT)
+
+        return Response(data)
+
+
+class GroupRequestViewSet(SerializerPrefetchMixin,
+                          mixins.ListModelMixin,
+                          mixins.RetrieveModelMixin,
+                          viewsets.GenericViewSet):
+    """
+    Queued group creation requests of the user, see `CourseViewSet.add_group`
+    """
+    queryset = GroupRequest.objects.all()
+    serializer_class = GroupRequestSerializer
+
+    def get_queryset(self):
+        queryset = super(GroupRequestViewSet, self).get_queryset()
+        return queryset.filter(leader__user=self.request.user).order_by('-id')
+
 
 class ClassViewSet(HandleValidErrorViewSetMixin,
+                   SerializerPrefetchMixin,
                    viewsets.ModelViewSet):
 
     queryset = Class.objects.all()
     serializer_class = ClassSerializer
-
-
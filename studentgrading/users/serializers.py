@@ -1,10 +1,9 @@
 # -*- coding: utf-8 -*-
-from rest_framework import serializers
-
 from .models import User
+from ..utils import hyperlinks
 
 
-class ReadlUserSerializer(serializers.HyperlinkedModelSerializer):
+class ReadlUserSerializer(hyperlinks.HyperlinkedModelSerializer):
 
     class Meta:
         model = User
@@ -15,7 +14,7 @@ class ReadlUserSerializer(serializers.HyperlinkedModelSerializer):
         }
 
 
-class CreateUserSerializer(serializers.HyperlinkedModelSerializer):
+class CreateUserSerializer(hyperlinks.HyperlinkedModelSerializer):
 
     class Meta:
         model = User
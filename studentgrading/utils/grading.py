@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+Vectorized grade computations.
+
+Functions here work on plain NumPy arrays and know nothing about models.
+Missing values are represented by NaN.
+"""
+from decimal import Decimal
+
+import numpy as np
+
+
+GRADE_MIN = 0
+GRADE_MAX = 100
+
+
+def build_matrix(row_ids, col_ids, cells):
+    """
+    Pivot (row id, column id, value) triples into a dense matrix.
+
+    Cells whose row or column id is not listed are ignored.
+    :param row_ids: sorted sequence of row ids
+    :param col_ids: sorted sequence of column ids
+    :param cells: iterable of (row id, column id, value) triples
+    :return: 2-D float array of shape (len(row_ids), len(col_ids)), NaN where no value
+    """
+    row_ids = np.asarray(row_ids, dtype=np.int64)
+    col_ids = np.asarray(col_ids, dtype=np.int64)
+    matrix = np.full((len(row_ids), len(col_ids)), np.nan)
+
+    cells = np.array(list(cells), dtype=float).reshape(-1, 3)
+    if not len(cells) or not len(row_ids) or not len(col_ids):
+        return matrix
+
+    cell_rows = cells[:, 0].astype(np.int64)
+    cell_cols = cells[:, 1].astype(np.int64)
+    row_pos = np.searchsorted(row_ids, cell_rows).clip(0, len(row_ids) - 1)
+    col_pos = np.searchsorted(col_ids, cell_cols).clip(0, len(col_ids) - 1)
+    found = (row_ids[row_pos] == cell_rows) & (col_ids[col_pos] == cell_cols)
+    matrix[row_pos[found], col_pos[found]] = cells[found, 2]
+    return matrix
+
+
+def matrix_to_list(matrix, decimals=2):
+    """
+    Convert a matrix into nested lists, rounding values and turning NaN into `None`
+
+    :param matrix: 2-D float array
+    :param decimals: number of decimal places to round to
+    :return: list of row lists
+    """
+    matrix = np.asarray(matrix, dtype=float)
+    return np.where(np.isnan(matrix), None, np.round(matrix, decimals)).tolist()
+
+
+def weighted_totals(scores, ratios):
+    """
+    Compute the weighted total of each row of a score matrix.
+
+    Missing scores count as zero.  Rows without any score get NaN.
+    :param scores: 2-D array, one row per student and one column per assignment
+    :param ratios: 1-D array of grade ratios, one per assignment
+    :return: 1-D float array of totals
+    """
+    scores = np.asarray(scores, dtype=float)
+    ratios = np.asarray(ratios, dtype=float)
+    missing = np.isnan(scores)
+    totals = np.where(missing, 0.0, scores).dot(ratios)
+    totals[missing.all(axis=1)] = np.nan
+    return totals
+
+
+def to_grade_decimals(values):
+    """
+    Clip values into the grade range and round them to two decimal places.
+
+    :param values: 1-D array, NaN for missing grades
+    :return: list of `Decimal` instances, or `None` for missing grades
+    """
+    values = np.round(np.clip(np.asarray(values, dtype=float), GRADE_MIN, GRADE_MAX), 2)
+    return [None if np.isnan(v) else Decimal('{0:.2f}'.format(v)) for v in values]
+
+
+CURVE_LINEAR = 'linear'
+CURVE_ZSCORE = 'zscore'
+CURVE_TARGET = 'target'
+CURVE_METHODS = (CURVE_LINEAR, CURVE_ZSCORE, CURVE_TARGET)
+
+# z-score normalization maps grades onto this distribution
+ZSCORE_MEAN = 50
+ZSCORE_SD = 10
+
+HISTOGRAM_BINS = 10
+
+
+def curve(values, method, scale=1, offset=0, target_mean=None, target_sd=None):
+    """
+    Curve a column of grades.
+
+    `linear` computes `grade * scale + offset`.
+    `zscore` normalizes grades to mean `ZSCORE_MEAN` and sd `ZSCORE_SD`.
+    `target` shifts and stretches grades to `target_mean` and `target_sd`,
+    keeping the current sd if `target_sd` is `None`.
+    Results are not clipped nor rounded, see `to_grade_decimals`.
+    :param values: 1-D array, NaN for missing grades
+    :param method: one of `CURVE_METHODS`
+    :return: 1-D float array, NaN where values are NaN
+    """
+    values = np.asarray(values, dtype=float)
+    if method == CURVE_LINEAR:
+        return values * float(scale) + float(offset)
+
+    if method == CURVE_ZSCORE:
+        target_mean, target_sd = ZSCORE_MEAN, ZSCORE_SD
+    elif method == CURVE_TARGET:
+        if target_mean is None:
+            raise ValueError('target_mean is required')
+    else:
+        raise ValueError('unknown curve method: {0}'.format(method))
+
+    present = values[~np.isnan(values)]
+    if not len(present):
+        return values.copy()
+    mean = present.mean()
+    sd = present.std()
+    if target_sd is None:
+        target_sd = sd
+    if sd == 0:
+        # all grades are equal, nothing to stretch
+        return np.where(np.isnan(values), np.nan, float(target_mean))
+    return (values - mean) / sd * float(target_sd) + float(target_mean)
+
+
+def summarize(values):
+    """
+    Summarize a column of values, ignoring NaN.
+
+    :param values: 1-D array
+    :return: dict of `count`, `mean`, `sd`, `min` and `max`, all but `count` `None` if empty
+    """
+    values = np.asarray(values, dtype=float)
+    present = values[~np.isnan(values)]
+    if not len(present):
+        return dict(count=0, mean=None, sd=None, min=None, max=None)
+    return dict(
+        count=int(len(present)),
+        mean=round(float(present.mean()), 2),
+        sd=round(float(present.std()), 2),
+        min=round(float(present.min()), 2),
+        max=round(float(present.max()), 2),
+    )
+
+
+def describe(values):
+    """
+    Summarize the distribution of a column of grades, ignoring NaN.
+
+    :param values: 1-D array, NaN for missing grades
+    :return: dict of `summarize` plus `histogram`, counts of `HISTOGRAM_BINS`
+        equal bins over the grade range
+    """
+    values = np.asarray(values, dtype=float)
+    present = values[~np.isnan(values)]
+    histogram = np.histogram(present, bins=HISTOGRAM_BINS, range=(GRADE_MIN, GRADE_MAX))[0]
+    stats = summarize(present)
+    stats['histogram'] = histogram.tolist()
+    return stats
+
+
+def split_by_ids(ids, cell_ids, values):
+    """
+    Split a column of values by the id each value belongs to.
+
+    :param ids: sequence of ids to split into
+    :param cell_ids: 1-D sequence, the id of each value
+    :param values: 1-D sequence of values
+    :return: list of float arrays, one per id in `ids`
+    """
+    cell_ids = np.asarray(cell_ids, dtype=np.int64)
+    values = np.asarray(values, dtype=float)
+    order = np.argsort(cell_ids, kind='mergesort')
+    cell_ids, values = cell_ids[order], values[order]
+    ids = np.asarray(ids, dtype=np.int64)
+    starts = np.searchsorted(cell_ids, ids, side='left')
+    ends = np.searchsorted(cell_ids, ids, side='right')
+    return [values[start:end] for start, end in zip(starts, ends)]
+
+
+def mean_drift(means):
+    """
+    Compute the change of each mean from the previous one.
+
+    :param means: 1-D sequence in chronological order, `None` or NaN if unknown
+    :return: list, `None` for the first mean and where either mean is unknown
+    """
+    means = np.array([np.nan if mean is None else mean for mean in means], dtype=float)
+    if not len(means):
+        return []
+    drift = np.concatenate(([np.nan], np.diff(means)))
+    return [None if np.isnan(d) else round(float(d), 2) for d in drift]
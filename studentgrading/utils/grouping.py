@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Partition students into groups, and label groups.
+
+Functions here work on plain sequences and know nothing about models.
+"""
+import math
+
+
+def get_group_count(count, min_size, max_size):
+    """
+    Return the least number of groups `count` students fit in, within the size bounds.
+
+    Groups formed by `chunk`, `deal` or `snake` differ in size by at most one,
+    so they are all within the bounds.
+    Raise ValueError if there is no such number.
+    """
+    if count == 0:
+        return 0
+    if max_size < 1 or min_size > max_size:
+        raise ValueError('Invalid group size bounds.')
+    group_count = int(math.ceil(count / float(max_size)))
+    if count // group_count < min_size:
+        raise ValueError('Not enough students to form groups of at least {0}.'.format(min_size))
+    return group_count
+
+
+def chunk(items, group_count):
+    """
+    Split items into `group_count` consecutive runs, keeping neighbours together.
+    """
+    base, extra = divmod(len(items), group_count)
+    groups, start = [], 0
+    for i in range(group_count):
+        end = start + base + (1 if i < extra else 0)
+        groups.append(list(items[start:end]))
+        start = end
+    return groups
+
+
+def deal(items, group_count):
+    """
+    Deal items to groups round-robin, spreading runs of alike items over all groups.
+    """
+    return [list(items[i::group_count]) for i in range(group_count)]
+
+
+def snake(items, group_count):
+    """
+    Deal items to groups in a snake order (1..k, k..1, ...).
+
+    With items sorted from best to worst, every group gets a mix of both.
+    """
+    groups = [[] for i in range(group_count)]
+    for i, item in enumerate(items):
+        lap, pos = divmod(i, group_count)
+        groups[pos if lap % 2 == 0 else group_count - 1 - pos].append(item)
+    return groups
+
+
+def get_group_label(index, alphabet):
+    """
+    Return the label of the `index`-th group, counting from 0.
+
+    Labels run like spreadsheet columns: A..Z, AA..AZ, BA.. for an A-Z alphabet,
+    so there is no limit on the number of groups.
+    """
+    base = len(alphabet)
+    label = ''
+    index += 1
+    while index:
+        index, pos = divmod(index - 1, base)
+        label = alphabet[pos] + label
+    return label
+
+
+def is_group_label(label, alphabet):
+    """
+    Return whether `label` is a label `get_group_label` can return.
+    """
+    return bool(label) and all(char in alphabet for char in label)
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+Hyperlinks of API views filled into precompiled URL templates.
+
+DRF reverses every hyperlink through the URL resolver.  Here each view is reversed
+once per request base URL, with placeholder kwargs, into a template that links are
+then formatted into.  Links are the same as those of `rest_framework.reverse.reverse`,
+which is still used for anything but integer kwargs, e.g. format suffixes.
+
+Requests for the compact representation, by `?repr=ids` or by accepting
+`IDS_MEDIA_TYPE`, get no links at all: related objects are shown by their pks
+and identity fields such as `url` are left out.
+"""
+import re
+
+from django.core.urlresolvers import get_script_prefix, reverse as django_reverse
+from django.utils import six
+
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.reverse import reverse as drf_reverse
+from rest_framework.settings import api_settings
+
+
+# placeholders of kwargs, digits to match any kwarg pattern
+PLACEHOLDER_BASE = 987654321000
+
+_url_templates = {}
+
+IDS_MEDIA_TYPE = 'application/vnd.studentgrading.ids+json'
+REPR_QUERY_PARAM = 'repr'
+
+
+def get_base_url(request):
+    """
+    Return the scheme and host which paths are prefixed with in absolute URLs
+    of `request`, computed once per request
+    """
+    if request is None:
+        return ''
+    base_url = getattr(request, '_hyperlink_base_url', None)
+    if base_url is None:
+        base_url = request._hyperlink_base_url = request.build_absolute_uri('/')[:-1]
+    return base_url
+
+
+def get_url_template(view_name, kwarg_names, base_url=''):
+    """
+    Return the URL template of a view, to be formatted with kwargs
+
+    e.g. `'http://testserver/api/students/{pk}/'`
+    :param kwarg_names: sorted tuple of names of URL kwargs
+    """
+    key = (base_url, get_script_prefix(), view_name, kwarg_names)
+    template = _url_templates.get(key)
+    if template is None:
+        placeholders = dict(
+            (str(PLACEHOLDER_BASE + i), name) for i, name in enumerate(kwarg_names)
+        )
+        path = django_reverse(view_name, kwargs=dict(
+            (name, placeholder) for placeholder, name in placeholders.items()
+        ))
+        template = (base_url + path).replace('{', '{{').replace('}', '}}')
+        if placeholders:
+            template = re.sub(
+                '|'.join(placeholders),
+                lambda match: '{' + placeholders[match.group(0)] + '}',
+                template,
+            )
+        _url_templates[key] = template
+    return template
+
+
+def can_fill_templates(request, format=None):
+    """
+    Return whether links for `request` are the same as URL templates filled with
+    integer kwargs, i.e. no format suffix nor version is added to them
+    """
+    return (format is None and
+            getattr(request, 'versioning_scheme', None) is None and
+            api_settings.URL_FORMAT_OVERRIDE not in getattr(request, 'query_params', ()))
+
+
+def reverse(view_name, kwargs=None, request=None, format=None):
+    """
+    Same as `rest_framework.reverse.reverse`, but fill a precompiled URL template
+    if all kwargs are integers
+    """
+    kwargs = kwargs or {}
+    if (not can_fill_templates(request, format) or
+            not all(isinstance(value, six.integer_types) for value in kwargs.values())):
+        return drf_reverse(view_name, kwargs=kwargs, request=request, format=format)
+
+    template = get_url_template(view_name, tuple(sorted(kwargs)), get_base_url(request))
+    return template.format(**kwargs)
+
+
+def is_ids_repr(request):
+    """
+    Return whether `request` asks for the compact representation
+    """
+    if request is None:
+        return False
+    ids_repr = getattr(request, '_ids_repr', None)
+    if ids_repr is None:
+        accepted_media_type = getattr(request, 'accepted_media_type', None)
+        ids_repr = (
+            getattr(request, 'query_params', {}).get(REPR_QUERY_PARAM) == 'ids' or
+            (accepted_media_type or '').startswith(IDS_MEDIA_TYPE)
+        )
+        if accepted_media_type is not None:
+            # known once the content is negotiated
+            request._ids_repr = ids_repr
+    return ids_repr
+
+
+def get_name(obj):
+    """
+    Return the name of a link to `obj`, shown by HTML renderers only
+
+    DRF names links by `str(obj)`, which may read relations of `obj` with a query
+    per link, so links are named by pks instead.
+    """
+    return six.text_type(obj.pk)
+
+
+class IdsJSONRenderer(JSONRenderer):
+    """
+    JSON renderer of the compact representation, chosen by accepting `IDS_MEDIA_TYPE`
+    """
+    media_type = IDS_MEDIA_TYPE
+
+
+class HyperlinkedRelatedField(serializers.HyperlinkedRelatedField):
+    """
+    `HyperlinkedRelatedField` reversing URLs with `reverse` of this module,
+    showing pks instead in the compact representation, see also `get_name`
+    """
+
+    def __init__(self, view_name=None, **kwargs):
+        super(HyperlinkedRelatedField, self).__init__(view_name, **kwargs)
+        self.reverse = reverse
+
+    def to_representation(self, value):
+        if is_ids_repr(self.context.get('request')):
+            return value.pk
+        return super(HyperlinkedRelatedField, self).to_representation(value)
+
+    def get_name(self, obj):
+        return get_name(obj)
+
+
+class HyperlinkedIdentityField(serializers.HyperlinkedIdentityField):
+    """
+    `HyperlinkedIdentityField` reversing URLs with `reverse` of this module,
+    see also `get_name`
+    """
+
+    def __init__(self, view_name=None, **kwargs):
+        super(HyperlinkedIdentityField, self).__init__(view_name, **kwargs)
+        self.reverse = reverse
+
+    def get_name(self, obj):
+        return get_name(obj)
+
+
+class HyperlinkedModelSerializer(serializers.HyperlinkedModelSerializer):
+    """
+    `HyperlinkedModelSerializer` whose generated hyperlinks use `reverse` of this module
+
+    Identity fields are left out of the compact representation.
+    """
+    serializer_related_field = HyperlinkedRelatedField
+    serializer_url_field = HyperlinkedIdentityField
+
+    def get_fields(self):
+        fields = super(HyperlinkedModelSerializer, self).get_fields()
+        if is_ids_repr(self.context.get('request')):
+            for name, field in list(fields.items()):
+                if isinstance(field, serializers.HyperlinkedIdentityField):
+                    del fields[name]
+        return fields
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Minimal iCalendar (RFC 5545) writer.
+
+Events are built separately from the calendar wrapping them, so that blocks of
+events can be prebuilt, stored and concatenated into different calendars.
+"""
+CRLF = '\r\n'
+MAX_LINE_OCTETS = 75
+PRODID = '-//studentgrading//assignments//EN'
+
+
+def escape_text(text):
+    """
+    Escape a TEXT property value.
+    """
+    return (text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def fold_line(line):
+    """
+    Fold a content line into lines of at most 75 octets, without splitting characters.
+    """
+    chunks = []
+    chunk, size = '', 0
+    limit = MAX_LINE_OCTETS
+    for char in line:
+        char_size = len(char.encode('utf-8'))
+        if size + char_size > limit:
+            chunks.append(chunk)
+            # continuation lines start with a space
+            chunk, size = ' ', 1
+        chunk += char
+        size += char_size
+    chunks.append(chunk)
+    return CRLF.join(chunks)
+
+
+def format_datetime(value):
+    """
+    Format an aware datetime in UTC, e.g. `20160301T120000Z`.
+    """
+    offset = value.utcoffset()
+    if offset is not None:
+        value = value.replace(tzinfo=None) - offset
+    return value.strftime('%Y%m%dT%H%M%SZ')
+
+
+def build_events(events):
+    """
+    Build VEVENT components.
+
+    :param events: iterable of dicts of `uid`, `stamp`, `start` and `summary`,
+        and optionally `description`
+    :return: string of CRLF-terminated lines
+    """
+    lines = []
+    for event in events:
+        lines.append('BEGIN:VEVENT')
+        lines.append('UID:' + event['uid'])
+        lines.append('DTSTAMP:' + format_datetime(event['stamp']))
+        lines.append('DTSTART:' + format_datetime(event['start']))
+        lines.append('SUMMARY:' + escape_text(event['summary']))
+        if event.get('description'):
+            lines.append('DESCRIPTION:' + escape_text(event['description']))
+        lines.append('END:VEVENT')
+    return ''.join(fold_line(line) + CRLF for line in lines)
+
+
+def build_calendar(name, event_blocks):
+    """
+    Wrap blocks built by `build_events` into a VCALENDAR.
+
+    :param name: calendar name shown by clients
+    :param event_blocks: iterable of strings returned by `build_events`
+    :return: iCalendar string
+    """
+    header = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:' + PRODID,
+        'CALSCALE:GREGORIAN',
+        'X-WR-CALNAME:' + escape_text(name),
+    ]
+    return (''.join(fold_line(line) + CRLF for line in header) +
+            ''.join(event_blocks) +
+            'END:VCALENDAR' + CRLF)
@@ -2,7 +2,21 @@
 from test_plus import TestCase
 import environ
 
+import numpy as np
+
+from rest_framework.request import Request
+from rest_framework.reverse import reverse as drf_reverse
+from rest_framework.test import APIRequestFactory
+
+from .. import hyperlinks
 from ..import_data import get_student_dataset
+from ..grouping import get_group_count, chunk, deal, snake, get_group_label, is_group_label
+from ..ical import escape_text, fold_line, format_datetime, build_events, build_calendar
+from ..grading import (
+    build_matrix, weighted_totals, to_grade_decimals, curve, describe,
+    split_by_ids, mean_drift,
+    CURVE_LINEAR, CURVE_ZSCORE, CURVE_TARGET, ZSCORE_MEAN, ZSCORE_SD,
+)
 
 
 class ImportXlsTests(TestCase):
@@ -11,4 +25,171 @@ class ImportXlsTests(TestCase):
         with self.assertRaises(TypeError):
             get_student_dataset(
                 str((environ.Path(__file__) - 1).path('test1.txt'))
-            )
\ No newline at end of file
+            )
+
+
+class GradingTests(TestCase):
+
+    def test_build_matrix(self):
+        matrix = build_matrix([1, 3, 5], [10, 20], [
+            (1, 10, 80), (5, 20, 60), (3, 10, 70), (4, 10, 99), (1, 30, 99),
+        ])
+        self.assertEqual(matrix.shape, (3, 2))
+        self.assertEqual(matrix[0, 0], 80)
+        self.assertEqual(matrix[1, 0], 70)
+        self.assertEqual(matrix[2, 1], 60)
+        # unknown rows and columns are ignored
+        self.assertEqual(int(np.isnan(matrix).sum()), 3)
+
+        self.assertEqual(build_matrix([], [10], []).shape, (0, 1))
+        self.assertTrue(np.isnan(build_matrix([1], [10], [])).all())
+
+    def test_weighted_totals(self):
+        totals = weighted_totals([[80, 90], [np.nan, 50], [np.nan, np.nan]], [0.5, 0.5])
+        self.assertAlmostEqual(totals[0], 85)
+        self.assertAlmostEqual(totals[1], 25)
+        self.assertTrue(np.isnan(totals[2]))
+
+    def test_to_grade_decimals(self):
+        from decimal import Decimal
+        self.assertEqual(to_grade_decimals([85.556, -3, 120, np.nan]),
+                         [Decimal('85.56'), Decimal('0.00'), Decimal('100.00'), None])
+
+    def test_curve(self):
+        grades = [60, 70, 80, np.nan]
+        curved = curve(grades, CURVE_LINEAR, scale=2, offset=-50)
+        self.assertEqual(curved[:3].tolist(), [70, 90, 110])
+        self.assertTrue(np.isnan(curved[3]))
+
+        curved = curve(grades, CURVE_ZSCORE)
+        self.assertAlmostEqual(np.nanmean(curved), ZSCORE_MEAN)
+        self.assertAlmostEqual(np.nanstd(curved), ZSCORE_SD)
+
+        curved = curve(grades, CURVE_TARGET, target_mean=75)
+        self.assertEqual(curved[:3].tolist(), [65, 75, 85])
+        curved = curve([70, 70], CURVE_TARGET, target_mean=75, target_sd=5)
+        self.assertEqual(curved.tolist(), [75, 75])
+
+        with self.assertRaises(ValueError):
+            curve(grades, CURVE_TARGET)
+        with self.assertRaises(ValueError):
+            curve(grades, 'unknown')
+
+    def test_describe(self):
+        stats = describe([55, 65, 100, np.nan])
+        self.assertEqual(stats['count'], 3)
+        self.assertEqual(stats['mean'], 73.33)
+        self.assertEqual(stats['min'], 55)
+        self.assertEqual(stats['max'], 100)
+        self.assertEqual(stats['histogram'], [0, 0, 0, 0, 0, 1, 1, 0, 0, 1])
+
+        self.assertEqual(describe([])['count'], 0)
+        self.assertIsNone(describe([])['mean'])
+
+    def test_split_by_ids(self):
+        groups = split_by_ids([3, 1, 9], [1, 3, 1, 3, 5], [10, 20, 30, 40, 50])
+        self.assertEqual([group.tolist() for group in groups], [[20, 40], [10, 30], []])
+
+    def test_mean_drift(self):
+        self.assertEqual(mean_drift([70, None, 75, 80.5]), [None, None, None, 5.5])
+        self.assertEqual(mean_drift([]), [])
+
+
+class ICalTests(TestCase):
+
+    def test_escape_text(self):
+        self.assertEqual(escape_text('a,b;c\\d\ne'), 'a\\,b\\;c\\\\d\\ne')
+
+    def test_fold_line(self):
+        line = 'SUMMARY:' + '作业' * 40
+        folded = fold_line(line).split('\r\n')
+        self.assertTrue(all(len(part.encode('utf-8')) <= 75 for part in folded))
+        self.assertTrue(all(part.startswith(' ') for part in folded[1:]))
+        self.assertEqual(folded[0] + ''.join(part[1:] for part in folded[1:]), line)
+
+    def test_build_calendar(self):
+        import datetime
+        from django.utils import timezone
+        start = timezone.make_aware(datetime.datetime(2016, 3, 8, 12), timezone.utc)
+        self.assertEqual(format_datetime(start), '20160308T120000Z')
+
+        events = build_events([
+            dict(uid='a-1', stamp=start, start=start, summary='Report'),
+        ])
+        calendar = build_calendar('Course', [events, events])
+        self.assertTrue(calendar.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertTrue(calendar.endswith('END:VCALENDAR\r\n'))
+        self.assertEqual(calendar.count('BEGIN:VEVENT'), 2)
+        self.assertIn('DTSTART:20160308T120000Z\r\n', calendar)
+
+
+class GroupingTests(TestCase):
+
+    def test_get_group_count(self):
+        self.assertEqual(get_group_count(10, 2, 4), 3)
+        self.assertEqual(get_group_count(13, 0, 5), 3)
+        self.assertEqual(get_group_count(0, 2, 4), 0)
+        with self.assertRaises(ValueError):
+            get_group_count(5, 3, 4)
+        with self.assertRaises(ValueError):
+            get_group_count(5, 3, 2)
+
+    def test_partitions(self):
+        items = list(range(7))
+        self.assertEqual(chunk(items, 3), [[0, 1, 2], [3, 4], [5, 6]])
+        self.assertEqual(deal(items, 3), [[0, 3, 6], [1, 4], [2, 5]])
+        self.assertEqual(snake(items, 3), [[0, 5, 6], [1, 4], [2, 3]])
+
+    def test_group_label(self):
+        alphabet = list('ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+        self.assertEqual(get_group_label(0, alphabet), 'A')
+        self.assertEqual(get_group_label(25, alphabet), 'Z')
+        self.assertEqual(get_group_label(26, alphabet), 'AA')
+        self.assertEqual(get_group_label(27, alphabet), 'AB')
+        self.assertEqual(get_group_label(26 * 27, alphabet), 'AAA')
+        self.assertTrue(is_group_label('AZ', alphabet))
+        self.assertFalse(is_group_label('', alphabet))
+        self.assertFalse(is_group_label('A1', alphabet))
+
+
+class HyperlinksTests(TestCase):
+
+    def test_reverse(self):
+        request = Request(APIRequestFactory().get('/api/students/'))
+        for view_name, kwargs in (
+                ('api:student-detail', {'pk': 12}),
+                ('api:student-course-detail', {'parent_lookup_student': 3, 'pk': 45}),
+                ('api:course-list', {}),
+        ):
+            url = hyperlinks.reverse(view_name, kwargs=dict(kwargs), request=request)
+            self.assertEqual(url, drf_reverse(view_name, kwargs=dict(kwargs), request=request))
+            # filled into the cached template
+            self.assertEqual(
+                hyperlinks.reverse(view_name, kwargs=dict(kwargs), request=request), url)
+
+        # falls back for non-integer kwargs and format suffixes
+        self.assertEqual(
+            hyperlinks.reverse('api:student-detail', kwargs={'pk': '12'}, request=request),
+            drf_reverse('api:student-detail', kwargs={'pk': '12'}, request=request),
+        )
+        self.assertEqual(
+            hyperlinks.reverse('api:student-detail', kwargs={'pk': 12}, format='json'),
+            drf_reverse('api:student-detail', kwargs={'pk': 12}, format='json'),
+        )
+
+        # per request base URL
+        request = Request(APIRequestFactory().get('/api/students/', HTTP_HOST='example.com'))
+        self.assertEqual(
+            hyperlinks.reverse('api:student-detail', kwargs={'pk': 12}, request=request),
+            'http://example.com/api/students/12/')
+
+    def test_is_ids_repr(self):
+        self.assertFalse(hyperlinks.is_ids_repr(None))
+        request = Request(APIRequestFactory().get('/api/students/'))
+        self.assertFalse(hyperlinks.is_ids_repr(request))
+        request = Request(APIRequestFactory().get('/api/students/', {'repr': 'ids'}))
+        self.assertTrue(hyperlinks.is_ids_repr(request))
+
+        request = Request(APIRequestFactory().get('/api/students/'))
+        request.accepted_media_type = hyperlinks.IDS_MEDIA_TYPE
+        self.assertTrue(hyperlinks.is_ids_repr(request))